@@ -0,0 +1,84 @@
+"""Memory used by datasets with the default and the compact dtypes.
+
+Run from the repository root with pHroc installed (e.g. `pip install -e .`):
+
+    python benchmarks/memory.py --sizes 10000 100000
+
+Synthetic runs of each size are imported with each schema, and the memory used by
+the measurements and samples tables (counting every string) is printed, along with
+the size of the .phroc file and how long it takes to read back.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import phroc
+from phroc.process.synthetic import synthetic_measurements, write_agilent_pH
+
+
+schemas = {
+    "default": {},
+    "compact": {"compact": True},
+    "compact + float32": {"compact": True, "float32_absorbance": True},
+}
+
+
+def memory(usd):
+    # Bytes used by the dataset's tables
+    return (
+        usd.measurements.memory_usage(deep=True).sum()
+        + usd.samples.memory_usage(deep=True).sum()
+    )
+
+
+def run(sizes):
+    results = {}
+    print(f"{'':<36} {'memory':>10} {'.phroc':>10} {'read_phroc':>12}")
+    with tempfile.TemporaryDirectory() as tdir:
+        for size in sizes:
+            filename = os.path.join(tdir, f"SYNTHETIC-{size}.TXT")
+            measurements = synthetic_measurements(
+                size // 5,
+                repeats=5,
+                extra_mcp_fraction=0.05,
+                long_name_fraction=0.2,
+                carryover=0.05,
+                seed=size,
+            )
+            write_agilent_pH(filename, measurements)
+            for schema, kwargs in schemas.items():
+                usd = phroc.UpdatingSummaryDataset(filename, **kwargs)
+                fname = os.path.join(tdir, "memory.phroc")
+                usd.to_phroc(fname)
+                start = time.perf_counter()
+                phroc.read_phroc(fname)
+                seconds = time.perf_counter() - start
+                key = f"{schema} [synthetic-{size}]"
+                results[key] = memory(usd)
+                print(
+                    f"{key:<36} {results[key] / 1e6:>8.1f}MB"
+                    + f" {os.path.getsize(fname) / 1e6:>8.1f}MB"
+                    + f" {seconds * 1000:>10.1f}ms"
+                )
+    return results
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        type=int,
+        default=[10_000, 100_000],
+        help="numbers of measurements in the synthetic runs (default 10000 100000)",
+    )
+    args = parser.parse_args(args)
+    run(args.sizes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
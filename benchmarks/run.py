@@ -0,0 +1,242 @@
+"""Benchmarks for the import -> summarise -> window -> export pipeline.
+
+Run from the repository root with pHroc installed (e.g. `pip install -e .`):
+
+    python benchmarks/run.py --save before.json
+    python benchmarks/run.py --compare before.json
+
+Every step is timed on the files in tests/data and on synthetic runs of 10k and
+100k measurements, which are generated each time so that they don't need to be
+committed.  Importing is also timed on the .xlsx files saved by earlier versions in
+tests/data/previous_versions.  With `--compare`, the exit code is 1 if anything has
+got slower than `--threshold` times the saved result.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import phroc
+from phroc.meta import __version__
+from phroc.process.kernels import calculate_pH
+from phroc.process.parameters import pH_NIOZ, pH_tris_DD98, pH_tris_DD98_lookup
+from phroc.process.read_raw import read_agilent_pH
+from phroc.process.synthetic import synthetic_measurements, write_agilent_pH
+
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+
+def timeit(func, min_time=0.5, max_runs=50):
+    # Call `func` repeatedly until it has taken `min_time` in total, and return the
+    # shortest time per call, which is the least affected by anything else going on
+    times = []
+    while not times or (sum(times) < min_time and len(times) < max_runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), len(times)
+
+
+def get_inputs(tdir, sizes):
+    # Real files from the instrument, plus synthetic runs of each size
+    inputs = {
+        os.path.basename(f)[:-4]: f
+        for f in sorted(glob.glob("tests/data/*.TXT"))
+        if not f.endswith("-COMMENTS.TXT")
+    }
+    for size in sizes:
+        filename = os.path.join(tdir, f"SYNTHETIC-{size}.TXT")
+        measurements = synthetic_measurements(
+            size // 5,
+            repeats=5,
+            extra_mcp_fraction=0.05,
+            long_name_fraction=0.2,
+            carryover=0.05,
+            seed=size,
+        )
+        write_agilent_pH(filename, measurements)
+        inputs[f"synthetic-{size}"] = filename
+    return inputs
+
+
+def get_cases(filename, tdir):
+    # Each case is a function to time, set up on a fresh dataset from `filename`
+    usd = phroc.UpdatingSummaryDataset(filename)
+    measurements = usd.measurements.copy()
+    order = usd.measurements.index[usd.measurements.shape[0] // 2]
+    s = usd.samples.index[usd.samples.shape[0] // 2]
+    name = usd.samples.loc[s, "sample_name"]
+    fname = os.path.join(tdir, "benchmark")
+
+    def set_measurement():
+        usd.set_measurement(order, pH_good=False)
+        usd.set_measurement(order, pH_good=True)
+
+    absorbances = [measurements[f"absorbance_{wl}"].values for wl in [578, 434, 730]]
+    ts = measurements.temperature.values, measurements.salinity.values
+    out = np.empty(measurements.shape[0])
+
+    tris = usd.samples[usd.samples.is_tris]
+    tris_ts = {"temperature": tris.temperature.values, "salinity": tris.salinity.values}
+
+    def set_sample():
+        usd.set_sample(s, sample_name=f"{name}-X")
+        usd.set_sample(s, sample_name=name)
+
+    # The exported files are read back by the cases that come after
+    return {
+        "read_agilent_pH": lambda: read_agilent_pH(filename),
+        "UpdatingSummaryDataset": lambda: phroc.UpdatingSummaryDataset(measurements),
+        "get_samples": usd.get_samples,
+        "set_measurement (x2)": set_measurement,
+        "set_sample rename (x2)": set_sample,
+        "pH_NIOZ": lambda: pH_NIOZ(*absorbances, *ts),
+        "calculate_pH": lambda: calculate_pH("NIOZ", *absorbances, *ts, out=out),
+        "pH_tris_DD98": lambda: pH_tris_DD98(**tris_ts),
+        "pH_tris_DD98_lookup": lambda: pH_tris_DD98_lookup(**tris_ts),
+        "find_windows": usd.find_windows,
+        "write_phroc": lambda: usd.to_phroc(fname),
+        "read_phroc": lambda: phroc.read_phroc(f"{fname}.phroc"),
+        "write_excel": lambda: usd.to_excel(f"{fname}.xlsx"),
+        **get_excel_cases(f"{fname}.xlsx"),
+    }
+
+
+def read_excel_previous(filename):
+    # read_excel as it was before it read only the columns that it needs, with
+    # explicit dtypes, and with calamine if available - for comparison
+    measurements = pd.read_excel(
+        filename, sheet_name="Measurements", engine="openpyxl"
+    ).set_index("order")
+    try:
+        settings = pd.read_excel(filename, sheet_name="Settings", engine="openpyxl")
+        measurements["comments"] = measurements.comments.fillna("")
+    except ValueError:
+        settings = pd.DataFrame({"pH_equation": ["NIOZ"]})
+        measurements["comments"] = ""
+    return phroc.UpdatingSummaryDataset(
+        measurements,
+        **{s: settings[s].iloc[0] for s in settings.columns if s != "pHroc_version"},
+    )
+
+
+def get_excel_cases(filename):
+    cases = {
+        "read_excel (previous)": lambda: read_excel_previous(filename),
+        "read_excel (openpyxl)": lambda: phroc.read_excel(filename, engine="openpyxl"),
+    }
+    if python_calamine is not None:
+        cases["read_excel"] = lambda: phroc.read_excel(filename)
+    return cases
+
+
+def time_cases(label, cases, results, only=None, min_time=0.5):
+    for case, func in cases.items():
+        if only and not any(o in case for o in only):
+            continue
+        seconds, runs = timeit(func, min_time=min_time)
+        key = f"{case} [{label}]"
+        results[key] = seconds
+        print(f"{key:<60} {seconds * 1000:>10.2f} ms  ({runs} runs)")
+
+
+def run(sizes, only=None, min_time=0.5):
+    results = {}
+    with tempfile.TemporaryDirectory() as tdir:
+        inputs = get_inputs(tdir, sizes)
+        for label, filename in inputs.items():
+            cases = get_cases(filename, tdir)
+            time_cases(label, cases, results, only=only, min_time=min_time)
+    # Workbooks saved by earlier versions of pHroc
+    for filename in sorted(glob.glob("tests/data/previous_versions/*.xlsx")):
+        label = os.path.basename(filename)[:-5]
+        cases = get_excel_cases(filename)
+        time_cases(label, cases, results, only=only, min_time=min_time)
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Return the cases that have got slower than `threshold` times the baseline
+    slower = []
+    print(f"\n{'':<60} {'before':>10} {'after':>10} {'ratio':>7}")
+    for key, seconds in results.items():
+        if key not in baseline:
+            continue
+        ratio = seconds / baseline[key]
+        flag = ""
+        if ratio > threshold:
+            slower.append(key)
+            flag = "  SLOWER"
+        print(
+            f"{key:<60} {baseline[key] * 1000:>8.2f}ms {seconds * 1000:>8.2f}ms"
+            + f" {ratio:>7.2f}{flag}"
+        )
+    return slower
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="*",
+        type=int,
+        default=[10_000, 100_000],
+        help="numbers of measurements in the synthetic runs (default 10000 100000)",
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="only run cases whose names contain these"
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.5,
+        help="keep repeating each case for at least this many seconds (default 0.5)",
+    )
+    parser.add_argument("--save", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare with results saved with --save")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.2,
+        help="with --compare, fail if any case takes longer than this many times the"
+        + " saved result (default 1.2)",
+    )
+    args = parser.parse_args(args)
+    results = run(args.sizes, only=args.only, min_time=args.min_time)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {
+                    "phroc": __version__,
+                    "python": sys.version,
+                    "numpy": np.__version__,
+                    "machine": platform.platform(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f"\n{len(slower)} case(s) slower than {args.threshold}x the baseline")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,22 @@
+from .process.batch import process_files
 from .process.read import read_excel, read_phroc
 from .process.read_raw import read_agilent_pH
+from .process.store import ProjectStore
+from .process.tail import tail_agilent_pH
+from .process.tris import TrisControlChart
 from .process.usd import UpdatingSummaryDataset
 from .process.write import write_excel, write_phroc
 
 
 __all__ = [
+    "ProjectStore",
+    "TrisControlChart",
     "UpdatingSummaryDataset",
+    "process_files",
     "read_agilent_pH",
     "read_excel",
     "read_phroc",
+    "tail_agilent_pH",
     "write_excel",
     "write_phroc",
 ]
@@ -1,21 +1,24 @@
+import datetime
+import os
 from sys import argv
 
 import matplotlib as mpl
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg, NavigationToolbar2QT
-from PySide6.QtCore import Qt
-from PySide6.QtGui import QColor
+from PySide6.QtCore import Qt, QThreadPool
+from PySide6.QtGui import QKeySequence, QShortcut
 from PySide6.QtWidgets import (
     QCheckBox,
     QComboBox,
     QFileDialog,
     QHBoxLayout,
-    QHeaderView,
     QLabel,
     QLineEdit,
     QMainWindow,
+    QProgressBar,
     QPushButton,
+    QTableView,
     QTableWidget,
     QTableWidgetItem,
     QTabWidget,
@@ -24,12 +27,11 @@ from PySide6.QtWidgets import (
 )
 
 from . import meta
-from .process.read import read_excel, read_phroc
-from .process.usd import UpdatingSummaryDataset
-
-
-LightRed = QColor(255, 71, 76)
-LightOrange = QColor(253, 170, 72)
+from .process.store import run_date
+from .process.tris import TrisControlChart, plot_tris_chart
+from .table_models import LightOrange, LightRed, SamplesTableModel
+from .trace import traced
+from .workers import Worker, export_job, find_windows_job, import_job
 
 
 class MplCanvas(FigureCanvasQTAgg):
@@ -53,6 +55,33 @@ class MplCanvas(FigureCanvasQTAgg):
             sharey=sharey,
         )
         super(MplCanvas, self).__init__(self.fig)
+        # Artists that can be redrawn on their own over a cached background
+        self.animated = []
+        self.background = None
+        self.mpl_connect("draw_event", self.on_draw)
+        self.mpl_connect("resize_event", self.on_resize)
+
+    def on_resize(self, event):
+        # The layout is otherwise only recalculated when the axes' contents change
+        if self.isVisible():
+            self.fig.tight_layout()
+
+    def on_draw(self, event):
+        # Full draws leave out the animated artists, so cache the background and then
+        # draw them on top
+        self.background = self.copy_from_bbox(self.fig.bbox)
+        for artist in self.animated:
+            self.fig.draw_artist(artist)
+
+    def blit_animated(self):
+        # Redraw only the animated artists, for when nothing behind them has changed
+        if self.background is None:
+            self.draw()
+        else:
+            self.restore_region(self.background)
+            for artist in self.animated:
+                self.fig.draw_artist(artist)
+            self.blit(self.fig.bbox)
 
 
 class MainWindow(QMainWindow):
@@ -70,59 +99,47 @@ class MainWindow(QMainWindow):
         self.file_loaded = False
         self.s_button_export_phroc = QPushButton("Export to .phroc")
         self.s_button_export_excel = QPushButton("Export to .xlsx")
+        # Connected once here, not on every import, so that one click runs one job -
+        # but there's nothing to act on until a file has been imported
+        self.s_button_export_phroc.released.connect(self.export_phroc)
+        self.s_button_export_excel.released.connect(self.export_excel)
+        self.s_button_find_windows.released.connect(self.auto_find_windows)
+        for button in [
+            self.s_button_find_windows,
+            self.s_button_export_phroc,
+            self.s_button_export_excel,
+        ]:
+            button.setEnabled(False)
         # Text giving name of currently imported file
         self.s_current_file = QLabel("Current file: none")
         # Table with one-per-sample information
-        self.s_table_samples = QTableWidget()
-        s_table_samples_ncols = 10
-        self.s_table_samples.setColumnCount(s_table_samples_ncols)
-        self.s_table_samples.setHorizontalHeaderLabels(
-            [
-                "Sample name",
-                "Tris?",
-                "Extra\nmCP?",
-                "Salinity",
-                "Temperature\n/ °C",
-                "pH",
-                "pH\nrange",
-                "Expected\npH",
-                "Measurements\n(used / total)",
-                "Comments",
-            ]
+        self.s_table_samples = QTableView()
+        self.s_table_samples_model = SamplesTableModel(parent=self)
+        self.s_table_samples.setModel(self.s_table_samples_model)
+        # Fit the columns to their contents only when the whole table changes, not
+        # after every edit, which would mean measuring every cell each time
+        self.s_table_samples_model.modelReset.connect(
+            self.s_table_samples.resizeColumnsToContents
         )
-        self.s_col_sample_name = 0
-        self.s_col_is_tris = 1
-        self.s_col_extra_mcp = 2
-        self.s_col_salinity = 3
-        self.s_col_temperature = 4
-        self.s_col_pH = 5
-        self.s_col_pH_spread = 6
-        self.s_col_pH_expected = 7
-        self.s_col_measurements = 8
-        self.s_col_comments = 9
-        self.s_cols = {
-            self.s_col_sample_name: "sample_name",
-            self.s_col_is_tris: "is_tris",
-            self.s_col_extra_mcp: "extra_mcp",
-            self.s_col_salinity: "salinity",
-            self.s_col_temperature: "temperature",
-            self.s_col_comments: "comments",
-        }
-        header = self.s_table_samples.horizontalHeader()
-        for c in range(s_table_samples_ncols):
-            header.setSectionResizeMode(c, QHeaderView.ResizeMode.ResizeToContents)
-        self.s_table_samples_U = None
+        self.s_table_samples_model.sampleEdited.connect(self.s_sample_edited)
+        self.s_table_samples.pressed.connect(self.cell_selected)
         # Plot of one-per-sample information
         self.s_fig_samples = MplCanvas(
             self, width=6, height=9, dpi=100, nrows=3, sharex=True
         )
         self.s_fig_samples_nav = NavigationToolbar2QT(self.s_fig_samples, self)
+        self.s_plot_lines = None
+        self.s_plot_labels = None
+        self.s_plot_view = None
         # === MEASUREMENTS TAB =========================================================
         # Plot of the sample's data points
         self.m_fig_measurements = MplCanvas(self, width=6, dpi=100)
         self.m_fig_measurements_nav = NavigationToolbar2QT(
             self.m_fig_measurements, self
         )
+        self.m_plot_lines = None
+        self.m_plot_view = None
+        self.m_plot_fine = None
         # Data for the given sample
         self.m_sample_name = QLabel("Sample name")
         self.m_sample_salinity = QLabel("Salinity")
@@ -156,6 +173,29 @@ class MainWindow(QMainWindow):
         self.m_button_split = QPushButton("Split sample at measurement number ")
         self.m_combo_split = QComboBox()
         self.m_combo_split.addItem("-")
+        # === TRIS CHART TAB ===========================================================
+        self.t_button_open = QPushButton("Open tris control chart")
+        self.t_button_open.released.connect(self.t_open_chart)
+        self.t_button_add = QPushButton("Add current file to chart")
+        self.t_button_add.released.connect(self.t_add_run)
+        self.t_current_chart = QLabel("Current chart: none")
+        self.t_fig_chart = MplCanvas(self, width=9, height=6, dpi=100)
+        self.t_fig_chart_nav = NavigationToolbar2QT(self.t_fig_chart, self)
+        self.t_chart = None
+        # === BACKGROUND JOBS ==========================================================
+        # Slow jobs run one at a time on another thread, so the window doesn't freeze
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.job = None
+        self.job_on_finished = None
+        self.j_progress = QProgressBar()
+        self.j_progress.setMaximumWidth(200)
+        self.j_button_cancel = QPushButton("Cancel")
+        self.j_button_cancel.released.connect(self.cancel_job)
+        self.statusBar().addPermanentWidget(self.j_progress)
+        self.statusBar().addPermanentWidget(self.j_button_cancel)
+        self.j_progress.hide()
+        self.j_button_cancel.hide()
         # === ASSEMBLE LAYOUT ==========================================================
         # - Samples table column
         l_samples_table = QVBoxLayout()
@@ -267,50 +307,161 @@ class MainWindow(QMainWindow):
         l_measurements.addStretch()
         w_measurements = QWidget()
         w_measurements.setLayout(l_measurements)
+        # TRIS CHART TAB
+        l_tris_buttons = QHBoxLayout()
+        l_tris_buttons.addWidget(self.t_button_open)
+        l_tris_buttons.addWidget(self.t_button_add)
+        w_tris_buttons = QWidget()
+        w_tris_buttons.setLayout(l_tris_buttons)
+        l_tris = QVBoxLayout()
+        l_tris.addWidget(w_tris_buttons)
+        l_tris.addWidget(self.t_current_chart)
+        l_tris.addWidget(self.t_fig_chart_nav)
+        l_tris.addWidget(self.t_fig_chart)
+        w_tris = QWidget()
+        w_tris.setLayout(l_tris)
         # Assemble tabs
         tabs = QTabWidget()
         tabs.setTabPosition(QTabWidget.West)
         tabs.addTab(w_samples, "Samples")
         tabs.addTab(w_measurements, "Measurements")
+        tabs.addTab(w_tris, "Tris chart")
         tabs.currentChanged.connect(self.change_tab)
         self.setCentralWidget(tabs)
+        # Undo and redo edits with the usual keyboard shortcuts
+        QShortcut(QKeySequence.StandardKey.Undo, self).activated.connect(self.undo)
+        QShortcut(QKeySequence.StandardKey.Redo, self).activated.connect(self.redo)
         # If provided on command line, import file
         if len(argv) > 1:
             self.filename = argv[1]
             self._import_dataset_and_initialise()
 
+    @traced
     def change_tab(self, index):
-        print(f"change_tab({index})")
         if index == 0:
             self.s_create_table_samples()
             self.s_plot_samples()
         elif index == 1:
             self.m_refresh_table_measurements()
 
+    @traced
     def m_edit_comments(self, text):
-        print(f"m_edit_coments({text})")
         self.usd.set_sample(self.m_which_sample, comments=text)
 
+    @traced
+    def run_job(self, func, *args, on_finished=None, **kwargs):
+        # Run `func` in the background, with the dataset read-only and the window's
+        # controls disabled until it's done - then `on_finished` gets its result.
+        # Only one job runs at a time, so returns False without starting this one if
+        # another is still running
+        if self.job is not None:
+            self.statusBar().showMessage("Wait for the current job to finish", 10000)
+            return False
+        worker = Worker(func, *args, **kwargs)
+        worker.signals.progress.connect(self.job_progress)
+        worker.signals.finished.connect(self.job_finished)
+        worker.signals.failed.connect(self.job_failed)
+        worker.signals.cancelled.connect(self.job_cancelled)
+        self.job = worker
+        self.job_on_finished = on_finished
+        if self.file_loaded:
+            self.usd.read_only = True
+        self.centralWidget().setEnabled(False)
+        self.j_progress.setRange(0, 0)
+        self.j_progress.show()
+        self.j_button_cancel.setEnabled(True)
+        self.j_button_cancel.show()
+        self.pool.start(worker)
+        return True
+
+    def job_progress(self, step, total, message):
+        self.j_progress.setRange(0, total)
+        self.j_progress.setValue(step)
+        self.statusBar().showMessage(message)
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.j_button_cancel.setEnabled(False)
+            self.statusBar().showMessage("Cancelling...")
+
+    def job_end(self, message):
+        self.job = None
+        if self.file_loaded:
+            self.usd.read_only = False
+        self.centralWidget().setEnabled(True)
+        self.j_progress.hide()
+        self.j_button_cancel.hide()
+        self.statusBar().showMessage(message, 10000)
+
+    @traced
+    def job_finished(self, result):
+        self.job_end("Done")
+        if self.job_on_finished is not None:
+            self.job_on_finished(result)
+
+    def job_failed(self, message):
+        self.job_end(f"Failed: {message}")
+
+    def job_cancelled(self):
+        self.job_end("Cancelled")
+
+    def closeEvent(self, event):
+        # Let a running job stop before the window closes
+        self.cancel_job()
+        self.pool.waitForDone()
+        super().closeEvent(event)
+
+    @traced
+    def undo(self):
+        if self.job is None and self.file_loaded and self.usd.undo():
+            self.refresh_after_undo()
+
+    @traced
+    def redo(self):
+        if self.job is None and self.file_loaded and self.usd.redo():
+            self.refresh_after_undo()
+
+    def refresh_after_undo(self):
+        # Samples might have been merged or split, so the current one might be gone
+        self.m_which_sample = min(self.m_which_sample, self.usd.samples.shape[0])
+        self.s_create_table_samples()
+        self.s_plot_samples()
+        self.m_refresh_table_measurements()
+
+    @traced
     def auto_find_windows(self):
-        print("auto_find_windows()")
-        self.usd.find_windows(cutoff=0.001, minimum_values=3)
+        self.run_job(
+            find_windows_job,
+            self.usd,
+            cutoff=0.001,
+            minimum_values=3,
+            on_finished=self._found_windows,
+        )
+
+    @traced
+    def _found_windows(self, pH_good):
+        self.usd.set_pH_good(pH_good)
         self.s_create_table_samples()
         self.s_plot_samples()
         # self.s_table_samples.item(0, 0).setBackground(QBrush)
 
+    @traced
     def m_setup_sample_name_combos(self):
-        print("m_setup_sample_name_combos()")
         for s, row in self.usd.samples.iterrows():
             self.m_sample_name_combo.addItem(f"{s}: {row.sample_name}")
 
+    @traced
     def initialise(self):
-        print("initialise()")
         # Set up samples tab
         self.s_create_table_samples()
         self.s_plot_samples()
-        self.s_button_export_phroc.released.connect(self.export_phroc)
-        self.s_button_export_excel.released.connect(self.export_excel)
-        self.s_button_find_windows.released.connect(self.auto_find_windows)
+        for button in [
+            self.s_button_find_windows,
+            self.s_button_export_phroc,
+            self.s_button_export_excel,
+        ]:
+            button.setEnabled(True)
         # Set up measurements tab
         self.m_which_sample = 1
         if not self.file_loaded:
@@ -324,26 +475,24 @@ class MainWindow(QMainWindow):
             self.m_button_last_to_next.released.connect(self.m_last_to_next)
         else:
             self.m_refresh_table_measurements()
-        self.s_table_samples.cellPressed.connect(self.cell_selected)
 
-    def cell_selected(self, r, c):
-        print(f"cell_selected({r}, {c})")
-        if c == 0:
-            self.m_which_sample = r + 1
+    @traced
+    def cell_selected(self, index):
+        if index.column() == 0:
+            self.m_which_sample = index.row() + 1
 
+    @traced
     def _import_dataset_and_initialise(self):
-        print("_import_dataset_and_initialise()")
-        if self.filename.lower().endswith(".txt"):
-            self.usd = UpdatingSummaryDataset(self.filename)
-        elif self.filename.lower().endswith(".phroc"):
-            self.usd = read_phroc(self.filename)
-        elif self.filename.lower().endswith(".xlsx"):
-            self.usd = read_excel(self.filename)
+        self.run_job(import_job, self.filename, on_finished=self._imported)
+
+    @traced
+    def _imported(self, usd):
+        self.usd = usd
         self.initialise()
         self.file_loaded = True
 
+    @traced
     def import_dataset_and_initialise(self):
-        print("import_dataset_and_initialise()")
         # Open file dialog for user to choose the results file from the instrument
         dialog_open = QFileDialog(
             self, filter="Potentially compatible files (*.txt *.phroc *.xlsx)"
@@ -353,191 +502,88 @@ class MainWindow(QMainWindow):
             self.filename = dialog_open.selectedFiles()[0]
             self._import_dataset_and_initialise()
 
+    @traced
     def s_create_table_samples(self):
-        print("s_create_table_samples()")
         self.s_current_file.setText("Current file: {}".format(self.filename))
-        if self.s_table_samples_U is not None:
-            self.s_table_samples.cellChanged.disconnect(self.s_table_samples_U)
-        self.s_table_samples.clearContents()
-        self.s_table_samples.setRowCount(self.usd.samples.shape[0])
-        # Loop through samples and set values in GUI table
-        for s, sample in self.usd.samples.iterrows():
-            r = s - 1
-            self.s_set_all_cells(r, sample)
-        self.s_table_samples_U = self.s_table_samples.cellChanged.connect(
-            self.s_update_table_samples
-        )
-
-    def s_set_all_cells(self, r, sample):
-        print(f"s_set_all_cells({r}, {sample.sample_name})")
-        self.s_set_cell_sample_name(r, sample)
-        self.s_set_cell_is_tris(r, sample)
-        self.s_set_cell_extra_mcp(r, sample)
-        self.s_set_cell_salinity(r, sample)
-        self.s_set_cell_temperature(r, sample)
-        self.s_set_cell_pH(r, sample)
-        self.s_set_cell_pH_spread(r, sample)
-        self.s_set_cell_pH_expected(r, sample)
-        self.s_set_cell_measurements(r, sample)
-        self.s_set_cell_comments(r, sample)
-
-    def s_set_cell_sample_name(self, r, sample):
-        print(f"s_set_cell_sample_name({r}, {sample.sample_name})")
-        cell_sample_name = QTableWidgetItem(sample.sample_name)
-        self.s_table_samples.setItem(r, self.s_col_sample_name, cell_sample_name)
-
-    def s_set_cell_is_tris(self, r, sample):
-        print(f"s_set_cell_is_tris({r}, {sample.sample_name})")
-        cell_is_tris = QTableWidgetItem()
-        cell_is_tris.setFlags(cell_is_tris.flags() & ~Qt.ItemIsEditable)
-        if sample.is_tris:
-            cell_is_tris.setCheckState(Qt.Checked)
-        else:
-            cell_is_tris.setCheckState(Qt.Unchecked)
-        self.s_table_samples.setItem(r, self.s_col_is_tris, cell_is_tris)
-
-    def s_set_cell_extra_mcp(self, r, sample):
-        print(f"s_set_cell_extra_mcp({r}, {sample.sample_name})")
-        cell_extra_mcp = QTableWidgetItem()
-        cell_extra_mcp.setFlags(cell_extra_mcp.flags() & ~Qt.ItemIsEditable)
-        if sample.extra_mcp:
-            cell_extra_mcp.setCheckState(Qt.Checked)
-        else:
-            cell_extra_mcp.setCheckState(Qt.Unchecked)
-        self.s_table_samples.setItem(r, self.s_col_extra_mcp, cell_extra_mcp)
-
-    def s_set_cell_salinity(self, r, sample):
-        print(f"s_set_cell_salinity({r}, {sample.sample_name})")
-        cell_salinity = QTableWidgetItem(str(sample.salinity))
-        cell_salinity.setTextAlignment(Qt.AlignCenter)
-        if sample.salinity < 0:
-            cell_salinity.setBackground(LightRed)
-        self.s_table_samples.setItem(r, self.s_col_salinity, cell_salinity)
-
-    def s_set_cell_temperature(self, r, sample):
-        print(f"s_set_cell_temperature({r}, {sample.sample_name})")
-        cell_temperature = QTableWidgetItem(str(sample.temperature))
-        cell_temperature.setTextAlignment(Qt.AlignCenter)
-        self.s_table_samples.setItem(r, self.s_col_temperature, cell_temperature)
-
-    def s_set_cell_pH(self, r, sample):
-        print(f"s_set_cell_pH({r}, {sample.sample_name})")
-        cell_pH = QTableWidgetItem("{:.4f}".format(sample.pH))
-        cell_pH.setFlags(cell_pH.flags() & ~Qt.ItemIsEditable)
-        self.s_table_samples.setItem(r, self.s_col_pH, cell_pH)
-
-    def s_set_cell_pH_spread(self, r, sample):
-        print(f"s_set_cell_pH_spread({r}, {sample.sample_name})")
-        cell_pH_spread = QTableWidgetItem("{:.4f}".format(sample.pH_range))
-        cell_pH_spread.setFlags(cell_pH_spread.flags() & ~Qt.ItemIsEditable)
-        if sample.pH_range > 0.001:
-            cell_pH_spread.setBackground(LightOrange)
-        if sample.pH_range > 0.0012:
-            cell_pH_spread.setBackground(LightRed)
-        self.s_table_samples.setItem(r, self.s_col_pH_spread, cell_pH_spread)
-
-    def s_set_cell_pH_expected(self, r, sample):
-        print(f"s_set_cell_pH_expected({r}, {sample.sample_name})")
-        if sample.is_tris:
-            pH_expected = "{:.4f}".format(sample.pH_tris_expected)
-        else:
-            pH_expected = ""
-        cell_pH_expected = QTableWidgetItem(pH_expected)
-        cell_pH_expected.setFlags(cell_pH_expected.flags() & ~Qt.ItemIsEditable)
-        self.s_table_samples.setItem(r, self.s_col_pH_expected, cell_pH_expected)
-
-    def s_set_cell_measurements(self, r, sample):
-        print(f"s_set_cell_measurements({r}, {sample.sample_name})")
-        cell_measurements = QTableWidgetItem(
-            "{} / {}".format(sample.pH_good, sample.pH_count)
-        )
-        if sample.pH_good < 3:
-            cell_measurements.setBackground(LightOrange)
-        if sample.pH_good < 1:
-            cell_measurements.setBackground(LightRed)
-        cell_measurements.setFlags(cell_measurements.flags() & ~Qt.ItemIsEditable)
-        cell_measurements.setTextAlignment(Qt.AlignCenter)
-        self.s_table_samples.setItem(r, self.s_col_measurements, cell_measurements)
-
-    def s_set_cell_comments(self, r, sample):
-        print(f"s_set_cell_comments({r}, {sample.sample_name})")
-        cell_comments = QTableWidgetItem(sample.comments)
-        self.s_table_samples.setItem(r, self.s_col_comments, cell_comments)
-
+        # The table reads everything it needs straight from self.usd.samples
+        self.s_table_samples_model.set_usd(self.usd)
+
+    @traced
+    def s_setup_plot_samples(self):
+        # Create the artists once - afterwards, only their data are updated, and they
+        # are blitted over the rest of the figure if the axes haven't changed
+        canvas = self.s_fig_samples
+        ax = canvas.ax
+        marker = {"ls": "none", "marker": "o"}
+        self.s_plot_lines = {
+            "pH": ax[0].plot([], [], ms=50**0.5, c="xkcd:pale purple", **marker)[0],
+            "pH_tris_expected": ax[0].plot(
+                [], [], ls="none", marker="+", ms=50**0.5, c="xkcd:dark purple"
+            )[0],
+            "pH_good": ax[0].plot(
+                [], [], ms=10**0.5, c="xkcd:dark", alpha=0.8, mec="none", **marker
+            )[0],
+            "pH_bad": ax[0].plot(
+                [], [], ls="none", marker="x", ms=10**0.5, c="xkcd:dark", alpha=0.8
+            )[0],
+            "salinity": ax[1].plot([], [], ms=50**0.5, c="xkcd:sage", **marker)[0],
+            "temperature": ax[2].plot([], [], c="xkcd:coral", **marker)[0],
+        }
+        for line in self.s_plot_lines.values():
+            line.set_animated(True)
+            canvas.animated.append(line)
+        ax[0].set_ylabel("pH (total scale)")
+        ax[0].tick_params(top=True, labeltop=True, bottom=True, labelbottom=False)
+        ax[1].set_ylabel("Salinity")
+        ax[1].tick_params(top=True, labeltop=False, bottom=True, labelbottom=False)
+        ax[2].set_ylabel("Temperature / °C")
+        ax[2].tick_params(top=True, labeltop=False, bottom=True, labelbottom=True)
+        for _ax in ax:
+            _ax.grid(alpha=0.2)
+
+    @traced
     def s_plot_samples(self):
-        print("s_plot_samples()")
         samples = self.usd.samples
         measurements = self.usd.measurements
-        ax = self.s_fig_samples.ax[0]
-        ax.cla()
-        ax.scatter(samples.index, samples.pH, s=50, c="xkcd:pale purple")
-        ax.scatter(
-            samples.index,
-            samples.pH_tris_expected,
-            marker="+",
-            s=50,
-            c="xkcd:dark purple",
-        )
-        ax.scatter(
-            measurements.xpos[measurements.pH_good],
-            measurements.pH[measurements.pH_good],
-            s=10,
-            c="xkcd:dark",
-            alpha=0.8,
-            edgecolor="none",
-        )
-        ax.scatter(
-            measurements.xpos[~measurements.pH_good],
-            measurements.pH[~measurements.pH_good],
-            s=10,
-            c="xkcd:dark",
-            alpha=0.8,
-            marker="x",
-        )
-        ax.set_ylabel("pH (total scale)")
-        ax.set_xticks(samples.index)
-        ax.set_xticklabels(samples.sample_name, rotation=-90)
-        ax.tick_params(top=True, labeltop=True, bottom=True, labelbottom=False)
-        ax = self.s_fig_samples.ax[1]
-        ax.cla()
-        ax.scatter(samples.index, samples.salinity, s=50, c="xkcd:sage")
-        ax.set_ylabel("Salinity")
-        ax.set_xticks(samples.index)
-        ax.tick_params(top=True, labeltop=False, bottom=True, labelbottom=False)
-        ax = self.s_fig_samples.ax[2]
-        ax.cla()
-        ax.scatter(samples.index, samples.temperature, c="xkcd:coral")
-        ax.set_ylabel("Temperature / °C")
-        ax.set_xticks(samples.index)
-        ax.set_xticklabels(samples.sample_name, rotation=-90)
-        ax.tick_params(top=True, labeltop=False, bottom=True, labelbottom=True)
-        for ax in self.s_fig_samples.ax:
-            ax.grid(alpha=0.2)
-        self.s_fig_samples.fig.tight_layout()
-        self.s_fig_samples.draw()
-
-    def s_update_table_samples(self, r, c):
-        print(f"s_update_table_samples({r}, {c})")
-        # === UPDATE SELF.USD ==========================================================
-        v = self.s_table_samples.item(r, c).data(0)  # the updated value
-        s = r + 1  # the index for the corresponding row of self.samples
-        col = self.s_cols[c]  # the column name in self.usd.samples
-        # Update the dataset
-        if col in ["salinity", "temperature"]:
-            try:
-                v = float(v)
-            except ValueError:
-                # Don't allow temperature and salinity to be changed to non-numbers
-                v = self.usd.samples.loc[s, col]
-        elif col in ["is_tris", "extra_mcp"]:
-            v = self.s_table_samples.item(r, c).checkState() == Qt.Checked
-        self.usd.set_sample(s, **{col: v})
-        # === UPDATE GUI SAMPLES TABLE & PLOT ==========================================
-        self.s_create_table_samples()
+        if self.s_plot_lines is None:
+            self.s_setup_plot_samples()
+        lines = self.s_plot_lines
+        for col in ["pH", "pH_tris_expected", "salinity", "temperature"]:
+            lines[col].set_data(samples.index, samples[col])
+        good = measurements.pH_good.values
+        xpos = measurements.xpos.values
+        pH = measurements.pH.values
+        lines["pH_good"].set_data(xpos[good], pH[good])
+        lines["pH_bad"].set_data(xpos[~good], pH[~good])
+        canvas = self.s_fig_samples
+        for ax in canvas.ax:
+            ax.relim()
+            ax.autoscale_view()
+        labels = samples.sample_name.tolist()
+        view = (labels, *[(ax.get_xlim(), ax.get_ylim()) for ax in canvas.ax])
+        if view == self.s_plot_view:
+            # Only the data have changed, so don't redraw the axes
+            canvas.blit_animated()
+            return
+        self.s_plot_view = view
+        # Ticks and layout only need redoing when the samples themselves change
+        if labels != self.s_plot_labels:
+            self.s_plot_labels = labels
+            ax = canvas.ax
+            ax[1].set_xticks(samples.index)
+            for _ax in [ax[0], ax[2]]:
+                _ax.set_xticks(samples.index)
+                _ax.set_xticklabels(labels, rotation=-90)
+            canvas.fig.tight_layout()
+        canvas.draw()
+
+    @traced
+    def s_sample_edited(self, s):
+        # The table model has already updated self.usd and the affected rows
         self.s_plot_samples()
 
+    @traced
     def m_create_table_measurements(self):
-        print("m_create_table_measurements()")
         s = self.m_which_sample
         sample = self.usd.samples.loc[s]
         M = self.usd.measurements.order_analysis == s
@@ -600,8 +646,8 @@ class MainWindow(QMainWindow):
             self.m_is_tris.checkStateChanged.disconnect(self.m_is_tris_U)
         if self.m_extra_mcp_U is not None:
             self.m_is_tris.checkStateChanged.disconnect(self.m_extra_mcp_U)
-        self.m_is_tris.setChecked(sample.is_tris)
-        self.m_extra_mcp.setChecked(sample.extra_mcp)
+        self.m_is_tris.setChecked(bool(sample.is_tris))
+        self.m_extra_mcp.setChecked(bool(sample.extra_mcp))
         self.m_is_tris_U = self.m_is_tris.checkStateChanged.connect(
             self.m_change_is_tris
         )
@@ -609,22 +655,21 @@ class MainWindow(QMainWindow):
             self.m_change_extra_mcp
         )
 
+    @traced
     def m_change_is_tris(self, state):
-        print(f"m_change_is_tris({state})")
         self.usd.set_sample(
             self.m_which_sample, is_tris=self.m_is_tris.checkState() == Qt.Checked
         )
         self.m_refresh_table_measurements()
 
+    @traced
     def m_change_extra_mcp(self, state):
-        print(f"m_change_extra_mcp({state})")
         self.usd.set_sample(
             self.m_which_sample, extra_mcp=self.m_extra_mcp.checkState() == Qt.Checked
         )
         self.m_refresh_table_measurements()
 
     def m_set_cell_pH(self, r, measurement):
-        print(f"m_set_cell_pH({r}, measurement)")
         cell_pH = QTableWidgetItem("{:.4f}".format(measurement.pH))
         cell_pH.setFlags(cell_pH.flags() & ~Qt.ItemIsEditable)
         if measurement.pH_good:
@@ -633,8 +678,8 @@ class MainWindow(QMainWindow):
             cell_pH.setCheckState(Qt.Unchecked)
         self.m_table_measurements.setItem(r, 0, cell_pH)
 
+    @traced
     def m_update_table_measurements(self, r, c):
-        print(f"m_update_table_measurements({r}, {c})")
         s = self.m_which_sample
         M = self.usd.measurements.order_analysis == s
         m = self.usd.measurements[M].index[r]
@@ -643,86 +688,115 @@ class MainWindow(QMainWindow):
         )
         self.m_refresh_table_measurements()
 
+    @traced
     def m_refresh_table_measurements(self):
-        print("m_refresh_table_measurements()")
         # First, we have to disconnect the cellChanged signal to prevent recursion
         self.m_table_measurements.cellChanged.disconnect(self.m_table_measurements_U)
         self.m_create_table_measurements()
 
+    @traced
+    def m_setup_plot_measurements(self):
+        # Create the artists once - afterwards, only their data are updated, and they
+        # are blitted over the rest of the figure if the axes haven't changed
+        canvas = self.m_fig_measurements
+        ax = canvas.ax
+        self.m_plot_lines = {
+            "pH_good": ax.plot([], [], ls="none", marker="o", c="C0")[0],
+            "pH_bad": ax.plot([], [], ls="none", marker="x", c="C1")[0],
+            "pH": ax.axhline(np.nan, c="C0"),
+            "pH_tris_expected": ax.axhline(np.nan, ls=":", c="C1"),
+        }
+        for line in self.m_plot_lines.values():
+            line.set_animated(True)
+            canvas.animated.append(line)
+        ax.set_xlabel("Measurement number")
+        ax.set_ylabel("pH (total scale)")
+
+    @traced
     def m_plot_measurements(self):
-        print("m_plot_measurements()")
-        sample = self.usd.samples.loc[self.m_which_sample]
-        measurements = self.usd.measurements
-        ax = self.m_fig_measurements.ax
-        ax.cla()
-        M = measurements.order_analysis == self.m_which_sample
-        Mg = M & measurements.pH_good
-        Mb = M & ~measurements.pH_good
-        fx = 1 + np.arange(M.sum())
-        L = measurements.pH_good[M].values
-        ax.scatter(fx[L], measurements[Mg].pH)
-        ax.scatter(fx[~L], measurements[Mb].pH, marker="x")
-        ax.axhline(sample.pH)
-        if sample.is_tris:
-            ax.axhline(sample.pH_tris_expected, ls=":")
-        ax.set_xticks(fx)
+        s = self.m_which_sample
+        sample = self.usd.samples.loc[s]
+        rows = self.usd.sample_rows(s)
+        pH = self.usd.measurements.pH.values[rows]
+        good = self.usd.measurements.pH_good.values[rows]
+        canvas = self.m_fig_measurements
+        ax = canvas.ax
+        if self.m_plot_lines is None:
+            self.m_setup_plot_measurements()
+        lines = self.m_plot_lines
+        fx = 1 + np.arange(pH.size)
+        lines["pH_good"].set_data(fx[good], pH[good])
+        lines["pH_bad"].set_data(fx[~good], pH[~good])
+        lines["pH"].set_ydata([sample.pH, sample.pH])
+        lines["pH_tris_expected"].set_ydata([sample.pH_tris_expected] * 2)
+        lines["pH_tris_expected"].set_visible(bool(sample.is_tris))
+        ax.set_autoscale_on(True)
+        ax.relim(visible_only=True)
+        ax.autoscale_view()
         # Make sure y-axis range is always at least 0.002
         ylim = ax.get_ylim()
         ydiff = ylim[1] - ylim[0]
         if ydiff < 0.002:
-            sdiff = measurements[M].pH.max() - measurements[M].pH.min()
+            sdiff = pH.max() - pH.min()
             yextra = (0.002 - sdiff) / 2
-            ylim = (
-                measurements[M].pH.min() - yextra,
-                measurements[M].pH.max() + yextra,
-            )
+            ylim = (pH.min() - yextra, pH.max() + yextra)
             ydiff = ylim[1] - ylim[0]
             ax.set_ylim(ylim)
-        if ydiff <= 0.006:
-            ax.yaxis.set_major_locator(mpl.ticker.MultipleLocator(base=0.0005))
-            ax.yaxis.set_minor_locator(mpl.ticker.MultipleLocator(base=0.0001))
-            ax.grid(which="major", alpha=0.3)
-            ax.grid(which="minor", axis="y", alpha=0.1)
-        else:
-            ax.grid(alpha=0.2)
-        # Final settings
-        ax.set_xlabel("Measurement number")
-        ax.set_ylabel("pH (total scale)")
+        view = (pH.size, ax.get_xlim(), ax.get_ylim(), sample.sample_name)
+        if view == self.m_plot_view:
+            # Only the data have changed, so don't redraw the axes
+            canvas.blit_animated()
+            return
+        fine = ydiff <= 0.006
+        if fine != self.m_plot_fine:
+            self.m_plot_fine = fine
+            if fine:
+                ax.yaxis.set_major_locator(mpl.ticker.MultipleLocator(base=0.0005))
+                ax.yaxis.set_minor_locator(mpl.ticker.MultipleLocator(base=0.0001))
+                ax.grid(which="major", alpha=0.3)
+                ax.grid(which="minor", axis="y", alpha=0.1)
+            else:
+                ax.yaxis.set_major_locator(mpl.ticker.AutoLocator())
+                ax.yaxis.set_minor_locator(mpl.ticker.NullLocator())
+                ax.grid(which="major", alpha=0.2)
+                ax.grid(which="minor", visible=False)
+            canvas.fig.tight_layout()
+        self.m_plot_view = view
+        ax.set_xticks(fx)
         ax.set_title(sample.sample_name)
-        self.m_fig_measurements.fig.tight_layout()
-        self.m_fig_measurements.draw()
+        canvas.draw()
 
+    @traced
     def m_to_sample_prev(self):
-        print("m_to_sample_prev()")
         self.m_which_sample -= 1
         if self.m_which_sample < 1:
             self.m_which_sample = self.usd.samples.shape[0]
         self.m_refresh_table_measurements()
 
+    @traced
     def m_to_sample_first(self):
-        print("m_to_sample_first()")
         self.m_which_sample = 1
         self.m_refresh_table_measurements()
 
+    @traced
     def m_to_sample_final(self):
-        print("m_to_sample_final()")
         self.m_which_sample = self.usd.samples.shape[0]
         self.m_refresh_table_measurements()
 
+    @traced
     def m_to_sample_next(self):
-        print("m_to_sample_next()")
         self.m_which_sample += 1
         if self.m_which_sample > self.usd.samples.shape[0]:
             self.m_which_sample = 1
         self.m_refresh_table_measurements()
 
+    @traced
     def m_to_sample_user(self, index):
-        print(f"m_to_sample_user({index})")
         self.m_which_sample = index + 1
         self.m_refresh_table_measurements()
 
+    @traced
     def m_move_measurement(self, direction):
-        print(f"m_move_measurement({direction})")
         # Direction is -1 to move measurement backwards or +1 for forwards
         assert direction in [-1, 1]
         s = self.m_which_sample
@@ -743,16 +817,16 @@ class MainWindow(QMainWindow):
             )
             self.m_refresh_table_measurements()
 
+    @traced
     def m_first_to_prev(self):
-        print("m_first_to_prev()")
         self.m_move_measurement(-1)
 
+    @traced
     def m_last_to_next(self):
-        print("m_last_to_next()")
         self.m_move_measurement(1)
 
+    @traced
     def m_split(self):
-        print("m_split()")
         split_at = self.m_combo_split.currentText()
         if split_at != "-":
             split_at = int(split_at)
@@ -767,8 +841,56 @@ class MainWindow(QMainWindow):
             self.m_which_sample += 1
             self.m_refresh_table_measurements()
 
+    @traced
+    def t_open_chart(self):
+        # Choose a tris control chart file, which is made if it doesn't exist yet
+        dialog_open = QFileDialog(self, filter="Tris control charts (*.parquet)")
+        dialog_open.setFileMode(QFileDialog.FileMode.AnyFile)
+        if dialog_open.exec():
+            self.t_filename = dialog_open.selectedFiles()[0]
+            self._t_open_chart()
+
+    @traced
+    def _t_open_chart(self):
+        if os.path.isfile(self.t_filename):
+            self.t_chart = TrisControlChart.load(self.t_filename)
+        else:
+            self.t_chart = TrisControlChart()
+        self.t_plot_chart()
+
+    @traced
+    def t_add_run(self):
+        if self.t_chart is None or not self.file_loaded:
+            return
+        # Runs without a date in their Comments file or name count as measured today
+        run = os.path.splitext(os.path.basename(self.filename))[0]
+        date = run_date(self.filename) or datetime.date.today()
+        self.t_chart.add(self.usd, run=run, date=date)
+        self.t_chart.save(self.t_filename)
+        self.t_plot_chart()
+
+    @traced
+    def t_plot_chart(self):
+        table = self.t_chart.table
+        text = "Current chart: {} ({} tris samples in {} runs)".format(
+            self.t_filename, table.shape[0], table.run.nunique()
+        )
+        if table.shape[0]:
+            last = table.iloc[-1]
+            text += "\nOffset {:+.4f} ± {:.4f}, rolling mean {:+.4f}".format(
+                last.mean_control, last.sd_control, last.rolling_mean
+            )
+            if table.drift.values[-1]:
+                text += " - DRIFTING"
+        self.t_current_chart.setText(text)
+        ax = self.t_fig_chart.ax
+        ax.cla()
+        plot_tris_chart(self.t_chart, ax=ax)
+        self.t_fig_chart.fig.tight_layout()
+        self.t_fig_chart.draw()
+
+    @traced
     def export_prep(self, extension):
-        print(f"export_prep({extension})")
         dialog_save = QFileDialog(self, filter="*.{}".format(extension))
         dialog_save.setFileMode(QFileDialog.FileMode.AnyFile)
         dialog_save.setAcceptMode(QFileDialog.AcceptMode.AcceptSave)
@@ -778,16 +900,22 @@ class MainWindow(QMainWindow):
         dialog_save.setDirectory(export_dir)
         return dialog_save
 
-    def export_phroc(self):
-        print("export_phroc()")
-        dialog_save = self.export_prep("phroc")
+    @traced
+    def export(self, extension):
+        dialog_save = self.export_prep(extension)
         if dialog_save.exec():
             filename = dialog_save.selectedFiles()[0]
-            self.usd.to_phroc(filename)
+            if not filename.endswith(f".{extension}"):
+                filename += f".{extension}"
+            self.run_job(export_job, self.usd, filename, on_finished=self._exported)
 
+    def _exported(self, filename):
+        self.statusBar().showMessage(f"Saved {filename}", 10000)
+
+    @traced
+    def export_phroc(self):
+        self.export("phroc")
+
+    @traced
     def export_excel(self):
-        print("export_excel()")
-        dialog_save = self.export_prep("xlsx")
-        if dialog_save.exec():
-            filename = dialog_save.selectedFiles()[0]
-            self.usd.to_excel(filename)
+        self.export("xlsx")
@@ -0,0 +1,372 @@
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ..trace import traced
+from .parameters import pH_equations
+from .read import read_phroc
+from .usd import UpdatingSummaryDataset
+
+
+def find_files(paths: list[str], extension: str = ".TXT") -> list[str]:
+    """Find raw pH data files from a list of files, directories and/or glob
+    patterns.  Directories are searched for files ending with `extension` (by
+    default ".TXT"), excluding the instrument's "-COMMENTS.TXT" files.  Each
+    file is only included once, where it's first found, even if `paths`
+    overlap.
+    """
+    filenames = {}
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(
+                os.path.join(path, f)
+                for f in os.listdir(path)
+                if f.upper().endswith(extension.upper())
+            )
+        else:
+            matches = sorted(glob.glob(path))
+        for f in matches:
+            if not f.upper().endswith("-COMMENTS.TXT"):
+                filenames.setdefault(os.path.normcase(os.path.abspath(f)), f)
+    return list(filenames.values())
+
+
+@traced
+def process_file(
+    filename: str,
+    output_dir: str | None = None,
+    find_windows: bool = False,
+    to_phroc: bool = True,
+    to_excel: bool = False,
+    excel_measurements: bool = True,
+    pH_equation: str = "NIOZ",
+    dye_intercept: float = 0.0,
+    dye_slope: float = 0.0,
+) -> list[str]:
+    """Import one raw pH data file and export the results.
+
+    Parameters
+    ----------
+    filename : str
+        The raw pH data file.  The matching Comments file must be alongside.
+    output_dir : str, optional
+        Where to save the results, by default next to `filename`.
+    find_windows : bool, optional
+        Whether to automatically find windows containing good measurements, by
+        default False.
+    to_phroc : bool, optional
+        Whether to save a .phroc file, by default True.
+    to_excel : bool, optional
+        Whether to save a .xlsx file, by default False.
+    excel_measurements : bool, optional
+        Whether to include the Measurements sheet in the .xlsx file, by default
+        True.
+    pH_equation : str, optional
+        Which pH equation to use, either `"NIOZ"` (default) or `"DSC07"`.
+    dye_intercept : float, optional
+        Intercept of the dye correction (SOP 6b eq. 9), by default 0.
+    dye_slope : float, optional
+        Slope of the dye correction (SOP 6b eq. 9), by default 0.
+
+    Returns
+    -------
+    list[str]
+        The files that were saved.
+    """
+    usd = UpdatingSummaryDataset(
+        filename,
+        dye_intercept=dye_intercept,
+        dye_slope=dye_slope,
+        pH_equation=pH_equation,
+    )
+    if find_windows:
+        usd.find_windows()
+    if output_dir is None:
+        output_dir = os.path.dirname(filename)
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    output = os.path.abspath(os.path.join(output_dir, basename))
+    outputs = []
+    if to_phroc:
+        usd.to_phroc(output)
+        outputs.append(output + ".phroc")
+    if to_excel:
+        usd.to_excel(output, include_measurements=excel_measurements)
+        outputs.append(output + ".xlsx")
+    return outputs
+
+
+@traced
+def reprocess_file(
+    filename: str,
+    output_dir: str | None = None,
+    suffix: str = "",
+    to_excel: bool = False,
+    excel_measurements: bool = True,
+    pH_equation: str | None = None,
+    dye_intercept: float | None = None,
+    dye_slope: float | None = None,
+) -> list[str]:
+    """Recalculate pH in a .phroc file with a different pH equation and/or dye
+    correction, and save it as a new .phroc file.
+
+    Parameters
+    ----------
+    filename : str
+        The .phroc file.
+    output_dir : str, optional
+        Where to save the new version, by default next to `filename`.
+    suffix : str, optional
+        Added to the end of the file name of the new version, by default "".
+        If `output_dir` is not given, `suffix` must be, so that `filename` isn't
+        overwritten.
+    to_excel : bool, optional
+        Whether to also save a .xlsx file, by default False.
+    excel_measurements : bool, optional
+        Whether to include the Measurements sheet in the .xlsx file, by default
+        True.
+    pH_equation : str, optional
+        Which pH equation to use, either `"NIOZ"` or `"DSC07"`.  By default,
+        the one in the file is kept.
+    dye_intercept : float, optional
+        Intercept of the dye correction (SOP 6b eq. 9).  By default, the one in
+        the file is kept.
+    dye_slope : float, optional
+        Slope of the dye correction (SOP 6b eq. 9).  By default, the one in the
+        file is kept.
+
+    Returns
+    -------
+    list[str]
+        The files that were saved.
+    """
+    assert output_dir is not None or suffix, (
+        "Either `output_dir` or `suffix` must be given, so that "
+        f"`{filename}` isn't overwritten."
+    )
+    usd = read_phroc(filename)
+    usd.set_pH_equation(
+        pH_equation=pH_equation, dye_intercept=dye_intercept, dye_slope=dye_slope
+    )
+    if output_dir is None:
+        output_dir = os.path.dirname(filename)
+    basename = os.path.splitext(os.path.basename(filename))[0] + suffix
+    output = os.path.abspath(os.path.join(output_dir, basename))
+    usd.to_phroc(output)
+    outputs = [output + ".phroc"]
+    if to_excel:
+        usd.to_excel(output, include_measurements=excel_measurements)
+        outputs.append(output + ".xlsx")
+    return outputs
+
+
+def _process_file_timed(filename, process=process_file, **kwargs):
+    # Catch errors here, so that one bad file doesn't stop the rest of the batch
+    start = time.perf_counter()
+    try:
+        ok, result = True, process(filename, **kwargs)
+    except Exception as e:  # noqa: BLE001 - reported per file in the summary
+        ok, result = False, repr(e)
+    return ok, time.perf_counter() - start, result
+
+
+def _print_result(filename, ok, seconds, result):
+    status = "OK" if ok else "FAILED"
+    detail = ", ".join(result) if ok else result
+    print(f"{status:6} {seconds:8.2f} s  {filename}  {detail}")
+
+
+def process_files(
+    filenames: list[str], workers: int | None = None, process=process_file, **kwargs
+) -> dict[str, tuple[bool, float, list[str] | str]]:
+    """Import and export many raw pH data files in parallel.
+
+    Parameters
+    ----------
+    filenames : list[str]
+        The raw pH data files, or the .phroc files for `reprocess_file`.
+    workers : int, optional
+        How many processes to use, by default one per CPU.  With `workers=1`,
+        everything runs in the current process.
+    process : callable, optional
+        What to do with each file, by default `process_file`, or
+        `reprocess_file`.
+    **kwargs
+        Passed on to `process`.
+
+    Returns
+    -------
+    dict[str, tuple[bool, float, list[str] | str]]
+        For each file, in the same order as `filenames`: whether it was
+        processed successfully, how long it took in seconds, and either the
+        list of files that were saved or the error message.  Files that are
+        in `filenames` more than once are only processed once.
+    """
+    filenames = list(dict.fromkeys(filenames))
+    summary = {}
+    if workers == 1:
+        for filename in filenames:
+            summary[filename] = _process_file_timed(filename, process, **kwargs)
+            _print_result(filename, *summary[filename])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_process_file_timed, filename, process, **kwargs)
+                for filename in filenames
+            ]
+            for filename, future in zip(filenames, futures):
+                # Errors in `process` are caught in `_process_file_timed`, so this
+                # is e.g. a BrokenProcessPool after a worker crashed, which fails
+                # this file and everything else that hadn't finished yet
+                try:
+                    summary[filename] = future.result()
+                except Exception as e:  # noqa: BLE001 - reported per file
+                    summary[filename] = False, float("nan"), repr(e)
+                _print_result(filename, *summary[filename])
+    return summary
+
+
+def batch_run(args: list[str] | None = None) -> int:
+    """Command-line interface for processing many raw pH data files without the
+    GUI, run as `phroc batch`.  Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="phroc batch",
+        description="Process raw pH data files from the spectrophotometer.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="raw pH data files, directories or glob patterns"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", help="where to save results (default: next to inputs)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, help="number of processes (default: one per CPU)"
+    )
+    parser.add_argument(
+        "--find-windows",
+        action="store_true",
+        help="automatically detect measurement windows",
+    )
+    parser.add_argument("--xlsx", action="store_true", help="save .xlsx files")
+    parser.add_argument(
+        "--no-xlsx-measurements",
+        action="store_true",
+        help="leave the Measurements sheet out of .xlsx files",
+    )
+    parser.add_argument(
+        "--no-phroc", action="store_true", help="don't save .phroc files"
+    )
+    parser.add_argument("--pH-equation", choices=list(pH_equations), default="NIOZ")
+    parser.add_argument("--dye-intercept", type=float, default=0.0)
+    parser.add_argument("--dye-slope", type=float, default=0.0)
+    args = parser.parse_args(args)
+    filenames = find_files(args.paths)
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = process_files(
+        filenames,
+        workers=args.workers,
+        output_dir=args.output_dir,
+        find_windows=args.find_windows,
+        to_phroc=not args.no_phroc,
+        to_excel=args.xlsx,
+        excel_measurements=not args.no_xlsx_measurements,
+        pH_equation=args.pH_equation,
+        dye_intercept=args.dye_intercept,
+        dye_slope=args.dye_slope,
+    )
+    failed = sum(not ok for ok, _, _ in results.values())
+    print(
+        f"Processed {len(results) - failed} of {len(results)} files in "
+        f"{time.perf_counter() - start:.2f} s ({failed} failed)."
+    )
+    return 1 if failed else 0
+
+
+def _is_output(filename, output_dir, suffix):
+    # Whether `filename` looks like it was saved by `reprocess_file` with `suffix`
+    # into `output_dir`
+    if not os.path.splitext(os.path.basename(filename))[0].endswith(suffix):
+        return False
+    input_dir = os.path.dirname(filename) or "."
+    return output_dir is None or (
+        os.path.isdir(output_dir) and os.path.samefile(input_dir, output_dir)
+    )
+
+
+def reprocess_run(args: list[str] | None = None) -> int:
+    """Command-line interface for recalculating pH in many .phroc files with a
+    different pH equation and/or dye correction, run as `phroc reprocess`.
+    Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="phroc reprocess",
+        description="Recalculate pH in .phroc files with new settings.",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help=".phroc files, directories or glob patterns"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", help="where to save results (default: next to inputs)"
+    )
+    parser.add_argument(
+        "-s",
+        "--suffix",
+        default="",
+        help="added to the end of the new file names (inputs that already end with "
+        "it are skipped if they'd be saved alongside)",
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, help="number of processes (default: one per CPU)"
+    )
+    parser.add_argument("--xlsx", action="store_true", help="also save .xlsx files")
+    parser.add_argument(
+        "--no-xlsx-measurements",
+        action="store_true",
+        help="leave the Measurements sheet out of .xlsx files",
+    )
+    parser.add_argument(
+        "--pH-equation", choices=list(pH_equations), help="(default: keep)"
+    )
+    parser.add_argument("--dye-intercept", type=float, help="(default: keep)")
+    parser.add_argument("--dye-slope", type=float, help="(default: keep)")
+    args = parser.parse_args(args)
+    if args.output_dir is None and not args.suffix:
+        parser.error("give --output-dir and/or --suffix, so inputs aren't overwritten")
+    filenames = find_files(args.paths, extension=".phroc")
+    if args.suffix:
+        # Leave out the outputs of an earlier run with the same suffix, if they'd be
+        # saved alongside their inputs
+        inputs = [
+            f for f in filenames if not _is_output(f, args.output_dir, args.suffix)
+        ]
+        if len(inputs) < len(filenames):
+            print(
+                f"Skipping {len(filenames) - len(inputs)} files that already end with"
+                f" {args.suffix}."
+            )
+        filenames = inputs
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+    results = process_files(
+        filenames,
+        workers=args.workers,
+        process=reprocess_file,
+        output_dir=args.output_dir,
+        suffix=args.suffix,
+        to_excel=args.xlsx,
+        excel_measurements=not args.no_xlsx_measurements,
+        pH_equation=args.pH_equation,
+        dye_intercept=args.dye_intercept,
+        dye_slope=args.dye_slope,
+    )
+    failed = sum(not ok for ok, _, _ in results.values())
+    print(
+        f"Reprocessed {len(results) - failed} of {len(results)} files in "
+        f"{time.perf_counter() - start:.2f} s ({failed} failed)."
+    )
+    return 1 if failed else 0
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+
+# The columns of the measurements table that edits can change - everything else,
+# including the samples table, is worked out from these
+journal_columns = {
+    "sample_name": str,
+    "temperature": float,
+    "salinity": float,
+    "is_tris": bool,
+    "extra_mcp": bool,
+    "comments": str,
+    "pH": float,
+    "pH_good": bool,
+}
+
+
+def make_delta(action, rows, before, after):
+    """Make a journal entry from the values of some columns of the measurements
+    table at positions `rows`, before and after an edit.  Only the rows and
+    columns that changed are kept.  Returns None if nothing changed.
+    """
+    changed = {
+        c: ~((before[c] == after[c]) | (pd.isnull(before[c]) & pd.isnull(after[c])))
+        for c in before
+    }
+    changed = {c: v for c, v in changed.items() if v.any()}
+    if not changed:
+        return None
+    keep = np.logical_or.reduce(list(changed.values()))
+    return {
+        "action": action,
+        "rows": np.asarray(rows)[keep],
+        "old": {c: before[c][keep] for c in changed},
+        "new": {c: after[c][keep] for c in changed},
+    }
+
+
+def journal_to_frame(journal, position):
+    """Convert a journal into a table with one row per row of each entry, to be
+    saved in a .phroc file.  Entries from `position` onwards have been undone.
+    """
+    frames = []
+    for i, entry in enumerate(journal):
+        frame = pd.DataFrame(
+            {
+                "entry": i,
+                "action": entry["action"],
+                "undone": i >= position,
+                "columns": ",".join(entry["old"]),
+                "row": entry["rows"],
+            }
+        )
+        for which in ["old", "new"]:
+            for c in journal_columns:
+                frame[f"{which}_{c}"] = entry[which].get(c)
+        frames.append(frame)
+    dtypes = {
+        "entry": int,
+        "action": str,
+        "undone": bool,
+        "columns": str,
+        "row": int,
+        **{
+            f"{which}_{c}": "boolean" if dtype is bool else dtype
+            for which in ["old", "new"]
+            for c, dtype in journal_columns.items()
+        },
+    }
+    if not frames:
+        return pd.DataFrame({c: pd.Series(dtype=d) for c, d in dtypes.items()})
+    return pd.concat(frames, ignore_index=True).astype(dtypes)
+
+
+def journal_from_frame(df):
+    """Convert a table made by `journal_to_frame` back into a journal and its
+    position.
+    """
+    journal = []
+    for _, frame in df.groupby("entry", sort=True):
+        columns = frame["columns"].iloc[0].split(",")
+        journal.append(
+            {
+                "action": frame.action.iloc[0],
+                "rows": frame.row.to_numpy(dtype=int),
+                **{
+                    which: {
+                        c: frame[f"{which}_{c}"].to_numpy(
+                            dtype=object
+                            if journal_columns[c] is str
+                            else journal_columns[c]
+                        )
+                        for c in columns
+                    }
+                    for which in ["old", "new"]
+                },
+            }
+        )
+    position = int((~df.drop_duplicates("entry").undone).sum())
+    return journal, position
@@ -0,0 +1,198 @@
+import numpy as np
+
+from .parameters import pH_equations
+
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+# Both pH equations have the form
+#   pH = log10((q - 0.00691) / (2.222 - 0.1331 * q)) + 1245.69 / (T + 273.15)
+#        + 3.8275 + 0.00211 * (35 - S)
+# where q = ratio * (1 - dye_slope) - dye_intercept - k578 * absorbance_578 and
+# ratio = (absorbance_578 - absorbance_730) / (absorbance_434 - absorbance_730),
+# so they differ only in the coefficients for q
+k578 = {"NIOZ": 0.00815, "DSC07": 0.0}
+uses_dye = {"NIOZ": False, "DSC07": True}
+
+
+def _pH_numpy(a578, a434, a730, temperature, salinity, k, intercept, slope, out):
+    # Work in `out` as much as possible, to keep the number of temporary arrays down
+    q = np.subtract(a578, a730, out=out)
+    q /= a434 - a730
+    if slope:
+        q *= 1 - slope
+    if intercept:
+        q -= intercept
+    if k:
+        q -= k * a578
+    denominator = q * -0.1331
+    denominator += 2.222
+    q -= 0.00691
+    q /= denominator
+    np.log10(q, out=q)
+    q += 1245.69 / (temperature + 273.15)
+    q += 3.8275 + 0.00211 * (35 - salinity)
+    return q
+
+
+def _pH_numexpr(a578, a434, a730, temperature, salinity, k, intercept, slope, out):
+    q = numexpr.evaluate(
+        "(a578 - a730) / (a434 - a730) * (1 - slope) - intercept - k * a578",
+        local_dict={
+            "a578": a578,
+            "a434": a434,
+            "a730": a730,
+            "k": k,
+            "intercept": intercept,
+            "slope": slope,
+        },
+        out=out,
+        casting="same_kind",
+    )
+    return numexpr.evaluate(
+        "log10((q - 0.00691) / (2.222 - q * 0.1331)) + 1245.69 / (temperature + 273.15)"
+        " + 3.8275 + 0.00211 * (35 - salinity)",
+        local_dict={"q": q, "temperature": temperature, "salinity": salinity},
+        out=out,
+        casting="same_kind",
+    )
+
+
+def _pH_loop(a578, a434, a730, temperature, salinity, k, intercept, slope, out):
+    for i in range(out.size):
+        ratio = (a578[i] - a730[i]) / (a434[i] - a730[i])
+        q = ratio * (1 - slope) - intercept - k * a578[i]
+        out[i] = (
+            np.log10((q - 0.00691) / (2.222 - q * 0.1331))
+            + 1245.69 / (temperature[i] + 273.15)
+            + 3.8275
+            + 0.00211 * (35 - salinity[i])
+        )
+    return out
+
+
+# The numba version is only compiled the first time that it's used
+_pH_numba = None
+
+
+def _get_backend(backend):
+    # numba is never chosen automatically, because compiling it the first time it's
+    # used takes much longer than it saves for a single run
+    if backend == "auto":
+        backend = "numexpr" if numexpr else "numpy"
+    assert backend in ["numpy", "numexpr", "numba"], (
+        '`backend` must be one of "auto", "numpy", "numexpr" or "numba".'
+    )
+    if backend == "numexpr":
+        assert numexpr is not None, "numexpr is not installed."
+    if backend == "numba":
+        assert numba is not None, "numba is not installed."
+    return backend
+
+
+def calculate_pH(
+    pH_equation: str,
+    absorbance_578: np.ndarray,
+    absorbance_434: np.ndarray,
+    absorbance_730: np.ndarray,
+    temperature: np.ndarray | float = 25,
+    salinity: np.ndarray | float = 35,
+    dye_intercept: float = 0,
+    dye_slope: float = 0,
+    out: np.ndarray | None = None,
+    dtype: type = np.float64,
+    backend: str = "auto",
+) -> np.ndarray:
+    """Calculate pH from absorbances with one of the `pH_equations`, on plain
+    NumPy arrays.
+
+    Gives the same results as the functions in `pH_equations`, but calculates
+    the absorbance ratio only once and uses as few temporary arrays as possible.
+
+    Parameters
+    ----------
+    pH_equation : str
+        Which pH equation to use, either `"NIOZ"` or `"DSC07"`.
+    absorbance_578, absorbance_434, absorbance_730 : np.ndarray
+        Absorbances at 578, 434 and 730 nm.
+    temperature : np.ndarray | float, optional
+        Temperature in °C, by default 25.
+    salinity : np.ndarray | float, optional
+        Practical salinity, by default 35.
+    dye_intercept : float, optional
+        Intercept of the dye correction (SOP 6b eq. 9), by default 0.  Only used
+        by `"DSC07"`.
+    dye_slope : float, optional
+        Slope of the dye correction (SOP 6b eq. 9), by default 0.  Only used by
+        `"DSC07"`.
+    out : np.ndarray, optional
+        Array to write the results into, which must have the right shape and
+        `dtype`.  By default, a new array is made.
+    dtype : type, optional
+        Data type of the calculations and results, by default `np.float64`.
+        `np.float32` halves the memory used, with errors in pH of up to about
+        1e-5.
+    backend : str, optional
+        How to do the calculations: `"numpy"`, `"numexpr"` or `"numba"` (if
+        they are installed), or `"auto"` (default) to use numexpr if it is
+        installed, or otherwise NumPy.  numba is only used if asked for, because
+        it is compiled the first time that it's used, which takes a few seconds,
+        so it only pays off for very many measurements.
+
+    Returns
+    -------
+    np.ndarray
+        pH on the total scale.
+    """
+    global _pH_numba
+    assert pH_equation in pH_equations, (
+        '`pH_equation` must be one of `"NIOZ"` or `"DSC07"`.'
+    )
+    backend = _get_backend(backend)
+    a578, a434, a730 = (
+        np.asarray(a, dtype=dtype)
+        for a in (absorbance_578, absorbance_434, absorbance_730)
+    )
+    temperature = np.asarray(temperature, dtype=dtype)
+    salinity = np.asarray(salinity, dtype=dtype)
+    if out is None:
+        out = np.empty(a578.shape, dtype=dtype)
+    assert out.shape == a578.shape and out.dtype == dtype, (
+        "`out` must have the same shape as the absorbances and type `dtype`."
+    )
+    if not uses_dye[pH_equation]:
+        dye_intercept, dye_slope = 0, 0
+    constants = (k578[pH_equation], dye_intercept, dye_slope)
+    if backend == "numpy":
+        return _pH_numpy(a578, a434, a730, temperature, salinity, *constants, out)
+    elif backend == "numexpr":
+        return _pH_numexpr(a578, a434, a730, temperature, salinity, *constants, out)
+    if _pH_numba is None:
+        _pH_numba = numba.njit(cache=True)(_pH_loop)
+    temperature, salinity = (
+        np.ascontiguousarray(np.broadcast_to(x, out.shape))
+        for x in (temperature, salinity)
+    )
+    # The loop needs a flat view of `out` to write into, which only a contiguous
+    # array has - otherwise, it writes into a new array, which is copied back
+    flat = out.reshape(-1) if out.flags.c_contiguous else np.empty(out.size, dtype)
+    _pH_numba(
+        a578.ravel(),
+        a434.ravel(),
+        a730.ravel(),
+        temperature.ravel(),
+        salinity.ravel(),
+        *constants,
+        flat,
+    )
+    if not out.flags.c_contiguous:
+        out[...] = flat.reshape(out.shape)
+    return out
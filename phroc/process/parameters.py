@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 
 
@@ -123,6 +125,66 @@ def pH_tris_DD98(
     return pH
 
 
+# How many (temperature, salinity) pairs to remember - tris is only ever measured at
+# a few settings, so this is plenty
+pH_tris_cache_size = 1024
+
+
+@functools.lru_cache(maxsize=pH_tris_cache_size)
+def _pH_tris_DD98_cached(temperature: float, salinity: float) -> float:
+    return float(pH_tris_DD98(temperature=temperature, salinity=salinity))
+
+
+def pH_tris_DD98_lookup(temperature=25, salinity=35):
+    """Calculate pH of tris buffer as `pH_tris_DD98`, but remembering the result
+    for each (temperature, salinity) pair, with the least recently used pairs
+    forgotten once there are more than `pH_tris_cache_size` of them.
+
+    Arrays where every pair is the same, as for all the tris in a run, are
+    looked up once.  Other arrays are calculated with `pH_tris_DD98`, which is
+    quicker than finding the different pairs in them.
+
+    Parameters
+    ----------
+    temperature : float or array-like, optional
+        Temperature in °C, by default 25.
+    salinity : float or array-like, optional
+        Practical salinity, by default 35.
+
+    Returns
+    -------
+    float or np.ndarray
+        pH on the total scale.
+    """
+    if isinstance(temperature, (int, float)) and isinstance(salinity, (int, float)):
+        # (np.float64 is a float, too)
+        return _pH_tris_DD98_cached(float(temperature), float(salinity))
+    temperature, salinity = np.broadcast_arrays(
+        np.asarray(temperature, dtype=float), np.asarray(salinity, dtype=float)
+    )
+    if temperature.size == 0:
+        return np.empty(temperature.shape)
+    t, s = temperature.flat[0], salinity.flat[0]
+    if (temperature == t).all() and (salinity == s).all():
+        pH = np.full(temperature.shape, _pH_tris_DD98_cached(float(t), float(s)))
+    else:
+        pH = pH_tris_DD98(temperature=temperature, salinity=salinity)
+    return float(pH) if pH.ndim == 0 else pH
+
+
+def pH_tris_DD98_cache_info():
+    """How many times `pH_tris_DD98_lookup` found a (temperature, salinity) pair
+    that it remembered (`hits`) or had to calculate it (`misses`), and how many
+    pairs it remembers (`currsize`).
+    """
+    return _pH_tris_DD98_cached.cache_info()
+
+
+def pH_tris_DD98_cache_clear():
+    # Forget every pair and reset the counters
+    _pH_tris_DD98_cached.cache_clear()
+
+
 pH_equations = {
     "NIOZ": pH_NIOZ,
     "DSC07": pH_DSC07,
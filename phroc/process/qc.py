@@ -1,49 +1,128 @@
 import numpy as np
 
 
-def find_window(values, cutoff=0.001, minimum_values=3):
-    # First, sort values, then calculate how many points fall within the `cutoff`
-    # above each value (`matches`)
-    values_sorted = np.sort(values)
-    matches = []
-    means = []
-    for i, v in enumerate(values_sorted):
-        diff = values_sorted[i + 1 :] - v
-        matches.append(np.sum(diff <= cutoff))
-        means.append(
-            np.mean(values_sorted[(values_sorted >= v) & (values_sorted <= v + cutoff)])
+# Candidate windows whose means are closer than this to being equally far from the
+# median are treated as a tie, as rounding errors are bigger than any real difference
+tie_tolerance = 1e-12
+
+
+def get_sample_bounds(measurements):
+    # Measurements of each sample are contiguous, so sample s (counting from 1) is in
+    # rows sample_bounds[s - 1] to sample_bounds[s] of the measurements table
+    oa = measurements.order_analysis.values
+    return np.concatenate([[0], np.flatnonzero(oa[1:] != oa[:-1]) + 1, [oa.size]])
+
+
+def _bisect(lo, hi, keep_going):
+    # Vectorised binary search: for each element, find the first index in [lo, hi)
+    # where `keep_going(index, element)` is False, assuming that it is True for the
+    # start of the range and False for the rest
+    lo = lo.copy()
+    hi = hi.copy()
+    active = np.flatnonzero(lo < hi)
+    while active.size:
+        mid = (lo[active] + hi[active]) // 2
+        go = keep_going(mid, active)
+        lo[active[go]] = mid[go] + 1
+        hi[active[~go]] = mid[~go]
+        active = active[lo[active] < hi[active]]
+    return lo
+
+
+def find_windows_batch(values, bounds, cutoff=0.001, minimum_values=3):
+    # Run find_window on every sample at once, where sample g is in
+    # values[bounds[g] : bounds[g + 1]]
+    values = np.asarray(values)
+    sizes = np.diff(bounds)
+    starts = bounds[:-1]
+    sample = np.repeat(np.arange(sizes.size), sizes)
+    sample_start = starts[sample]
+    sample_end = bounds[1:][sample]
+    # First, sort values within each sample, then calculate how many points fall within
+    # the `cutoff` above each value (`matches`)
+    values_sorted = values[np.lexsort((values, sample))]
+    ix = np.arange(values.size)
+    matches = (
+        _bisect(
+            ix + 1,
+            sample_end,
+            lambda j, i: values_sorted[j] - values_sorted[i] <= cutoff,
         )
-    matches = np.array(matches)
-    means = np.array(means)
+        - ix
+        - 1
+    )
     # Find which values have the most `matches` - these are candidates for the lower
     # bound on the final window - but they have to match at least `minimum_values`
-    lower_bound = (matches == np.max(matches)) & (matches >= minimum_values - 1)
+    lower_bound = (matches == np.maximum.reduceat(matches, starts)[sample]) & (
+        matches >= minimum_values - 1
+    )
+    lower_bound_count = np.add.reduceat(lower_bound, starts)
     # If there aren't any suitable lower bounds, the window is all values
-    if np.sum(lower_bound) == 0:
-        window = np.full(values.shape, True)
+    window_all = np.full(sizes.shape, True)
+    window_start = np.zeros(sizes.shape)
     # If there is only one option for the lower bound, it is the start of the window
-    elif np.sum(lower_bound) == 1:
-        window = (values >= values_sorted[lower_bound]) & (
-            values <= values_sorted[lower_bound] + cutoff
-        )
+    single = lower_bound & (lower_bound_count == 1)[sample]
+    window_all[sample[single]] = False
+    window_start[sample[single]] = values_sorted[single]
     # If there are multiple options for the lower bound, take the one that has a
     # mean value closest to the population median
-    else:
-        to_median = np.abs(means - np.median(values))
-        to_median[~lower_bound] = np.inf
-        closest_to_median = to_median == np.min(to_median)
-        if sum(closest_to_median) == 1:
-            window = (values >= values_sorted[closest_to_median]) & (
-                values <= values_sorted[closest_to_median] + cutoff
-            )
+    multiple = np.flatnonzero(lower_bound & (lower_bound_count > 1)[sample])
+    if multiple.size:
+        sm = sample[multiple]
+        # Each candidate's window, within the sorted values of its sample
+        mean_start = _bisect(
+            sample_start[multiple],
+            sample_end[multiple],
+            lambda j, i: values_sorted[j] < values_sorted[multiple[i]],
+        )
+        mean_end = _bisect(
+            mean_start,
+            sample_end[multiple],
+            lambda j, i: values_sorted[j] <= values_sorted[multiple[i]] + cutoff,
+        )
+        # Sample medians, which are NaN if there are any NaNs in the sample
+        mid = starts + (sizes - 1) // 2
+        pH_median = (values_sorted[mid] + values_sorted[starts + sizes // 2]) / 2
+        pH_median[np.add.reduceat(np.isnan(values_sorted), starts) > 0] = np.nan
+        # Each candidate's mean, from cumulative sums of the sorted values - these are
+        # taken relative to the smallest value in each sample to keep rounding errors
+        # down, and the NaNs (which sort last, so are never in a window) count as 0
+        relative = np.nan_to_num(values_sorted - values_sorted[sample_start])
+        cumsum = np.concatenate([[0], np.cumsum(relative)])
+        with np.errstate(invalid="ignore"):
+            means = (cumsum[mean_end] - cumsum[mean_start]) / (mean_end - mean_start)
+        means += values_sorted[sample_start[multiple]]
+        to_median = np.full(values.shape, np.inf)
+        to_median[multiple] = np.abs(means - pH_median[sm])
+        # Means that are within rounding error of each other are a tie
+        closest_to_median = (
+            to_median <= np.minimum.reduceat(to_median, starts)[sample] + tie_tolerance
+        ) & (lower_bound_count > 1)[sample]
         # If this still doesn't narrow it down to one option, `window` is all values
-        else:
-            window = np.full(values.shape, True)
-    return window
+        closest_count = np.add.reduceat(closest_to_median, starts)
+        closest_to_median &= (closest_count == 1)[sample]
+        window_all[sample[closest_to_median]] = False
+        window_start[sample[closest_to_median]] = values_sorted[closest_to_median]
+    window_start = window_start[sample]
+    return window_all[sample] | (
+        (values >= window_start) & (values <= window_start + cutoff)
+    )
+
+
+def find_window(values, cutoff=0.001, minimum_values=3):
+    return find_windows_batch(
+        values,
+        np.array([0, np.size(values)]),
+        cutoff=cutoff,
+        minimum_values=minimum_values,
+    )
 
 
 def find_windows(measurements, cutoff=0.001, minimum_values=3):
-    for s, sample in measurements.groupby("order_analysis"):
-        M = measurements.order_analysis == s
-        measurements.loc[M, "pH_good"] = find_window(sample.pH.values)
+    measurements["pH_good"] = find_windows_batch(
+        measurements.pH.values,
+        get_sample_bounds(measurements),
+        cutoff=cutoff,
+        minimum_values=minimum_values,
+    )
     return measurements
@@ -1,39 +1,126 @@
-import os
-import tempfile
+import struct
 import zipfile
 
 import pandas as pd
+import pyarrow as pa
 
+from ..trace import traced
+from .journal import journal_from_frame
 from .usd import UpdatingSummaryDataset
 
 
-def read_phroc(filename: str) -> UpdatingSummaryDataset:
-    with tempfile.TemporaryDirectory() as tdir:
-        with zipfile.ZipFile(filename, "r") as z:
-            z.extractall(tdir)
-        measurements = pd.read_parquet(os.path.join(tdir, "measurements.parquet"))
-        try:
-            settings = pd.read_parquet(os.path.join(tdir, "settings.parquet"))
-        except FileNotFoundError:
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+
+def _read_parquet_member(filename, z, name):
+    # Read a parquet file straight out of the archive, without extracting it - for
+    # uncompressed members, just memory-map the file and read it in place
+    info = z.getinfo(name)
+    if info.compress_type != zipfile.ZIP_STORED:
+        # Parquet is read from the end, so decompress the member in one go rather
+        # than seeking around in the compressed stream
+        return pd.read_parquet(pa.BufferReader(z.read(info)))
+    with pa.memory_map(filename) as mm:
+        # The member's data starts after its local header, which has variable-length
+        # filename and extra fields
+        mm.seek(info.header_offset + 26)
+        name_length, extra_length = struct.unpack("<HH", mm.read(4))
+        mm.seek(info.header_offset + 30 + name_length + extra_length)
+        return pd.read_parquet(pa.BufferReader(mm.read_buffer(info.file_size)))
+
+
+@traced
+def read_phroc(
+    filename: str, compact: bool = False, float32_absorbance: bool = False
+) -> UpdatingSummaryDataset:
+    # Only measurements and settings are needed - samples.parquet is recalculated
+    # Datasets saved compact are read back compact, and others can be made compact
+    # with `compact` and `float32_absorbance` as for UpdatingSummaryDataset
+    with zipfile.ZipFile(filename, "r") as z:
+        measurements = _read_parquet_member(filename, z, "measurements.parquet")
+        if "settings.parquet" in z.namelist():
+            settings = _read_parquet_member(filename, z, "settings.parquet")
+        else:
             # If there isn't a settings file, it's v0.2
             settings = pd.DataFrame({"pH_equation": ["NIOZ"]})
             measurements["comments"] = ""
-    return UpdatingSummaryDataset(
+        journal = None
+        if "journal.parquet" in z.namelist():
+            journal = _read_parquet_member(filename, z, "journal.parquet")
+    usd = UpdatingSummaryDataset(
         measurements,
+        compact=compact,
+        float32_absorbance=float32_absorbance,
         **{s: settings[s].iloc[0] for s in settings.columns if s != "pHroc_version"},
     )
+    if journal is not None:
+        usd.journal, usd.journal_position = journal_from_frame(journal)
+    return usd
+
 
+# The columns of the Measurements sheet that a dataset is rebuilt from, with the
+# dtypes that read_agilent_pH gives them - everything else is worked out again
+excel_dtypes = {
+    "order": int,
+    "sample_name": str,
+    "dilution_factor": float,
+    "temperature": float,
+    "salinity": float,
+    "pH_instrument": float,
+    "absorbance_578": float,
+    "absorbance_434": float,
+    "absorbance_730": float,
+    "is_tris": bool,
+    "extra_mcp": bool,
+    "pH": float,
+    "pH_good": bool,
+    "comments": str,
+}
+# How the absorbance columns were named in pHroc v0.2
+excel_renames_v0_2 = {f"abs{wl}": f"absorbance_{wl}" for wl in [578, 434, 730]}
 
-def read_excel(filename: str) -> UpdatingSummaryDataset:
-    measurements = pd.read_excel(filename, sheet_name="Measurements").set_index("order")
-    try:
-        settings = pd.read_excel(filename, sheet_name="Settings")
+
+@traced
+def read_excel(filename: str, engine: str | None = None) -> UpdatingSummaryDataset:
+    """Import a dataset from a .xlsx file saved by pHroc (v0.2 or later).
+
+    Only the columns of the Measurements sheet that are needed to rebuild the
+    dataset are read, and the Samples sheet is not read at all.
+
+    Parameters
+    ----------
+    filename : str
+        The file to import.
+    engine : str, optional
+        The pandas engine to read the file with.  By default, `"calamine"` if
+        python-calamine is installed, which is much faster, otherwise
+        `"openpyxl"`.
+
+    Returns
+    -------
+    UpdatingSummaryDataset
+        The imported dataset.
+    """
+    if engine is None:
+        engine = "openpyxl" if python_calamine is None else "calamine"
+    dtypes = {**excel_dtypes, **{c: float for c in excel_renames_v0_2}}
+    with pd.ExcelFile(filename, engine=engine) as xlsx:
+        measurements = xlsx.parse(
+            "Measurements", usecols=lambda c: c in dtypes, dtype=dtypes
+        ).rename(columns=excel_renames_v0_2)
+        if "Settings" in xlsx.sheet_names:
+            settings = xlsx.parse("Settings")
+        else:
+            # If there isn't a settings sheet, it's v0.2
+            settings = pd.DataFrame({"pH_equation": ["NIOZ"]})
+    if "comments" in measurements:
         measurements["comments"] = measurements.comments.fillna("")
-    except ValueError:
-        # If there isn't a settings sheet, it's v0.2
-        settings = pd.DataFrame({"pH_equation": ["NIOZ"]})
+    else:
         measurements["comments"] = ""
     return UpdatingSummaryDataset(
-        measurements,
+        measurements.set_index("order"),
         **{s: settings[s].iloc[0] for s in settings.columns if s != "pHroc_version"},
     )
@@ -1,10 +1,76 @@
+import itertools
+
 import numpy as np
 import pandas as pd
 
+from .kernels import calculate_pH
 from .parameters import pH_equations
 from .qc import find_windows
 
 
+pH_renamer = {
+    "#": "order",
+    "Name": "sample_name",
+    "Dilut. Factor": "dilution_factor",
+    "Weight(25)": "temperature",
+    "Volume(35)": "salinity",
+    "pH": "pH_instrument",
+    "Abs<578nm>": "absorbance_578",
+    "Abs<434nm>": "absorbance_434",
+    "Abs<730nm>": "absorbance_730",
+}
+
+
+def _read_lines(filename, partial=False):
+    # Decode each instrument file only once - everything else works on these lines
+    with open(filename, "rb") as f:
+        data = f.read()
+    if not partial:
+        return data.decode("utf-16").splitlines()
+    # The instrument might still be writing the file, so only keep complete lines
+    text = data[: len(data) // 2 * 2].decode("utf-16", errors="ignore")
+    lines = text.splitlines()
+    if not text.endswith("\n"):
+        lines = lines[:-1]
+    return lines
+
+
+def _find_tables(lines):
+    # Get positions of data tables: each starts with a header line beginning with "#"
+    # and ends at the next blank line
+    is_table = False
+    table_start = []
+    table_end = []
+    for i, line in enumerate(lines):
+        if line.strip().startswith("#"):
+            table_start.append(i)
+            is_table = True
+        if is_table and line.strip() == "":
+            table_end.append(i)
+            is_table = False
+    return table_start, table_end
+
+
+def _parse_table(lines, table_start, table_end, widths, skip=0):
+    # Slice a fixed-width table out of `lines`, skipping the dashed line below the
+    # header and the first `skip` rows, and convert each column to numbers where
+    # possible
+    edges = np.cumsum([0, *widths])
+    spans = list(itertools.pairwise(edges))
+    header = lines[table_start]
+    rows = lines[table_start + 2 + skip : table_end]
+    table = {}
+    for a, b in spans:
+        column = header[a:b].strip()
+        values = [row[a:b].strip() for row in rows]
+        try:
+            values = pd.to_numeric(values)
+        except ValueError:
+            pass
+        table[pH_renamer.get(column, column)] = values
+    return pd.DataFrame(table).set_index("order")
+
+
 def get_order_analysis(measurements):
     measurements["order_analysis"] = (
         measurements.sample_name.shift() != measurements.sample_name
@@ -14,31 +80,45 @@ def get_order_analysis(measurements):
 
 def enforce_ts(measurements):
     # Make all temperature and salinity values constant for each sample's measurements
-    for s, sample in measurements.groupby("order_analysis"):
-        M = measurements.order_analysis == s
-        for col in ["temperature", "salinity"]:
-            measurements.loc[M, col] = measurements.loc[M, col].median()
+    oa = measurements.groupby("order_analysis", sort=False)
+    for col in ["temperature", "salinity"]:
+        measurements[col] = oa[col].transform("median")
     return measurements
 
 
 def enforce_comments(measurements):
     # Apply the majority comment across each sample
     # If there's no majority, take the earlier comment
-    for s, sample in measurements.groupby("order_analysis"):
-        M = measurements.order_analysis == s
-        s_comments = measurements[M].comments.unique()
-        if len(s_comments) > 1:
-            measurements.loc[M, "comments"] = s_comments[
-                np.argmax(
-                    [
-                        (measurements[M].comments == s_comment).sum()
-                        for s_comment in s_comments
-                    ]
-                )
-            ]
+    comments = measurements.comments.reset_index(drop=True)
+    order_analysis = measurements.order_analysis.reset_index(drop=True)
+    # The first row with the highest count in each sample belongs to the most common
+    # comment, and among tied comments to the one that appears earliest
+    counts = comments.groupby(
+        [order_analysis, comments], sort=False, dropna=False
+    ).transform("size")
+    majority = counts.groupby(order_analysis, sort=False).transform("idxmax")
+    measurements["comments"] = comments.values[majority.values]
     return measurements
 
 
+def compact_measurements(measurements, float32_absorbance=False):
+    # Store the columns that repeat the same few values on every row more compactly:
+    # sample_name and comments as categoricals, order_analysis as int32 and,
+    # optionally, the absorbances as float32
+    for col in ["sample_name", "comments"]:
+        measurements[col] = measurements[col].astype("category")
+    measurements["order_analysis"] = measurements.order_analysis.astype(np.int32)
+    if float32_absorbance:
+        for wl in [578, 434, 730]:
+            col = f"absorbance_{wl}"
+            measurements[col] = measurements[col].astype(np.float32)
+    return measurements
+
+
+def is_compact(measurements):
+    return isinstance(measurements.sample_name.dtype, pd.CategoricalDtype)
+
+
 def read_agilent_pH(
     filename: str,
     dye_intercept: float = 0,
@@ -111,102 +191,95 @@ def read_agilent_pH(
     assert pH_equation in pH_equations, (
         '`pH_equation` must be one of `"NIOZ"` or `"DSC07"`.'
     )
-    with open(filename, "rb") as f:
-        lines = f.read().decode("utf-16").splitlines()
-    # Get positions of data tables in the data file
-    is_table = False
-    table_start = []
-    table_end = []
-    for i, line in enumerate(lines):
-        if line.strip().startswith("#"):
-            table_start.append(i)
-            is_table = True
-        if is_table and line.strip() == "":
-            table_end.append(i)
-            is_table = False
-    # Import the data tables
-    pH_renamer = {
-        "#": "order",
-        "Name": "sample_name",
-        "Dilut. Factor": "dilution_factor",
-        "Weight(25)": "temperature",
-        "Volume(35)": "salinity",
-        "pH": "pH_instrument",
-        "Abs<578nm>": "absorbance_578",
-        "Abs<434nm>": "absorbance_434",
-        "Abs<730nm>": "absorbance_730",
-    }
-    ts = table_start[0]
-    te = table_end[0]
-    measurements = (
-        pd.read_fwf(
-            filename,
-            encoding="utf-16",
-            engine="python",
-            skiprows=[*range(ts), ts + 1],
-            skipfooter=len(lines) - te,
-            widths=[11, 17, 15, 13, 13, 13, 14],
-        )
-        .rename(columns=pH_renamer)
-        .set_index("order")
+    measurements = read_agilent_pH_rows(
+        filename,
+        dye_intercept=dye_intercept,
+        dye_slope=dye_slope,
+        pH_equation=pH_equation,
     )
-    measurements["sample_name"] = measurements.sample_name.where(
-        measurements.sample_name.notnull(), ""
+    if find_windows_auto:
+        measurements = find_windows(measurements)
+    # Enforce single temperature and salinity values for each sample
+    measurements = enforce_ts(measurements)
+    return measurements
+
+
+def read_agilent_pH_rows(
+    filename: str,
+    skip: int = 0,
+    partial: bool = False,
+    dye_intercept: float = 0,
+    dye_slope: float = 0,
+    pH_equation: str = "NIOZ",
+) -> pd.DataFrame | None:
+    """Import rows of raw pH data from the spectrophotometer without any of the
+    per-sample processing in `read_agilent_pH`.
+
+    Parameters
+    ----------
+    filename : str
+        The raw pH data file, with its Comments file alongside.
+    skip : int, optional
+        How many rows at the start of the tables to skip, e.g. because they
+        have already been imported, by default 0.
+    partial : bool, optional
+        Whether the files might still be being written by the instrument, by
+        default False.  If True, incomplete lines and tables are allowed, and
+        only the rows that are complete in all three tables are imported.
+    dye_intercept : float, optional
+        Intercept of the dye correction (SOP 6b eq. 9), by default 0.
+    dye_slope : float, optional
+        Slope of the dye correction (SOP 6b eq. 9), by default 0.
+    pH_equation : str, optional
+        Which pH equation to use, either `"NIOZ"` (default) or `"DSC07"`.
+
+    Returns
+    -------
+    pd.DataFrame | None
+        The imported rows, in the same format as from `read_agilent_pH`, but
+        with `order_analysis` counting from 1 within these rows only and with
+        temperature and salinity as input to the instrument.  None if there
+        are no (complete) rows after `skip`.
+    """
+    comments_filename = filename.replace(".TXT", "-COMMENTS.TXT")
+    lines = _read_lines(filename, partial=partial)
+    table_start, table_end = _find_tables(lines)
+    lines_c = _read_lines(comments_filename, partial=partial)
+    table_start_c, table_end_c = _find_tables(lines_c)
+    if partial:
+        # Tables that are still being written don't end with a blank line yet
+        if len(table_start) < 2 or len(table_start_c) < 2:
+            return None
+        table_end = [*table_end[:2], len(lines), len(lines)][:2]
+        table_end_c = [*table_end_c[:2], len(lines_c), len(lines_c)][:2]
+    # Import the data tables
+    measurements = _parse_table(
+        lines, table_start[0], table_end[0], [11, 17, 15, 13, 13, 13, 14], skip=skip
     )
-    ts = table_start[1]
-    te = table_end[1]
-    pH_b = (
-        pd.read_fwf(
-            filename,
-            encoding="utf-16",
-            engine="python",
-            skiprows=[*range(ts), ts + 1],
-            skipfooter=len(lines) - te,
-            widths=[11, 17, 15, 14],
-        )
-        .rename(columns=pH_renamer)
-        .set_index("order")
+    pH_b = _parse_table(
+        lines, table_start[1], table_end[1], [11, 17, 15, 14], skip=skip
     )
-    pH_b["sample_name"] = pH_b.sample_name.where(pH_b.sample_name.notnull(), "")
+    #  Import middle table of the Comments file to get non-truncated sample_name
+    pH_c = _parse_table(lines_c, table_start_c[1], table_end_c[1], [11, 23], skip=skip)
+    if partial:
+        # Only keep the rows that have been written to all three tables so far
+        nrows = min(measurements.shape[0], pH_b.shape[0], pH_c.shape[0])
+        measurements, pH_b, pH_c = (t.iloc[:nrows] for t in (measurements, pH_b, pH_c))
+    if measurements.shape[0] == 0:
+        return None
     for k, v in pH_b.items():
         if k == "sample_name":
             assert (measurements.sample_name == v).all()
         else:
             measurements[k] = v
-    #  Import Comments file to get non-truncated sample_name
-    with open(filename.replace(".TXT", "-COMMENTS.TXT"), "rb") as f:
-        lines = f.read().decode("utf-16").splitlines()
-    # Get positions of data tables in Comments file
-    is_table = False
-    table_start = []
-    table_end = []
-    for i, line in enumerate(lines):
-        if line.strip().startswith("#"):
-            table_start.append(i)
-            is_table = True
-        if is_table and line.strip() == "":
-            table_end.append(i)
-            is_table = False
-
-    # Import middle table
-    ts = table_start[1]
-    te = table_end[1]
-    pH_c = (
-        pd.read_fwf(
-            filename.replace(".TXT", "-COMMENTS.TXT"),
-            encoding="utf-16",
-            engine="python",
-            skiprows=[*range(ts), ts + 1],
-            skipfooter=len(lines) - te,
-            widths=[11, 23],
+    # Update sample_name and append
+    assert all(
+        c.startswith(m)
+        for c, m in zip(
+            pH_c.sample_name.loc[measurements.index].values,
+            measurements.sample_name.values,
         )
-        .rename(columns=pH_renamer)
-        .set_index("order")
     )
-    pH_c["sample_name"] = pH_c.sample_name.where(pH_c.sample_name.notnull(), "")
-    # Update sample_name and append
-    for i, row in measurements.iterrows():
-        assert pH_c.sample_name.loc[i].startswith(row.sample_name)
     measurements["sample_name"] = pH_c.sample_name
     # Set up additional columns
     measurements = get_order_analysis(measurements)
@@ -221,18 +294,15 @@ def read_agilent_pH(
                 "dye_slope": dye_slope,
             }
         )
-    measurements["pH"] = pH_equations[pH_equation](
-        measurements.absorbance_578,
-        measurements.absorbance_434,
-        measurements.absorbance_730,
-        temperature=measurements.temperature,
-        salinity=measurements.salinity,
+    measurements["pH"] = calculate_pH(
+        pH_equation,
+        measurements.absorbance_578.values,
+        measurements.absorbance_434.values,
+        measurements.absorbance_730.values,
+        temperature=measurements.temperature.values,
+        salinity=measurements.salinity.values,
         **pH_kwargs,
     )
     measurements["pH_good"] = True
-    if find_windows_auto:
-        measurements.pipe(find_windows)
     measurements["comments"] = ""
-    # Enforce single temperature and salinity values for each sample
-    measurements = enforce_ts(measurements)
     return measurements
@@ -0,0 +1,401 @@
+import datetime
+import os
+import re
+import shutil
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from ..trace import traced
+from .read import read_phroc
+from .read_raw import _find_tables, _read_lines
+from .usd import UpdatingSummaryDataset
+
+
+# Runs are saved in folders like samples/date=2024-10-10/run=241010-DY172-JETTY, so
+# that queries on date or run only need to open the matching folders
+partitioning = ds.partitioning(
+    pa.schema([("date", pa.string()), ("run", pa.string())]), flavor="hive"
+)
+index_columns = ["date", "run", "order_analysis", "sample_name", "is_tris", "extra_mcp"]
+runs_columns = [
+    "run",
+    "date",
+    "source",
+    "pH_equation",
+    "dye_intercept",
+    "dye_slope",
+    "n_samples",
+    "n_measurements",
+    "added",
+]
+
+
+def run_date(filename: str) -> datetime.date | None:
+    """When a run was measured: from the instrument's Comments file if it's next
+    to `filename`, otherwise from a date at the start of the file name, like
+    241010-DY172-JETTY or 2024-04-27-CTD1.  None if neither is found.
+    """
+    comments_filename = os.path.splitext(filename)[0] + "-COMMENTS.TXT"
+    if os.path.isfile(comments_filename):
+        try:
+            date = _comments_date(_read_lines(comments_filename))
+        except (IndexError, ValueError):
+            date = None
+        if date is not None:
+            return date
+    basename = os.path.basename(filename)
+    for pattern, fmt in [(r"\d{4}-\d{2}-\d{2}", "%Y-%m-%d"), (r"\d{6}", "%y%m%d")]:
+        match = re.match(pattern, basename)
+        if match:
+            try:
+                return datetime.datetime.strptime(match.group(), fmt).date()
+            except ValueError:
+                pass
+    return None
+
+
+def _comments_date(lines):
+    # The date of the first measurement, from whichever table in a Comments file has
+    # a "Date" column - the dates don't line up exactly with the header, so it's
+    # whichever value in the first row overlaps it
+    table_start, table_end = _find_tables(lines)
+    for start, end in zip(table_start, table_end):
+        header = re.search(r"\bDate\b", lines[start])
+        if header and end > start + 2:
+            for value in re.finditer(r"\S+", lines[start + 2]):
+                if value.start() < header.end() and value.end() > header.start():
+                    return datetime.datetime.strptime(value.group(), "%m/%d/%y").date()
+    return None
+
+
+def _date(date):
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+
+def _glob_regex(pattern):
+    # Convert a glob pattern like "64PE534-*" or "S31-1[0-9]" into a regular
+    # expression that means the same to pandas (re) and to pyarrow (RE2), which
+    # doesn't support everything that fnmatch.translate uses, e.g. "(?>...)"
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            regex += ".*"
+        elif c == "?":
+            regex += "."
+        elif c == "[":
+            # A "]" straight after "[" or "[!" is part of the class
+            j = i + 1 if pattern[i : i + 1] == "!" else i
+            j = pattern.find("]", j + 1 if pattern[j : j + 1] == "]" else j)
+            if j == -1:
+                regex += re.escape(c)
+                continue
+            body = pattern[i:j].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            elif body.startswith("^"):
+                body = "\\" + body
+            regex += f"[{body}]"
+            i = j + 1
+        else:
+            regex += re.escape(c)
+    return f"(?s)^{regex}$"
+
+
+class ProjectStore:
+    """Many processed runs saved together in one directory, to be searched all at
+    once.
+
+    Each run's samples and measurements are saved as parquet files partitioned by
+    date and run, next to a small index of every sample's name, tris flag and date.
+    Queries first find the matching runs in the index, so only their files are
+    read, and the other filters are pushed down into the parquet reader.
+
+    Parameters
+    ----------
+    path : str
+        The directory of the store, which is created if it doesn't exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _read_table(self, name, columns):
+        filename = os.path.join(self.path, f"{name}.parquet")
+        if os.path.isfile(filename):
+            return pd.read_parquet(filename)
+        return pd.DataFrame({c: [] for c in columns})
+
+    def _append_table(self, name, df, columns):
+        old = self._read_table(name, columns)
+        self._write_table(name, pd.concat([old, df]) if old.shape[0] else df)
+
+    def _write_table(self, name, df):
+        # Replace the file in one go, so it's never seen half-written
+        filename = os.path.join(self.path, f"{name}.parquet")
+        df.reset_index(drop=True).to_parquet(filename + ".tmp", index=False)
+        os.replace(filename + ".tmp", filename)
+
+    @property
+    def runs(self) -> pd.DataFrame:
+        """One row for each run: when it was measured, where it came from, its
+        settings and size, and when it was added to the store.
+        """
+        return self._read_table("runs", runs_columns)
+
+    @property
+    def index(self) -> pd.DataFrame:
+        """One row for each sample in every run, with its date, run,
+        order_analysis, sample_name, is_tris and extra_mcp.
+        """
+        return self._read_table("index", index_columns)
+
+    def _folder(self, name, date, run):
+        return os.path.join(
+            self.path, name, f"date={date}", f"run={quote(run, safe='')}"
+        )
+
+    @traced
+    def add(
+        self,
+        data: UpdatingSummaryDataset | str,
+        run: str | None = None,
+        date: str | datetime.date | None = None,
+        **kwargs,
+    ) -> str:
+        """Add a run to the store, replacing any run that is already there with
+        the same name.
+
+        Parameters
+        ----------
+        data : UpdatingSummaryDataset | str
+            The run, either as a dataset or as a .phroc file or raw pH data file
+            to import.
+        run : str, optional
+            The name of the run, by default the file name without its extension.
+            Required if `data` is a dataset.
+        date : str | datetime.date, optional
+            When the run was measured.  By default, this is taken from the
+            instrument's Comments file if it is next to the file, or otherwise
+            from a date at the start of the file name (YYMMDD or YYYY-MM-DD).
+            Required if `data` is a dataset.
+        **kwargs
+            Passed on to `UpdatingSummaryDataset` when importing a raw pH data
+            file.
+
+        Returns
+        -------
+        str
+            The name of the run.
+        """
+        source = ""
+        if isinstance(data, str):
+            source = os.path.abspath(data)
+            if run is None:
+                run = os.path.splitext(os.path.basename(data))[0]
+            if date is None:
+                date = run_date(data)
+            if data.endswith(".phroc"):
+                data = read_phroc(data)
+            else:
+                data = UpdatingSummaryDataset(data, **kwargs)
+        assert run is not None, "`run` must be given to add a dataset."
+        assert date is not None, f"Could not find the date of `{run}` - set `date`."
+        date = _date(date)
+        self.remove(run)
+        samples = data.samples.reset_index()
+        for name, df in [
+            ("samples", samples),
+            ("measurements", data.measurements.reset_index()),
+        ]:
+            folder = self._folder(name, date, run)
+            os.makedirs(folder)
+            df.to_parquet(
+                os.path.join(folder, "part-0.parquet"), compression="zstd", index=False
+            )
+        index = samples[index_columns[2:]].copy()
+        index.insert(0, "run", run)
+        index.insert(0, "date", date)
+        self._append_table("index", index, index_columns)
+        runs = pd.DataFrame(
+            {
+                "run": [run],
+                "date": [date],
+                "source": [source],
+                "pH_equation": [data.pH_equation],
+                "dye_intercept": [data.dye_intercept],
+                "dye_slope": [data.dye_slope],
+                "n_samples": [data.samples.shape[0]],
+                "n_measurements": [data.measurements.shape[0]],
+                "added": [pd.Timestamp.now()],
+            }
+        )
+        self._append_table("runs", runs, runs_columns)
+        return run
+
+    @traced
+    def remove(self, run: str):
+        """Remove a run from the store, if it is there."""
+        runs = self.runs
+        if run not in runs.run.values:
+            return
+        date = runs.date[runs.run == run].iloc[0]
+        for name in ["samples", "measurements"]:
+            folder = self._folder(name, date, run)
+            shutil.rmtree(folder, ignore_errors=True)
+            if not os.listdir(os.path.dirname(folder)):
+                os.rmdir(os.path.dirname(folder))
+        index = self.index
+        self._write_table("index", index[index.run != run])
+        self._write_table("runs", runs[runs.run != run])
+
+    def read_run(self, run: str) -> UpdatingSummaryDataset:
+        """Get one run from the store as a dataset, e.g. to edit it and add it
+        back.
+        """
+        runs = self.runs.set_index("run")
+        assert run in runs.index, f"`{run}` is not in the store."
+        settings = runs.loc[run]
+        measurements = pd.read_parquet(
+            os.path.join(
+                self._folder("measurements", settings.date, run), "part-0.parquet"
+            )
+        ).set_index("order")
+        return UpdatingSummaryDataset(
+            measurements,
+            dye_intercept=settings.dye_intercept,
+            dye_slope=settings.dye_slope,
+            pH_equation=settings.pH_equation,
+        )
+
+    def _query(
+        self, name, run, date_from, date_to, sample_name, is_tris, extra_mcp, columns
+    ):
+        # Find the runs with any matching samples from the index, so that only their
+        # files are opened
+        index = self.index
+        match = pd.Series(True, index=index.index)
+        if run is not None:
+            match &= index.run.isin([run] if isinstance(run, str) else run)
+        if date_from is not None:
+            match &= index.date >= _date(date_from)
+        if date_to is not None:
+            match &= index.date <= _date(date_to)
+        if sample_name is not None:
+            match &= index.sample_name.str.match(_glob_regex(sample_name))
+        if is_tris is not None:
+            match &= index.is_tris == is_tris
+        if extra_mcp is not None:
+            match &= index.extra_mcp == extra_mcp
+        order = "order" if name == "measurements" else "order_analysis"
+        if columns is not None:
+            columns = ["date", "run", order, *[c for c in columns if c != order]]
+        if index.shape[0] == 0:
+            return pd.DataFrame({c: [] for c in columns or ["date", "run", order]})
+        runs = index[match].drop_duplicates("run")
+        if runs.shape[0] == 0:
+            # Still read one run, just for the columns of the empty result
+            runs = index.iloc[:1]
+        files = [
+            os.path.join(self._folder(name, date, run), "part-0.parquet")
+            for date, run in zip(runs.date, runs.run)
+        ]
+        # Then filter the rows within those runs while reading them
+        expression = ds.field("run").isin(index.run[match].unique())
+        if sample_name is not None:
+            expression &= pc.match_substring_regex(
+                ds.field("sample_name"), _glob_regex(sample_name)
+            )
+        if is_tris is not None:
+            expression &= ds.field("is_tris") == is_tris
+        if extra_mcp is not None:
+            expression &= ds.field("extra_mcp") == extra_mcp
+        dataset = ds.dataset(
+            files,
+            format="parquet",
+            partitioning=partitioning,
+            partition_base_dir=os.path.join(self.path, name),
+        )
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+        # Put the partition columns first, and everything in order
+        df = df[["date", "run", *[c for c in df.columns if c not in ["date", "run"]]]]
+        return df.sort_values(["date", "run", order], ignore_index=True)
+
+    @traced
+    def samples(
+        self,
+        run: str | list[str] | None = None,
+        date_from: str | datetime.date | None = None,
+        date_to: str | datetime.date | None = None,
+        sample_name: str | None = None,
+        is_tris: bool | None = None,
+        extra_mcp: bool | None = None,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Find samples across all the runs in the store.
+
+        Parameters
+        ----------
+        run : str | list[str], optional
+            Only samples from this run or these runs.
+        date_from : str | datetime.date, optional
+            Only samples from runs measured on or after this date.
+        date_to : str | datetime.date, optional
+            Only samples from runs measured on or before this date.
+        sample_name : str, optional
+            Only samples with names matching this glob pattern, e.g.
+            `"64PE534-*"` or `"S31-1[0-9]"` (case-sensitive).
+        is_tris : bool, optional
+            Only tris (True) or only not tris (False) samples.
+        extra_mcp : bool, optional
+            Only samples with (True) or without (False) extra mCP.
+        columns : list[str], optional
+            Which columns of the samples table to read, by default all.
+
+        Returns
+        -------
+        pd.DataFrame
+            The matching samples, ordered by date, run and order_analysis, with
+            the date and run as the first columns.
+        """
+        return self._query(
+            "samples", run, date_from, date_to, sample_name, is_tris, extra_mcp, columns
+        )
+
+    @traced
+    def measurements(
+        self,
+        run: str | list[str] | None = None,
+        date_from: str | datetime.date | None = None,
+        date_to: str | datetime.date | None = None,
+        sample_name: str | None = None,
+        is_tris: bool | None = None,
+        extra_mcp: bool | None = None,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Find measurements across all the runs in the store, filtered by
+        their sample in the same way as `samples`.
+
+        Returns
+        -------
+        pd.DataFrame
+            The matching measurements, ordered by date, run and order, with the
+            date and run as the first columns.
+        """
+        return self._query(
+            "measurements",
+            run,
+            date_from,
+            date_to,
+            sample_name,
+            is_tris,
+            extra_mcp,
+            columns,
+        )
@@ -0,0 +1,366 @@
+import argparse
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+
+from .parameters import pH_NIOZ, pH_tris_DD98
+
+
+# Fixed text around the data tables, as written by the instrument
+header_main = [
+    "",
+    r"        Method file : C:\Chem32\1\METHODS\PH.M",
+    "                      Last update: Date 2/28/2023  Time 12:10:49",
+    "        Information : Default Method",
+    "        Data File   : <data not saved>",
+    "",
+    "        Overlaid Spectra:             ",
+    r"        {C:\CHEM32\1\DATA\{run}\Pic_0001.WMF}",
+    "",
+    "        Equation : pH = LOG((((WL1-WL3)/(WL2-WL3)-0.00815*WL1)-0.00",
+    "                   691)/(2.222-((WL1-WL3)/(WL2-WL3)-0.00815*WL1)*0.",
+    "                   1331))+1245.69/(Wt+273.15)+3.8275+0.00211*(35-V)",
+    "                    ",
+    "        Where    : WL1 = Abs(578nm), WL2 = Abs(434nm), WL3 = Abs(730nm),"
+    + " Wt = Weight, V = Volume",
+    "",
+]
+footer_main = [
+    "",
+    "        Report generated by : CARY8454" + " " * 37 + "Signature: ................",
+    "",
+    "        " + "-" * 94,
+    " " * 38 + "*** End Ratio/Equation Report ***",
+    "        " + "-" * 94,
+]
+header_comments = ["        Sample Table", "        ------------"]
+footer_comments = [
+    "        " + "-" * 94,
+    " " * 41 + "*** End Hardcopy window ***",
+    "        " + "-" * 94,
+]
+tables_main = [
+    [
+        "         #  Name              Dilut. Factor   Weight(25)   Volume(35)"
+        + "           pH    Abs<578nm>",
+        "        " + "-" * 88,
+    ],
+    ["         #  Name                Abs<434nm>    Abs<730nm>", "        " + "-" * 48],
+]
+tables_comments = [
+    [
+        "         #  Name                  Dilut. Factor   Weight(25)   Volume(35)"
+        + " Solvent           Path Unit ",
+        "        " + "-" * 94,
+    ],
+    [
+        "         #  Name                    Date      Time    Comment                ",
+        "        " + "-" * 69,
+    ],
+    [
+        "         #  Name                 Filename"
+        + " " * 38
+        + "Operator               ",
+        "        " + "-" * 94,
+    ],
+]
+
+
+def _order(order):
+    # The instrument right-aligns the order in the first 10 characters, but lets
+    # orders from 100 run into the gap before the sample name
+    return f"{order:>10}  " if order < 100 else f"{order:>11} "
+
+
+def _sci(value):
+    # Absorbance at 730 nm is written like 9.7694E-3, without a padded exponent
+    mantissa, exponent = f"{value:.4E}".split("E")
+    return f"{mantissa}E{int(exponent)}"
+
+
+def write_agilent_pH(filename: str, measurements: pd.DataFrame):
+    """Write measurements to a raw pH data file and its Comments file, in the
+    same format as the spectrophotometer.
+
+    Parameters
+    ----------
+    filename : str
+        The raw pH data file to write, ending with ".TXT".  The Comments file
+        is written alongside it, with "-COMMENTS" added before the extension.
+    measurements : pd.DataFrame
+        One row per measurement, in order, with the columns `sample_name`,
+        `temperature`, `salinity`, `absorbance_578`, `absorbance_434` and
+        `absorbance_730`.  Optional columns are `dilution_factor` (default 1),
+        `pH_instrument` (default calculated with `pH_NIOZ`), `comment`
+        (default the `sample_name`) and `analysis_time` (default 20 seconds
+        apart, starting from 1 January 2024 at 08:00).  Sample names longer than
+        16 characters are truncated in the raw pH data file like the instrument
+        does, and may be at most 22 characters long.
+    """
+    assert filename.endswith(".TXT"), "`filename` must end with `.TXT`."
+    m = measurements
+    n = m.shape[0]
+    names = m.sample_name.values.astype(str)
+    assert all(len(name) <= 22 for name in names), (
+        "Sample names cannot be longer than 22 characters."
+    )
+    dilution_factor = m.dilution_factor.values if "dilution_factor" in m else np.ones(n)
+    if "pH_instrument" in m:
+        pH_instrument = m.pH_instrument.values
+    else:
+        pH_instrument = np.round(
+            pH_NIOZ(
+                m.absorbance_578.values,
+                m.absorbance_434.values,
+                m.absorbance_730.values,
+                temperature=m.temperature.values,
+                salinity=m.salinity.values,
+            ),
+            4,
+        )
+    comments = m.comment.values if "comment" in m else names
+    if "analysis_time" in m:
+        times = pd.to_datetime(m.analysis_time).dt.to_pydatetime()
+    else:
+        start = datetime.datetime(2024, 1, 1, 8)
+        times = [start + datetime.timedelta(seconds=20 * i) for i in range(n)]
+    rows = zip(
+        range(1, n + 1),
+        names,
+        dilution_factor,
+        m.temperature.values,
+        m.salinity.values,
+        pH_instrument,
+        m.absorbance_578.values,
+        m.absorbance_434.values,
+        m.absorbance_730.values,
+        comments,
+        times,
+    )
+    main = [[], []]
+    comm = [[], [], []]
+    for o, name, d, t, s, pH, a578, a434, a730, comment, time in rows:
+        order = _order(o)
+        short = name[:16]
+        main[0].append(
+            f"{order}{short:<16}{d:>15.5f}{t:>13.5f}{s:>13.5f}{pH:>13.5f}{a578:>14.5f}"
+        )
+        main[1].append(f"{order}{short:<16}{a434:>14.5f}{_sci(a730):>14}")
+        comm[0].append(
+            f"{order}{name:<22}{d:>13.5f}{t:>13.5f}{s:>13.5f}{'1.000 cm':>26}   "
+        )
+        date = f"{time.month}/{time.day}/{time:%y}"
+        comm[1].append(f"{order}{name:<22}{date:<8}  {time:%H:%M:%S}  {comment:<23}")
+        comm[2].append(f"{order}{name:<67}CARY8454               ")
+    run = os.path.splitext(os.path.basename(filename))[0]
+    lines = [line.replace("{run}", run) for line in header_main]
+    for header, table in zip(tables_main, main):
+        lines += ["", *header, *table]
+    lines += ["", *footer_main]
+    lines_c = list(header_comments)
+    for header, table in zip(tables_comments, comm):
+        lines_c += [*header, *table, ""]
+    lines_c += footer_comments
+    for fname, text in [
+        (filename, lines),
+        (filename.replace(".TXT", "-COMMENTS.TXT"), lines_c),
+    ]:
+        with open(fname, "wb") as f:
+            f.write("\r\n".join([*text, ""]).encode("utf-16"))
+
+
+def _absorbances(pH, temperature, salinity, absorbance_434, absorbance_730):
+    # Invert pH_NIOZ to find the absorbance at 578 nm that gives `pH`
+    x = 10 ** (
+        pH - 1245.69 / (temperature + 273.15) - 3.8275 - 0.00211 * (35 - salinity)
+    )
+    ratio = (0.00691 + 2.222 * x) / (1 + 0.1331 * x)
+    d = absorbance_434 - absorbance_730
+    return (ratio + absorbance_730 / d) / (1 / d - 0.00815)
+
+
+def _sample_names(
+    n_samples, tris_fraction, extra_mcp_fraction, long_name_fraction, rng
+):
+    # Name the samples in order of analysis, like CTD samples from a cruise with
+    # tris measured in between
+    names = []
+    kinds = []
+    station = 0
+    tris = 0
+    for _ in range(n_samples):
+        long = rng.random() < long_name_fraction
+        if kinds and kinds[-1] == "seawater" and rng.random() < extra_mcp_fraction:
+            # Measure the previous sample again after adding more indicator
+            kinds.append("extra_mcp")
+            names.append(f"{names[-1][:18].rstrip('-')}-+20")
+        elif rng.random() < tris_fraction:
+            tris += 1
+            kinds.append("tris")
+            names.append(f"TRIS-NIOZ-231005-{tris}" if long else f"TRIS-{tris}")
+        else:
+            cast, niskin = divmod(station, 12)
+            station += 1
+            kinds.append("seawater")
+            names.append(
+                f"DY172-STN{cast + 1:03d}-CTD1-N{niskin + 1:02d}"
+                if long
+                else f"STN{cast + 1:03d}-{niskin + 1:02d}"
+            )
+    return names, np.array(kinds)
+
+
+def synthetic_measurements(
+    n_samples: int = 100,
+    repeats: int | tuple[int, int] = 5,
+    tris_fraction: float = 0.1,
+    extra_mcp_fraction: float = 0.0,
+    long_name_fraction: float = 0.0,
+    pH_noise: float = 0.0004,
+    carryover: float = 0.0,
+    baseline_noise: float = 0.005,
+    start: datetime.datetime = datetime.datetime(2024, 1, 1, 8),
+    seed: int | None = None,
+) -> pd.DataFrame:
+    """Simulate a run on the spectrophotometer, to be written with
+    `write_agilent_pH`.
+
+    Parameters
+    ----------
+    n_samples : int, optional
+        How many samples to measure, by default 100.  This includes the tris
+        and extra-mCP samples.
+    repeats : int | tuple[int, int], optional
+        How many times each sample is measured, by default 5.  If a tuple, each
+        sample is measured a random number of times between the two values
+        (inclusive).
+    tris_fraction : float, optional
+        Probability of each sample being tris, by default 0.1.
+    extra_mcp_fraction : float, optional
+        Probability of a seawater sample being measured again with extra
+        indicator, as a sample with the same name plus "-+20", by default 0.
+    long_name_fraction : float, optional
+        Probability of a sample's name being too long for the raw pH data file,
+        where it is truncated to 16 characters, by default 0.
+    pH_noise : float, optional
+        Standard deviation of the pH between measurements of the same sample,
+        by default 0.0004.
+    carryover : float, optional
+        How much of the previous sample is left in the cell for the first
+        measurement of each sample, by default 0.  The effect decays by the same
+        factor with each measurement after that.
+    baseline_noise : float, optional
+        Standard deviation of the absorbance at 730 nm, by default 0.005.
+    start : datetime.datetime, optional
+        When the first measurement is made, by default 1 January 2024 at 08:00.
+    seed : int | None, optional
+        Seed for the random number generator, by default None.
+
+    Returns
+    -------
+    pd.DataFrame
+        The simulated measurements, including when each one was made.
+    """
+    rng = np.random.default_rng(seed)
+    names, kinds = _sample_names(
+        n_samples, tris_fraction, extra_mcp_fraction, long_name_fraction, rng
+    )
+    if isinstance(repeats, int):
+        counts = np.full(n_samples, repeats)
+    else:
+        counts = rng.integers(repeats[0], repeats[1] + 1, n_samples)
+    # Properties of each sample
+    pH_sample = rng.normal(7.9, 0.1, n_samples)
+    salinity_sample = np.round(rng.normal(35, 0.5, n_samples), 2)
+    is_tris = kinds == "tris"
+    pH_sample[is_tris] = pH_tris_DD98() + rng.normal(0, 0.002, is_tris.sum())
+    salinity_sample[is_tris] = 35
+    for s in np.flatnonzero(kinds == "extra_mcp"):
+        # More indicator pushes the pH a little towards the indicator's own pH
+        pH_sample[s] = pH_sample[s - 1] + rng.normal(-0.003, 0.001)
+        salinity_sample[s] = salinity_sample[s - 1]
+    pH_previous = np.concatenate([pH_sample[:1], pH_sample[:-1]])
+    # Properties of each measurement
+    n = counts.sum()
+    firsts = np.cumsum(counts) - counts
+    repeat = np.arange(n) - np.repeat(firsts, counts)
+    pH = (
+        np.repeat(pH_sample, counts)
+        + carryover ** (repeat + 1) * np.repeat(pH_previous - pH_sample, counts)
+        + rng.normal(0, pH_noise, n)
+    )
+    temperature = np.full(n, 25.0)
+    salinity = np.repeat(salinity_sample, counts)
+    absorbance_434 = np.round(rng.uniform(0.35, 0.5, n), 5)
+    absorbance_730 = np.array(
+        [float(_sci(a)) for a in rng.normal(0, baseline_noise, n)]
+    )
+    absorbance_578 = np.round(
+        _absorbances(pH, temperature, salinity, absorbance_434, absorbance_730), 5
+    )
+    # Rinse and fill the cell between samples, then about 30 s per measurement
+    seconds = np.where(repeat == 0, rng.uniform(60, 180, n), rng.uniform(20, 40, n))
+    analysis_time = pd.Timestamp(start) + pd.to_timedelta(
+        np.round(np.cumsum(seconds) - seconds[0]), unit="s"
+    )
+    return pd.DataFrame(
+        {
+            "sample_name": np.repeat(names, counts),
+            "temperature": temperature,
+            "salinity": salinity,
+            "absorbance_578": absorbance_578,
+            "absorbance_434": absorbance_434,
+            "absorbance_730": absorbance_730,
+            "analysis_time": analysis_time,
+        }
+    )
+
+
+def synthetic_run(args: list[str] | None = None) -> int:
+    """Command-line interface for writing a synthetic raw pH data file and its
+    Comments file, run as `phroc synthetic`.  Returns the exit status.
+    """
+    parser = argparse.ArgumentParser(
+        prog="phroc synthetic",
+        description="Write a simulated run in the spectrophotometer's format.",
+    )
+    parser.add_argument("filename", help="raw pH data file to write (.TXT)")
+    parser.add_argument(
+        "-n", "--samples", type=int, default=100, help="number of samples"
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        type=int,
+        nargs="+",
+        default=[5],
+        help="measurements per sample, or the minimum and maximum",
+    )
+    parser.add_argument("--tris", type=float, default=0.1, help="fraction of tris")
+    parser.add_argument(
+        "--extra-mcp", type=float, default=0.0, help="fraction of extra-mCP samples"
+    )
+    parser.add_argument(
+        "--long-names", type=float, default=0.0, help="fraction of long names"
+    )
+    parser.add_argument("--pH-noise", type=float, default=0.0004)
+    parser.add_argument("--carryover", type=float, default=0.0)
+    parser.add_argument("--baseline-noise", type=float, default=0.005)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(args)
+    measurements = synthetic_measurements(
+        n_samples=args.samples,
+        repeats=args.repeats[0] if len(args.repeats) == 1 else tuple(args.repeats),
+        tris_fraction=args.tris,
+        extra_mcp_fraction=args.extra_mcp,
+        long_name_fraction=args.long_names,
+        pH_noise=args.pH_noise,
+        carryover=args.carryover,
+        baseline_noise=args.baseline_noise,
+        seed=args.seed,
+    )
+    write_agilent_pH(args.filename, measurements)
+    print(f"Wrote {measurements.shape[0]} measurements to {args.filename}")
+    return 0
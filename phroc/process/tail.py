@@ -0,0 +1,118 @@
+import os
+import time
+from collections.abc import Iterator
+
+from .read_raw import read_agilent_pH_rows
+from .usd import UpdatingSummaryDataset
+
+
+def update_agilent_pH(
+    filename: str,
+    usd: UpdatingSummaryDataset | None = None,
+    dye_intercept: float = 0.0,
+    dye_slope: float = 0.0,
+    pH_equation: str = "NIOZ",
+) -> tuple[UpdatingSummaryDataset | None, list[int]]:
+    """Import any new measurements from a raw pH data file that the instrument
+    might still be writing.
+
+    Parameters
+    ----------
+    filename : str
+        The raw pH data file, with its Comments file alongside.
+    usd : UpdatingSummaryDataset, optional
+        The dataset imported from `filename` so far, by default None, in which
+        case everything in the file so far is imported.
+    dye_intercept : float, optional
+        Intercept of the dye correction (SOP 6b eq. 9), by default 0.  Ignored
+        if `usd` is provided.
+    dye_slope : float, optional
+        Slope of the dye correction (SOP 6b eq. 9), by default 0.  Ignored if
+        `usd` is provided.
+    pH_equation : str, optional
+        Which pH equation to use, either `"NIOZ"` (default) or `"DSC07"`.
+        Ignored if `usd` is provided.
+
+    Returns
+    -------
+    UpdatingSummaryDataset | None
+        The updated dataset (the same object as `usd`, if provided), or None if
+        there are no complete measurements in the file yet.
+    list[int]
+        The order_analysis of every sample that was added or changed.
+    """
+    if usd is not None:
+        dye_intercept = usd.dye_intercept
+        dye_slope = usd.dye_slope
+        pH_equation = usd.pH_equation
+    measurements = read_agilent_pH_rows(
+        filename,
+        skip=0 if usd is None else usd.measurements.shape[0],
+        partial=True,
+        dye_intercept=dye_intercept,
+        dye_slope=dye_slope,
+        pH_equation=pH_equation,
+    )
+    if measurements is None:
+        return usd, []
+    if usd is None:
+        usd = UpdatingSummaryDataset(
+            measurements,
+            dye_intercept=dye_intercept,
+            dye_slope=dye_slope,
+            pH_equation=pH_equation,
+        )
+        return usd, usd.samples.index.tolist()
+    return usd, usd.append_measurements(measurements)
+
+
+def _file_state(filename):
+    # Cheap check for whether the instrument has written anything new
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def tail_agilent_pH(
+    filename: str,
+    interval: float = 1.0,
+    timeout: float | None = None,
+    **kwargs,
+) -> Iterator[tuple[UpdatingSummaryDataset, list[int]]]:
+    """Follow a raw pH data file while the instrument is still running,
+    importing only the new measurements each time the files change.
+
+    Parameters
+    ----------
+    filename : str
+        The raw pH data file, with its Comments file alongside.
+    interval : float, optional
+        How often to check the files for changes in seconds, by default 1.
+    timeout : float, optional
+        Stop after this many seconds without any new measurements, by default
+        None, i.e., never stop.
+    **kwargs
+        Passed on to `update_agilent_pH`.
+
+    Yields
+    ------
+    UpdatingSummaryDataset
+        The dataset imported so far (always the same object).
+    list[int]
+        The order_analysis of every sample that was added or changed.
+    """
+    filenames = [filename, filename.replace(".TXT", "-COMMENTS.TXT")]
+    usd = None
+    state = None
+    last_change = time.monotonic()
+    while timeout is None or time.monotonic() - last_change < timeout:
+        new_state = [_file_state(f) for f in filenames]
+        if new_state != state and None not in new_state:
+            state = new_state
+            usd, changed = update_agilent_pH(filename, usd=usd, **kwargs)
+            if changed:
+                last_change = time.monotonic()
+                yield usd, changed
+        time.sleep(interval)
@@ -0,0 +1,327 @@
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ..trace import traced
+from .read import read_phroc
+from .store import run_date
+from .usd import UpdatingSummaryDataset
+
+
+# Columns of TrisControlChart.table, after the ones describing each tris sample
+stats_columns = [
+    "n_control",
+    "mean_control",
+    "sd_control",
+    "center",
+    "sigma",
+    "rolling_mean",
+    "rolling_sd",
+]
+flag_columns = ["warning", "action", "drift"]
+
+
+class TrisControlChart:
+    """Control chart of the difference between measured and expected tris pH,
+    across many runs.
+
+    The chart has one row per tris sample in `table`, ordered by the date of its
+    run.  For each row, `offset` is the measured minus the expected pH, and
+    `center` and `sigma` are the mean and standard deviation of the offsets of
+    the in-control rows before it, once there are at least `min_history` of
+    them.  The row is flagged as a `warning` if its offset is more than 2 sigma
+    from the center, as an `action` (and so not in control) if more than 3
+    sigma, and as `drift` if the rolling mean of the last `window` offsets is
+    more than 3 standard errors from the center.  `n_control`, `mean_control`
+    and `sd_control` are the statistics of the in-control rows up to and
+    including it.
+
+    The statistics are kept up to date as runs are added: only the rows from the
+    new run onwards are recalculated, starting from the running totals just
+    before them, so adding today's run to years of history is quick.
+
+    Parameters
+    ----------
+    window : int, optional
+        How many tris samples the rolling statistics cover, by default 20.
+    min_history : int, optional
+        How many tris samples there must be before the control limits are used,
+        by default 10.
+    """
+
+    def __init__(self, window: int = 20, min_history: int = 10):
+        self.window = window
+        self.min_history = min_history
+        self.table = pd.DataFrame(
+            {
+                "date": pd.Series(dtype="datetime64[us]"),
+                "run": pd.Series(dtype=str),
+                "order_analysis": pd.Series(dtype=int),
+                "sample_name": pd.Series(dtype=str),
+                "salinity": pd.Series(dtype=float),
+                "temperature": pd.Series(dtype=float),
+                "pH": pd.Series(dtype=float),
+                "pH_tris_expected": pd.Series(dtype=float),
+                "offset": pd.Series(dtype=float),
+                "n_control": pd.Series(dtype=int),
+                **{c: pd.Series(dtype=float) for c in stats_columns[1:]},
+                **{c: pd.Series(dtype=bool) for c in flag_columns},
+            }
+        )
+
+    @traced
+    def add(
+        self,
+        data: UpdatingSummaryDataset | str,
+        run: str | None = None,
+        date: str | pd.Timestamp | None = None,
+    ) -> pd.DataFrame:
+        """Add the tris samples from a run to the chart, replacing the run if it
+        is already there.
+
+        Parameters
+        ----------
+        data : UpdatingSummaryDataset | str
+            The run, either as a dataset or as a .phroc file or raw pH data file
+            to import.
+        run : str, optional
+            The name of the run, by default the file name without its extension.
+            Required if `data` is a dataset.
+        date : str | pd.Timestamp, optional
+            When the run was measured.  By default, this is taken from the
+            instrument's Comments file if it is next to the file, or otherwise
+            from a date at the start of the file name (YYMMDD or YYYY-MM-DD).
+            Required if `data` is a dataset.
+
+        Returns
+        -------
+        pd.DataFrame
+            The rows of `table` for the run's tris samples.
+        """
+        if isinstance(data, str):
+            if run is None:
+                run = os.path.splitext(os.path.basename(data))[0]
+            if date is None:
+                date = run_date(data)
+            if data.endswith(".phroc"):
+                data = read_phroc(data)
+            else:
+                data = UpdatingSummaryDataset(data)
+        assert run is not None, "`run` must be given to add a dataset."
+        assert date is not None, f"Could not find the date of `{run}` - set `date`."
+        date = pd.Timestamp(date)
+        # Tris samples without any good measurements can't be compared
+        samples = data.samples[data.samples.is_tris & data.samples.pH.notnull()]
+        new = pd.DataFrame(
+            {
+                "date": date,
+                "run": run,
+                "order_analysis": samples.index,
+                "sample_name": samples.sample_name.values,
+                "salinity": samples.salinity.values,
+                "temperature": samples.temperature.values,
+                "pH": samples.pH.values,
+                "pH_tris_expected": samples.pH_tris_expected.values,
+                "offset": (samples.pH - samples.pH_tris_expected).values,
+            }
+        )
+        # The new rows' statistics and flags are filled in by _update
+        new = new.reindex(columns=self.table.columns, fill_value=0)
+        table = self.table
+        start = table.shape[0]
+        if run in table.run.values:
+            start = np.flatnonzero(table.run.values == run)[0]
+            table = table[table.run != run]
+        # Runs on the same date stay in the order in which they were added
+        position = np.searchsorted(table.date.values, np.datetime64(date), "right")
+        pieces = [table.iloc[:position], new, table.iloc[position:]]
+        self.table = (
+            pd.concat([p for p in pieces if p.shape[0]] or [table])
+            .astype(table.dtypes)
+            .reset_index(drop=True)
+        )
+        self._update(min(start, position))
+        return self.table.iloc[position : position + new.shape[0]]
+
+    def _update(self, start):
+        # Recalculate the statistics for rows `start` onwards, carrying on from the
+        # running totals of the row before
+        table = self.table
+        n = table.shape[0]
+        if start >= n:
+            return
+        offset = table.offset.values
+        stats = {c: table[c].values.astype(float) for c in stats_columns}
+        if start > 0:
+            count = int(stats["n_control"][start - 1])
+            mean = stats["mean_control"][start - 1]
+            m2 = stats["sd_control"][start - 1] ** 2 * (count - 1) if count > 1 else 0.0
+        else:
+            count, mean, m2 = 0, 0.0, 0.0
+        action = np.zeros(n - start, dtype=bool)
+        for i in range(start, n):
+            # The control limits come from the in-control rows before this one
+            if count >= self.min_history:
+                stats["center"][i] = mean
+                stats["sigma"][i] = np.sqrt(m2 / (count - 1))
+            else:
+                stats["center"][i] = stats["sigma"][i] = np.nan
+            recent = offset[max(0, i - self.window + 1) : i + 1]
+            stats["rolling_mean"][i] = recent.mean()
+            stats["rolling_sd"][i] = recent.std(ddof=1) if recent.size > 1 else np.nan
+            # Rows outside the action limits are left out of the limits for later
+            # rows, so that a lasting shift keeps being flagged
+            action[i - start] = (
+                abs(offset[i] - stats["center"][i]) > 3 * stats["sigma"][i]
+            )
+            if not action[i - start]:
+                # Welford's algorithm for the mean and variance
+                count += 1
+                delta = offset[i] - mean
+                mean += delta / count
+                m2 += delta * (offset[i] - mean)
+            stats["n_control"][i] = count
+            stats["mean_control"][i] = mean
+            stats["sd_control"][i] = np.sqrt(m2 / (count - 1)) if count > 1 else np.nan
+        for c in stats_columns:
+            table[c] = stats[c]
+        table["n_control"] = table.n_control.astype(int)
+        rows = slice(start, n)
+        deviation = np.abs(offset[rows] - stats["center"][rows])
+        sigma = stats["sigma"][rows]
+        n_window = np.minimum(np.arange(start, n) + 1, self.window)
+        flags = {
+            "warning": deviation > 2 * sigma,
+            "action": action,
+            "drift": np.abs(stats["rolling_mean"][rows] - stats["center"][rows])
+            > 3 * sigma / np.sqrt(n_window),
+        }
+        for c, flag in flags.items():
+            values = table[c].values.copy()
+            values[rows] = flag
+            table[c] = values
+
+    @traced
+    def save(self, filename: str):
+        """Save the chart as a parquet file, to be opened with
+        `TrisControlChart.load`.
+        """
+        arrow = pa.Table.from_pandas(self.table, preserve_index=False)
+        settings = {"window": self.window, "min_history": self.min_history}
+        arrow = arrow.replace_schema_metadata(
+            {**arrow.schema.metadata, b"phroc_tris": json.dumps(settings).encode()}
+        )
+        pq.write_table(arrow, filename)
+
+    @classmethod
+    @traced
+    def load(cls, filename: str) -> "TrisControlChart":
+        """Open a chart saved with `TrisControlChart.save`."""
+        arrow = pq.read_table(filename)
+        chart = cls(**json.loads(arrow.schema.metadata[b"phroc_tris"]))
+        chart.table = arrow.to_pandas().astype(chart.table.dtypes)
+        return chart
+
+
+def plot_tris_chart(chart: TrisControlChart, ax=None):
+    """Draw the control chart on `ax` (by default, a new figure)."""
+    if ax is None:
+        from matplotlib import pyplot as plt
+
+        _, ax = plt.subplots(dpi=100)
+    table = chart.table
+    x = np.arange(table.shape[0])
+    for k, ls in [(0, "-"), (2, "--"), (-2, "--"), (3, ":"), (-3, ":")]:
+        ax.plot(x, table.center + k * table.sigma, c="k", ls=ls, lw=0.8, alpha=0.6)
+    ax.plot(x, table.rolling_mean, c="C0", lw=1.5, label="Rolling mean")
+    ax.scatter(x, table.offset, s=12, c="C0", alpha=0.6, label="Tris")
+    for flag, c in [("warning", "C1"), ("action", "C3")]:
+        flagged = table[flag].values
+        ax.scatter(x[flagged], table.offset[flagged], s=20, c=c, label=flag.title())
+    drift = table.drift.values
+    ax.scatter(x[drift], table.rolling_mean[drift], s=8, c="C4", label="Drift")
+    # Label the first tris sample of each run with its date
+    first = ~table.run.duplicated().values
+    ax.set_xticks(x[first])
+    ax.set_xticklabels(table.date[first].dt.strftime("%Y-%m-%d"), rotation=90)
+    ax.set_ylabel("Measured − expected tris pH")
+    ax.legend(fontsize=7)
+    return ax
+
+
+def tris_run(args: list[str] | None = None) -> int:
+    """Command-line interface for adding runs to a tris control chart, run as
+    `phroc tris`.  Returns 1 if any of the added tris samples is outside the
+    action limits or drifting, otherwise 0.
+    """
+    parser = argparse.ArgumentParser(
+        prog="phroc tris",
+        description="Add runs to a tris control chart and check for drift.",
+    )
+    parser.add_argument("chart", help="control chart file (.parquet), made if needed")
+    parser.add_argument(
+        "paths", nargs="*", help=".phroc or raw pH data files or glob patterns"
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        help="tris samples in rolling statistics (default 20, or as in the chart)",
+    )
+    parser.add_argument(
+        "--min-history",
+        type=int,
+        help="tris samples needed before control limits are used (default 10, or as"
+        + " in the chart)",
+    )
+    parser.add_argument("--plot", help="save a plot of the chart to this file")
+    args = parser.parse_args(args)
+    settings = {
+        k: v
+        for k, v in {"window": args.window, "min_history": args.min_history}.items()
+        if v is not None
+    }
+    if os.path.isfile(args.chart):
+        chart = TrisControlChart.load(args.chart)
+        # New settings for an existing chart apply to all of it
+        if any(getattr(chart, k) != v for k, v in settings.items()):
+            for k, v in settings.items():
+                setattr(chart, k, v)
+            chart._update(0)
+    else:
+        chart = TrisControlChart(**settings)
+    filenames = [
+        f
+        for path in args.paths
+        for f in sorted(glob.glob(path))
+        if not f.upper().endswith("-COMMENTS.TXT")
+    ]
+    flagged = 0
+    for filename in filenames:
+        rows = chart.add(filename)
+        flags = ", ".join(
+            f"{rows[c].sum()} {c}" for c in ["warning", "action", "drift"]
+        )
+        print(
+            f"{rows.run.iloc[0] if rows.shape[0] else filename}: {rows.shape[0]} tris,"
+            f" mean offset {rows.offset.mean():+.4f}, {flags}"
+        )
+        flagged += (rows.action | rows.drift).sum()
+    chart.save(args.chart)
+    if chart.table.shape[0]:
+        last = chart.table.iloc[-1]
+        print(
+            f"{chart.table.shape[0]} tris samples in {chart.table.run.nunique()} runs;"
+            f" center {last.mean_control:+.4f} ± {last.sd_control:.4f},"
+            f" rolling mean {last.rolling_mean:+.4f}"
+        )
+    if args.plot:
+        ax = plot_tris_chart(chart)
+        ax.figure.tight_layout()
+        ax.figure.savefig(args.plot)
+    return 1 if flagged else 0
@@ -1,70 +1,128 @@
+from contextlib import contextmanager
+
 import numpy as np
 import pandas as pd
 
-from .parameters import pH_equations, pH_tris_DD98
-from .qc import find_window
-from .read_raw import enforce_comments, enforce_ts, get_order_analysis, read_agilent_pH
+from ..trace import traced
+from .journal import journal_columns, make_delta
+from .kernels import calculate_pH
+from .parameters import pH_equations, pH_tris_DD98_lookup
+from .qc import find_windows_batch, get_sample_bounds
+from .read_raw import (
+    compact_measurements,
+    enforce_comments,
+    enforce_ts,
+    get_order_analysis,
+    is_compact,
+    read_agilent_pH,
+)
 from .write import write_excel, write_phroc
 
 
-def _get_samples_from_measurements(sample):
-    return pd.Series(
+def get_sample_pH(measurements):
+    # Get the pH statistics for each sample - only good measurements count
+    pH_good = measurements.pH.where(measurements.pH_good).groupby(
+        measurements.order_analysis
+    )
+    return pd.DataFrame(
         {
-            "sample_name": sample.sample_name.iloc[0],
-            "salinity": sample.salinity.mean(),
-            "temperature": sample.temperature.mean(),
-            "pH": sample.pH[sample.pH_good].mean(),
-            "pH_std": sample.pH[sample.pH_good].std(),
-            "pH_range": (
-                sample.pH[sample.pH_good].max() - sample.pH[sample.pH_good].min()
-            ),
-            "pH_count": sample.pH.size,
-            "pH_good": sample.pH_good.sum(),
-            "is_tris": sample.is_tris.all(),
-            "extra_mcp": sample.extra_mcp.all(),
-            "comments": sample.comments.iloc[0],
+            "pH": pH_good.mean(),
+            "pH_std": pH_good.std(),
+            "pH_range": pH_good.max() - pH_good.min(),
+            "pH_good": measurements.pH_good.groupby(measurements.order_analysis).sum(),
         }
     )
 
 
 def get_samples_from_measurements(measurements):
     # Get one-per-sample table in measurements
-    samples = measurements.groupby("order_analysis").apply(
-        _get_samples_from_measurements, include_groups=False
+    oa = measurements.groupby("order_analysis")
+    pH = get_sample_pH(measurements)
+    samples = pd.DataFrame(
+        {
+            # Plain strings, even if the measurements' are categorical
+            "sample_name": oa.sample_name.first().astype(str),
+            "salinity": oa.salinity.mean(),
+            "temperature": oa.temperature.mean(),
+            "pH": pH.pH,
+            "pH_std": pH.pH_std,
+            "pH_range": pH.pH_range,
+            "pH_count": oa.pH.size(),
+            "pH_good": pH.pH_good,
+            "is_tris": oa.is_tris.all(),
+            "extra_mcp": oa.extra_mcp.all(),
+            "comments": oa.comments.first().astype(str),
+        }
     )
-    samples["pH_tris_expected"] = pH_tris_DD98(
-        temperature=samples[samples.is_tris].temperature,
-        salinity=samples[samples.is_tris].salinity,
+    # Tris is only ever measured at a few temperatures and salinities, so each is
+    # only calculated once
+    tris = samples[samples.is_tris]
+    samples["pH_tris_expected"] = pd.Series(
+        pH_tris_DD98_lookup(
+            temperature=tris.temperature.values, salinity=tris.salinity.values
+        ),
+        index=tris.index,
     )
+    # The same index whether or not order_analysis is compact (int32)
+    samples.index = samples.index.astype(np.int64)
     return samples
 
 
 def get_xpos(measurements: pd.DataFrame, samples: pd.DataFrame):
-    measurements["xpos"] = measurements.order_analysis.astype(float)
-    for s, sample in samples.iterrows():
-        M = measurements.order_analysis == s
-        measurements.loc[M, "xpos"] += (
-            0.5 + np.arange(sample.pH_count) - sample.pH_count / 2
-        ) * 0.05
+    # Spread each sample's measurements symmetrically around its order_analysis
+    pH_count = measurements.order_analysis.map(samples.pH_count)
+    m_ix = measurements.groupby("order_analysis").cumcount()
+    measurements["xpos"] = (
+        measurements.order_analysis.astype(float) + (0.5 + m_ix - pH_count / 2) * 0.05
+    )
 
 
 class UpdatingSummaryDataset:
+    @traced
     def __init__(
         self,
         measurements: pd.DataFrame | str,
         dye_intercept: float = 0.0,
         dye_slope: float = 0.0,
         pH_equation: str = "NIOZ",
+        compact: bool = False,
+        float32_absorbance: bool = False,
     ):
+        assert compact or not float32_absorbance, (
+            "`float32_absorbance` can only be used with `compact=True`."
+        )
         if isinstance(measurements, str):
             self.measurements = read_agilent_pH(
                 measurements,
                 dye_intercept=dye_intercept,
                 dye_slope=dye_slope,
+                pH_equation=pH_equation,
             )
         else:
             self.measurements = measurements.copy()
         self.get_samples()
+        if compact or is_compact(self.measurements):
+            # Opt-in, to fit more measurements in memory (see compact_measurements) -
+            # measurements that are already compact, e.g. from a .phroc file, stay
+            # compact
+            self.measurements = compact_measurements(
+                self.measurements, float32_absorbance=float32_absorbance
+            )
+        self._set_pH_settings(pH_equation, dye_intercept, dye_slope)
+        # Edits are recorded in the journal so they can be undone - entries from
+        # journal_position onwards have been undone and can be redone
+        self.journal = []
+        self.journal_position = 0
+        # Set while the dataset is being used by a background job, e.g. an export
+        self.read_only = False
+
+    def _check_writable(self):
+        assert not self.read_only, "The dataset is read-only while a job is running."
+
+    def _set_pH_settings(self, pH_equation, dye_intercept, dye_slope):
+        assert pH_equation in pH_equations, (
+            '`pH_equation` must be one of `"NIOZ"` or `"DSC07"`.'
+        )
         self.dye_intercept = dye_intercept
         self.dye_slope = dye_slope
         self.pH_equation = pH_equation
@@ -77,71 +135,289 @@ class UpdatingSummaryDataset:
                 }
             )
 
+    @traced
     def get_samples(self):
-        (
+        self.measurements = (
             self.measurements.pipe(get_order_analysis)
             .pipe(enforce_ts)
             .pipe(enforce_comments)
         )
         self.samples = get_samples_from_measurements(self.measurements)
+        self.sample_bounds = get_sample_bounds(self.measurements)
         get_xpos(self.measurements, self.samples)
 
+    def sample_rows(self, order_analysis):
+        # Positional slice of the measurements table covering one sample
+        return slice(
+            self.sample_bounds[order_analysis - 1], self.sample_bounds[order_analysis]
+        )
+
+    def _set_rows(self, rows, col, values):
+        # Set one column of the measurements at positions `rows`
+        sm = self.measurements
+        if isinstance(sm[col].dtype, pd.CategoricalDtype):
+            # Any new values need adding to the categories, and the codes of
+            # categoricals read from parquet can be read-only, so make new codes
+            values = pd.Index(np.atleast_1d(values))
+            categories = sm[col].cat.categories
+            categories = categories.append(values.difference(categories).unique())
+            codes = sm[col].cat.codes.to_numpy(dtype=np.int64)
+            if isinstance(rows, (int, np.integer)):
+                rows = [rows]
+            codes[rows] = categories.get_indexer(values)
+            sm[col] = pd.Categorical.from_codes(codes, categories=categories)
+        elif isinstance(rows, (int, np.integer)):
+            # Much quicker than iloc for single values
+            sm.iat[rows, sm.columns.get_loc(col)] = values
+        else:
+            sm.iloc[rows, sm.columns.get_loc(col)] = values
+
+    def _update_sample_pH(self, order_analysis):
+        # Recalculate the pH statistics for one sample from its own measurements only
+        rows = self.sample_rows(order_analysis)
+        pH_good = self.measurements.pH_good.values[rows]
+        pH = self.measurements.pH.values[rows][pH_good]
+        self.samples.at[order_analysis, "pH_good"] = pH_good.sum()
+        self.samples.at[order_analysis, "pH"] = pH.mean() if pH.size else np.nan
+        self.samples.at[order_analysis, "pH_std"] = (
+            pH.std(ddof=1) if pH.size > 1 else np.nan
+        )
+        self.samples.at[order_analysis, "pH_range"] = (
+            pH.max() - pH.min() if pH.size else np.nan
+        )
+
+    def _update_all_sample_pH(self):
+        pH = get_sample_pH(self.measurements)
+        for col in pH.columns:
+            self.samples[col] = pH[col]
+
+    def _journal_rows(self, positions, neighbours):
+        # The positions in the measurements table that an edit of the measurements
+        # at `positions` can change - if samples might be merged or split, that's
+        # all of their samples and the samples either side
+        positions = np.asarray(positions)
+        if not neighbours or positions.size == 0:
+            return positions
+        order_analysis = self.measurements.order_analysis.values[positions]
+        s_first = max(order_analysis.min() - 1, 1)
+        s_last = min(order_analysis.max() + 1, self.sample_bounds.size - 1)
+        return np.arange(self.sample_bounds[s_first - 1], self.sample_bounds[s_last])
+
+    def _journal_columns(self, cols):
+        # The columns of the measurements table that setting `cols` can change -
+        # changing sample_name can merge samples, which changes all of them
+        if "sample_name" in cols:
+            return list(journal_columns)
+        if "temperature" in cols or "salinity" in cols:
+            return [*cols, "pH"]
+        return list(cols)
+
+    def _journal_values(self, rows, columns):
+        return {c: np.asarray(self.measurements[c].array[rows]) for c in columns}
+
+    @contextmanager
+    def _recording(self, action, rows, columns=journal_columns, merge=False):
+        # Record what the edit inside the `with` block changes as a journal entry
+        self._check_writable()
+        before = self._journal_values(rows, columns)
+        yield
+        delta = make_delta(action, rows, before, self._journal_values(rows, columns))
+        if delta is None:
+            return
+        del self.journal[self.journal_position :]
+        last = self.journal[-1] if self.journal else None
+        if (
+            merge
+            and last is not None
+            and last.get("merge")
+            and np.array_equal(last["rows"], delta["rows"])
+            and last["old"].keys() == delta["old"].keys()
+        ):
+            last["new"] = delta["new"]
+            return
+        delta["merge"] = merge
+        self.journal.append(delta)
+        self.journal_position = len(self.journal)
+
+    def _apply_delta(self, delta, which):
+        # Put the "old" or "new" values of a journal entry back into the
+        # measurements, then update only the samples that they're in
+        sm = self.measurements
+        rows = delta["rows"]
+        for col, values in delta[which].items():
+            self._set_rows(rows, col, values)
+        if delta[which].keys() == {"pH_good"}:
+            samples = np.unique(sm.order_analysis.values[rows])
+            if samples.size > 20:
+                self._update_all_sample_pH()
+            else:
+                for s in samples:
+                    self._update_sample_pH(s)
+        else:
+            self._relabel_samples(rows)
+
+    @traced
+    def undo(self) -> bool:
+        """Undo the last edit made with `set_measurement`, `set_measurements`,
+        `set_sample`, `set_pH_good` or `find_windows`.
+
+        Returns
+        -------
+        bool
+            Whether there was anything to undo.
+        """
+        self._check_writable()
+        if self.journal_position == 0:
+            return False
+        self.journal_position -= 1
+        self._apply_delta(self.journal[self.journal_position], "old")
+        return True
+
+    @traced
+    def redo(self) -> bool:
+        """Redo the last edit that was undone.
+
+        Returns
+        -------
+        bool
+            Whether there was anything to redo.
+        """
+        self._check_writable()
+        if self.journal_position == len(self.journal):
+            return False
+        self._apply_delta(self.journal[self.journal_position], "new")
+        self.journal_position += 1
+        return True
+
+    @traced
+    def _relabel_samples(self, rows):
+        # After the sample_name of the measurements at positions `rows` has changed,
+        # rebuild only the samples that contain them plus their neighbours, which
+        # might merge with them - everything further away just gets renumbered
+        if len(rows) == 0:
+            return
+        sm = self.measurements
+        order_analysis = sm.order_analysis.values.copy()
+        bounds = self.sample_bounds
+        s_first = max(order_analysis[min(rows)] - 1, 1)
+        s_last = min(order_analysis[max(rows)] + 1, bounds.size - 1)
+        r0, r1 = bounds[s_first - 1], bounds[s_last]
+        region = (
+            sm.iloc[r0:r1]
+            .copy()
+            .pipe(get_order_analysis)
+            .pipe(enforce_ts)
+            .pipe(enforce_comments)
+        )
+        region["order_analysis"] += s_first - 1
+        samples_region = get_samples_from_measurements(region)
+        get_xpos(region, samples_region)
+        shift = samples_region.shape[0] - (s_last - s_first + 1)
+        # Update the measurements table
+        order_analysis[r0:r1] = region.order_analysis.values
+        order_analysis[r1:] += shift
+        sm["order_analysis"] = order_analysis
+        for col in ["temperature", "salinity", "comments", "xpos"]:
+            self._set_rows(slice(r0, r1), col, region[col].values)
+        sm.iloc[r1:, sm.columns.get_loc("xpos")] += shift
+        # Update the samples table and sample_bounds
+        samples_after = self.samples.loc[s_last + 1 :].copy()
+        samples_after.index += shift
+        self.samples = pd.concat(
+            [self.samples.loc[: s_first - 1], samples_region, samples_after]
+        )
+        self.sample_bounds = np.concatenate(
+            [
+                bounds[: s_first - 1],
+                r0 + get_sample_bounds(region)[:-1],
+                bounds[s_last:],
+            ]
+        )
+
+    @traced
+    def append_measurements(self, measurements: pd.DataFrame):
+        """Add new measurements, as from `read_agilent_pH_rows`, to the end of the
+        dataset.  Only the last existing sample, which the new measurements might
+        continue, and the new samples are recalculated.
+
+        Returns
+        -------
+        list[int]
+            The order_analysis of every sample that was added or changed.
+        """
+        self._check_writable()
+        new = measurements.copy()
+        sm = self.measurements
+        n_samples = self.samples.shape[0]
+        # Measurements that continue the last sample keep its comments
+        last_name = sm.sample_name.values[-1]
+        new["comments"] = np.where(
+            new.sample_name.values == last_name,
+            self.samples.comments.values[-1],
+            new.comments.values,
+        )
+        new["order_analysis"] = n_samples + 1
+        new["xpos"] = np.nan
+        n_old = sm.shape[0]
+        self.measurements = pd.concat([sm, new[sm.columns]])
+        if is_compact(sm):
+            # Concatenating categoricals with new values gives plain strings
+            self.measurements = compact_measurements(
+                self.measurements,
+                float32_absorbance=sm.absorbance_578.dtype == np.float32,
+            )
+        self.sample_bounds = np.append(self.sample_bounds, self.measurements.shape[0])
+        self._relabel_samples(np.arange(n_old, self.measurements.shape[0]))
+        return list(range(max(n_samples, 1), self.samples.shape[0] + 1))
+
+    @traced
     def set_measurement(self, order: int, **kwargs):
         assert order in self.measurements.index
-        # Use this to update individual measurements
-        for col, value in kwargs.items():
-            assert col in ["sample_name", "pH_good"], (
-                f"`{col}` cannot be set on a per-measurement basis."
-            )
-            # Update measurements df
-            self.measurements.loc[order, col] = value
-            # Update samples df
-            sm = self.measurements
-            s = sm.loc[order].order_analysis
-            M = sm.order_analysis == s
-            if col == "pH_good":
-                self.samples.loc[s, "pH_good"] = sm.loc[M, "pH_good"].sum()
-                # If a measurements is flagged as (not) good then we also need to update
-                # the mean and standard deviation of pH in samples
-                Mg = M & sm.pH_good
-                self.samples.loc[s, "pH"] = sm.loc[Mg, "pH"].mean()
-                self.samples.loc[s, "pH_std"] = sm.loc[Mg, "pH"].std()
-                self.samples.loc[s, "pH_range"] = (
-                    sm.loc[Mg, "pH"].max() - sm.loc[Mg, "pH"].min()
+        row = self.measurements.index.get_loc(order)
+        rows = self._journal_rows([row], "sample_name" in kwargs)
+        with self._recording("set_measurement", rows, self._journal_columns(kwargs)):
+            # Use this to update individual measurements
+            for col, value in kwargs.items():
+                assert col in ["sample_name", "pH_good"], (
+                    f"`{col}` cannot be set on a per-measurement basis."
                 )
-            elif col == "sample_name":
-                # This one would be too fiddly to make all the changes manually, so it's
-                # safer to stick with recreating the samples table from scratch
-                self.get_samples()
+                # Update measurements df
+                self._set_rows(row, col, value)
+                # Update samples df
+                if col == "pH_good":
+                    # If a measurements is flagged as (not) good then we also need to
+                    # update the mean and standard deviation of pH in samples
+                    self._update_sample_pH(
+                        self.measurements.at[order, "order_analysis"]
+                    )
+                elif col == "sample_name":
+                    self._relabel_samples([row])
 
+    @traced
     def set_measurements(self, order_logic, **kwargs):
         # Use this to update a series of measurements
-        for col, value in kwargs.items():
-            assert col in ["sample_name", "pH_good"], (
-                f"`{col}` cannot be set on a per-measurement basis."
-            )
-            # Update measurements df
-            self.measurements.loc[order_logic, col] = value
-            # Update samples df
-            sm = self.measurements
-            ss = sm.loc[order_logic].order_analysis.unique()
-            for s in ss:
-                M = sm.order_analysis == s
+        positions = self.measurements.index.get_indexer(
+            self.measurements.loc[order_logic].index
+        )
+        rows = self._journal_rows(positions, "sample_name" in kwargs)
+        columns = self._journal_columns(kwargs)
+        with self._recording("set_measurements", rows, columns):
+            for col, value in kwargs.items():
+                assert col in ["sample_name", "pH_good"], (
+                    f"`{col}` cannot be set on a per-measurement basis."
+                )
+                # Update measurements df
+                self._set_rows(positions, col, value)
+                # Update samples df
                 if col == "pH_good":
-                    self.samples.loc[s, "pH_good"] = sm.loc[M, "pH_good"].sum()
                     # If a measurements is flagged as (not) good then we also need to
                     # update the mean and standard deviation of pH in samples
-                    Mg = M & sm.pH_good
-                    self.samples.loc[s, "pH"] = sm.loc[Mg, "pH"].mean()
-                    self.samples.loc[s, "pH_std"] = sm.loc[Mg, "pH"].std()
-                    self.samples.loc[s, "pH_range"] = (
-                        sm.loc[Mg, "pH"].max() - sm.loc[Mg, "pH"].min()
-                    )
+                    for s in self.measurements.loc[order_logic].order_analysis.unique():
+                        self._update_sample_pH(s)
                 elif col == "sample_name":
-                    # This one would be too fiddly to make all the changes manually, so
-                    # it's safer to stick with recreating the samples table from scratch
-                    self.get_samples()
+                    self._relabel_samples(positions)
 
+    @traced
     def set_sample(self, order_analysis, **kwargs):
         assert order_analysis in self.samples.index
         # Use this to update entire samples
@@ -162,65 +438,149 @@ class UpdatingSummaryDataset:
             # the comments are carried over to the next sample if merged
             cols.remove("comments")
             cols.append("comments")
-        for col in cols:
-            assert col in [
-                "salinity",
-                "temperature",
-                "is_tris",
-                "extra_mcp",
-                "sample_name",
-                "comments",
-            ], f"`{col}` cannot be set on a per-sample basis."
-            value = kwargs[col]
-            self.samples.loc[order_analysis, col] = value
-            sm = self.measurements
-            M = sm.order_analysis == order_analysis
-            sm.loc[M, col] = value
-            if col in ["salinity", "temperature"]:
-                Mg = M & sm.pH_good
-                # After updating salinity and/or temperature, we need to recalculate pH
-                sm.loc[M, "pH"] = pH_equations[self.pH_equation](
-                    sm[M].absorbance_578.values,
-                    sm[M].absorbance_434.values,
-                    sm[M].absorbance_730.values,
-                    temperature=sm[M].temperature.values,
-                    salinity=sm[M].salinity.values,
-                    **self.pH_kwargs,
-                )
-                self.samples.loc[order_analysis, "pH"] = sm.loc[Mg, "pH"].mean()
-                self.samples.loc[order_analysis, "pH_std"] = sm.loc[Mg, "pH"].std()
-                self.samples.loc[order_analysis, "pH_range"] = (
-                    sm.loc[Mg, "pH"].max() - sm.loc[Mg, "pH"].min()
-                )
-                if self.samples.loc[order_analysis, "is_tris"]:
-                    self.samples.loc[order_analysis, "pH_tris_expected"] = pH_tris_DD98(
-                        temperature=self.samples.loc[order_analysis].temperature,
-                        salinity=self.samples.loc[order_analysis].salinity,
-                    )
-            elif col == "is_tris":
-                if value:
-                    self.samples.loc[order_analysis, "pH_tris_expected"] = pH_tris_DD98(
-                        temperature=self.samples.loc[order_analysis].temperature,
-                        salinity=self.samples.loc[order_analysis].salinity,
+        sample = self.sample_rows(order_analysis)
+        journal_rows = self._journal_rows(
+            np.arange(sample.start, sample.stop), "sample_name" in cols
+        )
+        # Typing a comment edits it once per key, so those edits are merged
+        merge = cols == ["comments"]
+        columns = self._journal_columns(cols)
+        with self._recording("set_sample", journal_rows, columns, merge=merge):
+            for col in cols:
+                assert col in [
+                    "salinity",
+                    "temperature",
+                    "is_tris",
+                    "extra_mcp",
+                    "sample_name",
+                    "comments",
+                ], f"`{col}` cannot be set on a per-sample basis."
+                value = kwargs[col]
+                self.samples.loc[order_analysis, col] = value
+                rows = self.sample_rows(order_analysis)
+                self._set_rows(rows, col, value)
+                sm = self.measurements
+                if col in ["salinity", "temperature"]:
+                    # After updating salinity and/or temperature, we need to
+                    # recalculate pH
+                    sm.iloc[rows, sm.columns.get_loc("pH")] = calculate_pH(
+                        self.pH_equation,
+                        sm.absorbance_578.values[rows],
+                        sm.absorbance_434.values[rows],
+                        sm.absorbance_730.values[rows],
+                        temperature=sm.temperature.values[rows],
+                        salinity=sm.salinity.values[rows],
+                        **self.pH_kwargs,
                     )
-                else:
-                    self.samples.loc[order_analysis, "pH_tris_expected"] = np.nan
-            elif col == "sample_name":
-                # Recreate samples table if a sample_name is changed, to be safe.
-                # This means that if a sample is given the same name as an adjacent
-                # sample, they will be merged.
-                self.get_samples()
+                    self._update_sample_pH(order_analysis)
+                    if self.samples.loc[order_analysis, "is_tris"]:
+                        self.samples.loc[order_analysis, "pH_tris_expected"] = (
+                            pH_tris_DD98_lookup(
+                                temperature=self.samples.loc[
+                                    order_analysis
+                                ].temperature,
+                                salinity=self.samples.loc[order_analysis].salinity,
+                            )
+                        )
+                elif col == "is_tris":
+                    if value:
+                        self.samples.loc[order_analysis, "pH_tris_expected"] = (
+                            pH_tris_DD98_lookup(
+                                temperature=self.samples.loc[
+                                    order_analysis
+                                ].temperature,
+                                salinity=self.samples.loc[order_analysis].salinity,
+                            )
+                        )
+                    else:
+                        self.samples.loc[order_analysis, "pH_tris_expected"] = np.nan
+                elif col == "sample_name":
+                    # If a sample is given the same name as an adjacent sample, they
+                    # will be merged
+                    self._relabel_samples([rows.start, rows.stop - 1])
+
+    @traced
+    def set_pH_equation(
+        self,
+        pH_equation: str | None = None,
+        dye_intercept: float | None = None,
+        dye_slope: float | None = None,
+    ):
+        """Change the pH equation and/or dye correction, and recalculate the pH
+        of every measurement and the pH statistics of every sample.
 
-    def to_excel(self, filename):
-        write_excel(filename, self)
+        pH is recalculated with each sample's current temperature and salinity.
+        Which measurements are good is not changed.  The journal is cleared, so
+        earlier edits can no longer be undone.
 
-    def to_phroc(self, filename):
-        write_phroc(filename, self)
+        Parameters
+        ----------
+        pH_equation : str, optional
+            Which pH equation to use, either `"NIOZ"` or `"DSC07"`.  By default,
+            the current one is kept.
+        dye_intercept : float, optional
+            Intercept of the dye correction (SOP 6b eq. 9).  By default, the
+            current one is kept.
+        dye_slope : float, optional
+            Slope of the dye correction (SOP 6b eq. 9).  By default, the current
+            one is kept.
+        """
+        self._check_writable()
+        self._set_pH_settings(
+            self.pH_equation if pH_equation is None else pH_equation,
+            self.dye_intercept if dye_intercept is None else dye_intercept,
+            self.dye_slope if dye_slope is None else dye_slope,
+        )
+        sm = self.measurements
+        sm["pH"] = calculate_pH(
+            self.pH_equation,
+            sm.absorbance_578.values,
+            sm.absorbance_434.values,
+            sm.absorbance_730.values,
+            temperature=sm.temperature.values,
+            salinity=sm.salinity.values,
+            **self.pH_kwargs,
+        )
+        self._update_all_sample_pH()
+        # The pH values in the journal were calculated with the old settings
+        self.journal = []
+        self.journal_position = 0
+
+    @traced
+    def to_excel(
+        self, filename, progress=None, streaming=True, include_measurements=True
+    ):
+        write_excel(
+            filename,
+            self,
+            progress=progress,
+            streaming=streaming,
+            include_measurements=include_measurements,
+        )
+
+    @traced
+    def to_phroc(self, filename, codec="zstd", progress=None):
+        write_phroc(filename, self, codec=codec, progress=progress)
 
+    @traced
+    def set_pH_good(self, pH_good: np.ndarray):
+        """Set whether every measurement is good at once, e.g. from
+        `find_windows_batch`, and update the pH statistics of all the samples
+        together.
+        """
+        rows = np.arange(self.measurements.shape[0])
+        with self._recording("set_pH_good", rows, columns=["pH_good"]):
+            self.measurements["pH_good"] = pH_good
+            self._update_all_sample_pH()
+
+    @traced
     def find_windows(self, cutoff=0.001, minimum_values=3):
-        for s, sample in self.measurements.groupby("order_analysis"):
-            M = self.measurements.order_analysis == s
-            window = find_window(
-                sample.pH.values, cutoff=cutoff, minimum_values=minimum_values
+        # Find every sample's window at once
+        self.set_pH_good(
+            find_windows_batch(
+                self.measurements.pH.values,
+                self.sample_bounds,
+                cutoff=cutoff,
+                minimum_values=minimum_values,
             )
-            self.set_measurements(M, pH_good=window)
+        )
@@ -1,10 +1,22 @@
 import os
-import tempfile
 import zipfile
 
+import openpyxl
 import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 
 from ..meta import __version__
+from .journal import journal_to_frame
+
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# How pandas formats the header row of each sheet
+header_style = {"bold": True, "border": 1, "align": "center", "valign": "top"}
 
 
 def make_settings(usd):
@@ -18,29 +30,180 @@ def make_settings(usd):
     )
 
 
-def write_phroc(filename, usd):
-    # filename needs to include the **absolute** path to the .phroc file to be saved!
-    # Using a relative path will mean it gets saved in the TemporaryDirectory instead
-    cwd = os.getcwd()
-    with tempfile.TemporaryDirectory() as tdir:
-        os.chdir(tdir)
-        usd.measurements.to_parquet("measurements.parquet")
-        usd.samples.to_parquet("samples.parquet")
-        make_settings(usd).to_parquet("settings.parquet")
-        if not filename.endswith(".phroc"):
-            filename += ".phroc"
-        with zipfile.ZipFile(filename, compression=zipfile.ZIP_LZMA, mode="w") as z:
-            z.write("measurements.parquet")
-            z.write("samples.parquet")
-            z.write("settings.parquet")
-    os.chdir(cwd)
-
-
-def write_excel(filename, usd):
+# How each codec compresses a .phroc file: (zip compression, parquet compression)
+phroc_codecs = {
+    "zstd": (zipfile.ZIP_STORED, "zstd"),
+    "deflate": (zipfile.ZIP_DEFLATED, "snappy"),
+    "stored": (zipfile.ZIP_STORED, None),
+    "lzma": (zipfile.ZIP_LZMA, "snappy"),
+}
+
+
+def write_phroc(filename, usd, codec="zstd", progress=None):
+    """Save a dataset as a .phroc file, which is a zip archive of parquet files.
+
+    Parameters
+    ----------
+    filename : str
+        The file to save to.  ".phroc" is added to the end if needed.
+    usd : UpdatingSummaryDataset
+        The dataset to save.
+    codec : str, optional
+        How to compress the file, by default `"zstd"`, i.e., zstd compression
+        within the parquet files in an uncompressed archive, which is fast to
+        write and read.  Other options are `"deflate"` (deflate-compressed
+        archive), `"stored"` (no compression at all) and `"lzma"` (as in pHroc
+        v0.3 and earlier - slow).  Files with any codec can be read by
+        `read_phroc`.
+    progress : callable, optional
+        Called as `progress(step, total, message)` before each table is written.
+        It can stop the export by raising an exception.
+    """
+    assert codec in phroc_codecs, (
+        f"`codec` must be one of {', '.join(f'`{c}`' for c in phroc_codecs)}."
+    )
+    zip_compression, parquet_compression = phroc_codecs[codec]
+    if not filename.endswith(".phroc"):
+        filename += ".phroc"
+    # Write each parquet file in memory straight into the archive
+    with zipfile.ZipFile(filename, compression=zip_compression, mode="w") as z:
+        tables = [
+            ("measurements", usd.measurements),
+            ("samples", usd.samples),
+            ("settings", make_settings(usd)),
+        ]
+        if usd.journal:
+            # The edits, so they can still be undone after reopening the file
+            tables.append(
+                ("journal", journal_to_frame(usd.journal, usd.journal_position))
+            )
+        for i, (name, df) in enumerate(tables):
+            if progress is not None:
+                progress(i, len(tables), f"Writing {name}")
+            z.writestr(
+                f"{name}.parquet", df.to_parquet(compression=parquet_compression)
+            )
+
+
+def _excel_columns(df, index):
+    # The header and the values of each column of `df` as plain Python lists, as
+    # written by DataFrame.to_excel, with None for blank cells
+    header = [df.index.name or ""] if index else []
+    header += list(df.columns)
+    columns = [df.index.to_series()] if index else []
+    columns += [df[c] for c in df.columns]
+    values = []
+    for column in columns:
+        if column.hasnans:
+            column = column.astype(object).where(column.notnull(), None)
+        values.append(column.tolist())
+    return header, values
+
+
+def _write_excel_streaming(filename, sheets, progress, chunk_size=10000):
+    # Write each row straight to the file as it is made, instead of building the
+    # whole workbook in memory first
+    total = sum(df.shape[0] for _, df, _ in sheets) + 1
+    done = 0
+
+    def rows(sheet_name, df, index):
+        nonlocal done
+        header, columns = _excel_columns(df, index)
+        yield header
+        for i, row in enumerate(zip(*columns)):
+            if progress is not None and i % chunk_size == 0:
+                progress(done + i, total, f"Writing {sheet_name}")
+            yield row
+        done += df.shape[0]
+
+    if xlsxwriter is not None:
+        workbook = xlsxwriter.Workbook(filename, {"constant_memory": True})
+        header_format = workbook.add_format(header_style)
+        try:
+            for sheet_name, df, index in sheets:
+                worksheet = workbook.add_worksheet(sheet_name)
+                for r, row in enumerate(rows(sheet_name, df, index)):
+                    worksheet.write_row(r, 0, row, header_format if r == 0 else None)
+        except BaseException:
+            # Close the temporary files that the rows are being written into, and
+            # delete the unfinished workbook that closing saves
+            workbook.close()
+            if os.path.isfile(filename):
+                os.remove(filename)
+            raise
+        if progress is not None:
+            progress(total - 1, total, "Saving workbook")
+        workbook.close()
+    else:
+        workbook = openpyxl.Workbook(write_only=True)
+        try:
+            for sheet_name, df, index in sheets:
+                worksheet = workbook.create_sheet(sheet_name)
+                for r, row in enumerate(rows(sheet_name, df, index)):
+                    if r == 0:
+                        row = [_header_cell(worksheet, value) for value in row]
+                    worksheet.append(row)
+        except BaseException:
+            # Close the temporary files that the rows are being written into
+            for worksheet in workbook.worksheets:
+                worksheet.close()
+            raise
+        if progress is not None:
+            progress(total - 1, total, "Saving workbook")
+        workbook.save(filename)
+
+
+def _header_cell(worksheet, value):
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = Font(bold=True)
+    cell.alignment = Alignment(horizontal="center", vertical="top")
+    side = Side(style="thin")
+    cell.border = Border(left=side, right=side, top=side, bottom=side)
+    return cell
+
+
+def write_excel(
+    filename, usd, progress=None, streaming=True, include_measurements=True
+):
+    """Save a dataset as a .xlsx file, with Samples, Measurements and Settings
+    sheets.
+
+    Parameters
+    ----------
+    filename : str
+        The file to save to.  ".xlsx" is added to the end if needed.
+    usd : UpdatingSummaryDataset
+        The dataset to save.
+    progress : callable, optional
+        As for `write_phroc`.
+    streaming : bool, optional
+        Whether to write the rows to the file one by one (default), with
+        xlsxwriter's constant-memory mode if it is installed or otherwise with
+        openpyxl's write-only mode, which needs much less memory and time.
+        Otherwise, the whole workbook is built in memory with pandas first.
+        Either way, `read_excel` reads the file back
+        in the same way.
+    include_measurements : bool, optional
+        Whether to include the Measurements sheet, by default True.  Files
+        without it can't be imported with `read_excel`.
+    """
     if not filename.endswith(".xlsx"):
         filename += ".xlsx"
-    settings = make_settings(usd)
+    sheets = [
+        ("Samples", usd.samples, True),
+        ("Measurements", usd.measurements, True),
+        ("Settings", make_settings(usd), False),
+    ]
+    if not include_measurements:
+        del sheets[1]
+    if streaming:
+        _write_excel_streaming(filename, sheets, progress)
+        return
     with pd.ExcelWriter(filename, engine="openpyxl") as w:
-        usd.samples.to_excel(w, sheet_name="Samples")
-        usd.measurements.to_excel(w, sheet_name="Measurements")
-        settings.to_excel(w, index=False, sheet_name="Settings")
+        for i, (sheet_name, df, index) in enumerate(sheets):
+            if progress is not None:
+                progress(i, len(sheets) + 1, f"Writing {sheet_name}")
+            df.to_excel(w, index=index, sheet_name=sheet_name)
+        if progress is not None:
+            # Most of the time is spent saving the workbook at the end
+            progress(len(sheets), len(sheets) + 1, "Saving workbook")
@@ -1,9 +1,31 @@
-import matplotlib as mpl
-from PySide6.QtWidgets import QApplication
-from . import gui
+from sys import argv, exit
+
+from . import trace
+from .process.batch import batch_run, reprocess_run
+from .process.synthetic import synthetic_run
+from .process.tris import tris_run
 
 
 def phroc_run():
+    if "--trace" in argv[1:-1]:
+        # Record what takes how long, and save it when pHroc closes
+        i = argv.index("--trace")
+        trace.enable(argv[i + 1])
+        del argv[i : i + 2]
+    if len(argv) > 1 and argv[1] == "batch":
+        exit(batch_run(argv[2:]))
+    if len(argv) > 1 and argv[1] == "reprocess":
+        exit(reprocess_run(argv[2:]))
+    if len(argv) > 1 and argv[1] == "synthetic":
+        exit(synthetic_run(argv[2:]))
+    if len(argv) > 1 and argv[1] == "tris":
+        exit(tris_run(argv[2:]))
+    # Only import the GUI when it's needed, so batch runs work without a display
+    import matplotlib as mpl
+    from PySide6.QtWidgets import QApplication
+
+    from . import gui
+
     mpl.use("Qt5Agg")
     app = QApplication([])
     window = gui.MainWindow()
@@ -0,0 +1,168 @@
+import numpy as np
+from PySide6.QtCore import QAbstractTableModel, Qt, Signal
+from PySide6.QtGui import QColor
+
+from .process.usd import UpdatingSummaryDataset
+from .trace import traced
+
+
+LightRed = QColor(255, 71, 76)
+LightOrange = QColor(253, 170, 72)
+
+# Looking up Qt enums is slow compared with everything else in data(), which the
+# view calls many times per cell, so only do it once
+DisplayRole = Qt.ItemDataRole.DisplayRole
+EditRole = Qt.ItemDataRole.EditRole
+CheckStateRole = Qt.ItemDataRole.CheckStateRole
+TextAlignmentRole = Qt.ItemDataRole.TextAlignmentRole
+BackgroundRole = Qt.ItemDataRole.BackgroundRole
+Checked = Qt.CheckState.Checked
+Unchecked = Qt.CheckState.Unchecked
+AlignCenter = Qt.AlignmentFlag.AlignCenter
+
+# Columns of the samples table: (header, column in usd.samples)
+samples_columns = [
+    ("Sample name", "sample_name"),
+    ("Tris?", "is_tris"),
+    ("Extra\nmCP?", "extra_mcp"),
+    ("Salinity", "salinity"),
+    ("Temperature\n/ °C", "temperature"),
+    ("pH", "pH"),
+    ("pH\nrange", "pH_range"),
+    ("Expected\npH", "pH_tris_expected"),
+    ("Measurements\n(used / total)", "pH_good"),
+    ("Comments", "comments"),
+]
+samples_editable = ["sample_name", "salinity", "temperature", "comments"]
+samples_checkable = ["is_tris", "extra_mcp"]
+samples_centred = ["salinity", "temperature", "pH_good"]
+
+
+class SamplesTableModel(QAbstractTableModel):
+    """Table model showing `usd.samples` directly, so that the view only asks for
+    the cells that it is actually displaying.
+    """
+
+    # Emitted with the order_analysis after a sample has been edited in the table
+    sampleEdited = Signal(int)
+
+    def __init__(self, usd: UpdatingSummaryDataset | None = None, parent=None):
+        super().__init__(parent)
+        self.usd = usd
+
+    @traced
+    def set_usd(self, usd: UpdatingSummaryDataset):
+        # Show a different dataset, or the same one after unknown changes
+        self.beginResetModel()
+        self.usd = usd
+        self.endResetModel()
+
+    def rowCount(self, parent=None):
+        if (parent is not None and parent.isValid()) or self.usd is None:
+            return 0
+        return self.usd.samples.shape[0]
+
+    def columnCount(self, parent=None):
+        if parent is not None and parent.isValid():
+            return 0
+        return len(samples_columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return samples_columns[section][0]
+            return str(section + 1)
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.usd is not None and self.usd.read_only:
+            return flags
+        col = samples_columns[index.column()][1]
+        if col in samples_editable:
+            flags |= Qt.ItemIsEditable
+        elif col in samples_checkable:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def _value(self, row: int, col: str):
+        return self.usd.samples[col].values[row]
+
+    def data(self, index, role=DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        col = samples_columns[index.column()][1]
+        if role == DisplayRole or role == EditRole:
+            if col in samples_checkable:
+                return None
+            elif col in ["pH", "pH_range"]:
+                return f"{self._value(row, col):.4f}"
+            elif col == "pH_tris_expected":
+                if self._value(row, "is_tris"):
+                    return f"{self._value(row, col):.4f}"
+                return ""
+            elif col == "pH_good":
+                return f"{self._value(row, col)} / {self._value(row, 'pH_count')}"
+            return str(self._value(row, col))
+        elif role == CheckStateRole and col in samples_checkable:
+            return Checked if self._value(row, col) else Unchecked
+        elif role == TextAlignmentRole and col in samples_centred:
+            return AlignCenter
+        elif role == BackgroundRole:
+            # Highlight values that need the analyst's attention
+            if col == "salinity":
+                if self._value(row, col) < 0:
+                    return LightRed
+            elif col == "pH_range":
+                pH_range = self._value(row, col)
+                if pH_range > 0.0012:
+                    return LightRed
+                elif pH_range > 0.001:
+                    return LightOrange
+            elif col == "pH_good":
+                pH_good = self._value(row, col)
+                if pH_good < 1:
+                    return LightRed
+                elif pH_good < 3:
+                    return LightOrange
+        return None
+
+    @traced
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or self.usd.read_only:
+            return False
+        col = samples_columns[index.column()][1]
+        s = index.row() + 1
+        if col in samples_checkable:
+            if role != Qt.CheckStateRole:
+                return False
+            value = Qt.CheckState(value) == Qt.Checked
+        elif role != Qt.EditRole:
+            return False
+        elif col in ["salinity", "temperature"]:
+            try:
+                value = float(value)
+            except ValueError:
+                # Don't allow temperature and salinity to be changed to non-numbers
+                return False
+            if np.isnan(value):
+                return False
+        n_samples = self.usd.samples.shape[0]
+        self.usd.set_sample(s, **{col: value})
+        if self.usd.samples.shape[0] != n_samples:
+            # Samples were merged or split, so everything from here on has moved
+            self.set_usd(self.usd)
+        elif col == "sample_name":
+            # Renaming only ever affects the neighbouring samples
+            self.samples_changed(max(s - 1, 1), min(s + 1, n_samples))
+        else:
+            self.samples_changed(s, s)
+        self.sampleEdited.emit(s)
+        return True
+
+    def samples_changed(self, first: int, last: int):
+        # Tell the view to redraw the rows of samples `first` to `last` (inclusive)
+        self.dataChanged.emit(
+            self.index(first - 1, 0), self.index(last - 1, len(samples_columns) - 1)
+        )
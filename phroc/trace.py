@@ -0,0 +1,123 @@
+import atexit
+import functools
+import json
+import numbers
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Tracing is off unless switched on with the PHROC_TRACE environment variable (set to
+# the file to save to), `phroc --trace FILE` or `enable()`
+_events = []
+_enabled = False
+_filename = None
+
+
+def enable(filename: str | None = None):
+    """Start recording trace spans.  If `filename` is given, they are saved there
+    as Chrome trace JSON when Python exits (open it in chrome://tracing or
+    https://ui.perfetto.dev).
+    """
+    global _enabled, _filename
+    if filename is not None and _filename is None:
+        atexit.register(_save_at_exit)
+    if filename is not None:
+        _filename = filename
+    _enabled = True
+
+
+def disable():
+    """Stop recording trace spans."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def clear():
+    """Forget all recorded trace spans."""
+    _events.clear()
+
+
+def _record(name, start, end, args):
+    _events.append(
+        {
+            "name": name,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+    )
+
+
+@contextmanager
+def span(name: str, **args):
+    """Record how long the code inside the `with` block takes."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        _record(name, start, time.perf_counter_ns(), args)
+
+
+def _simple(value):
+    # Make numpy scalars JSON-serialisable
+    if isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, numbers.Integral):
+        return int(value)
+    return float(value)
+
+
+def traced(func):
+    """Decorator to record a span for every call to `func`, with its simple
+    arguments.
+    """
+    name = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.perf_counter_ns()
+            _record(
+                name,
+                start,
+                end,
+                {
+                    str(k): _simple(v)
+                    for k, v in [*enumerate(args), *kwargs.items()]
+                    if isinstance(v, (str, numbers.Real))
+                },
+            )
+
+    return wrapper
+
+
+def save(filename: str):
+    """Save the recorded trace spans as Chrome trace JSON."""
+    with open(filename, "w") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+
+
+def _save_at_exit():
+    if _events:
+        save(_filename)
+
+
+if os.environ.get("PHROC_TRACE"):
+    enable(os.environ["PHROC_TRACE"])
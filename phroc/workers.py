@@ -0,0 +1,128 @@
+import os
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, Signal
+
+from .process.qc import find_windows_batch
+from .process.read import read_excel, read_phroc
+from .process.read_raw import read_agilent_pH
+from .process.usd import UpdatingSummaryDataset
+from .trace import traced
+
+
+class Cancelled(Exception):
+    """Raised inside a job by `Worker.progress` once the job has been cancelled."""
+
+
+class WorkerSignals(QObject):
+    # A QRunnable can't have signals itself, so they live here
+    progress = Signal(int, int, str)  # step, total (0 if unknown), message
+    finished = Signal(object)  # the job's result
+    failed = Signal(str)  # the error message
+    cancelled = Signal()
+
+
+class Worker(QRunnable):
+    """Run a job on a thread from a `QThreadPool`, reporting back through
+    `signals`.
+
+    The job is called as `func(worker, *args, **kwargs)`.  It should call
+    `worker.progress` every so often, which emits `signals.progress` and is also
+    where the job stops, by raising `Cancelled`, once `cancel` has been called.
+    Afterwards, exactly one of `signals.finished` (with the job's result),
+    `signals.failed` or `signals.cancelled` is emitted.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        super().__init__()
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Ask the job to stop at its next `progress` call."""
+        self._cancel.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def progress(self, step: int, total: int, message: str = ""):
+        if self._cancel.is_set():
+            raise Cancelled
+        self.signals.progress.emit(step, total, message)
+
+    def run(self):
+        try:
+            result = self.func(self, *self.args, **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:  # noqa: BLE001 - any error goes to the failed signal
+            self.signals.failed.emit(repr(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+# Jobs for the main window - they only read the dataset that they're given, so the
+# window keeps it read-only while they run, and applies any changes afterwards
+
+
+@traced
+def import_job(worker: Worker, filename: str) -> UpdatingSummaryDataset:
+    """Import a raw pH data file, .phroc or .xlsx file as a dataset."""
+    basename = os.path.basename(filename)
+    worker.progress(0, 2, f"Reading {basename}")
+    if filename.lower().endswith(".txt"):
+        measurements = read_agilent_pH(filename)
+        worker.progress(1, 2, f"Summarising {basename}")
+        usd = UpdatingSummaryDataset(measurements)
+    elif filename.lower().endswith(".phroc"):
+        usd = read_phroc(filename)
+    elif filename.lower().endswith(".xlsx"):
+        usd = read_excel(filename)
+    else:
+        raise ValueError(f"pHroc can't import {basename}.")
+    worker.progress(2, 2, f"Imported {basename}")
+    return usd
+
+
+@traced
+def find_windows_job(
+    worker: Worker,
+    usd: UpdatingSummaryDataset,
+    cutoff: float = 0.001,
+    minimum_values: int = 3,
+):
+    """Find every sample's window, returning the new `pH_good` for
+    `usd.set_pH_good`.
+    """
+    worker.progress(0, 1, "Finding measurement windows")
+    pH_good = find_windows_batch(
+        usd.measurements.pH.values,
+        usd.sample_bounds,
+        cutoff=cutoff,
+        minimum_values=minimum_values,
+    )
+    worker.progress(1, 1, "Found measurement windows")
+    return pH_good
+
+
+@traced
+def export_job(worker: Worker, usd: UpdatingSummaryDataset, filename: str) -> str:
+    """Save a dataset as a .phroc or .xlsx file, depending on the extension of
+    `filename`.  If the job is cancelled, the partly written file is deleted.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    assert extension in [".phroc", ".xlsx"], "Can only export to .phroc or .xlsx."
+    try:
+        if extension == ".phroc":
+            usd.to_phroc(filename, progress=worker.progress)
+        else:
+            usd.to_excel(filename, progress=worker.progress)
+    except Cancelled:
+        if os.path.isfile(filename):
+            os.remove(filename)
+        raise
+    return filename
@@ -0,0 +1,92 @@
+import os
+import tempfile
+
+import pytest
+
+import phroc
+from phroc.process.batch import batch_run, find_files, process_files, reprocess_run
+
+
+def test_find_files():
+    filenames = find_files(["tests/data"])
+    assert len(filenames) == 3
+    assert not any(f.upper().endswith("-COMMENTS.TXT") for f in filenames)
+    assert find_files(["tests/data/2024*.TXT"]) == ["tests/data/2024-04-27-CTD1.TXT"]
+    # Overlapping paths only give each file once, in the order they're first found
+    overlapping = ["tests/data/2024*.TXT", "./tests/data", "tests/data/*-PH.TXT"]
+    assert find_files(overlapping) == [
+        "tests/data/2024-04-27-CTD1.TXT",
+        "./tests/data/240827-RWS-BATCH23-PH.TXT",
+        "./tests/data/241010-DY172-JETTY.TXT",
+    ]
+
+
+def crash(filename, **kwargs):
+    # Kills the worker process that's processing the CTD1 file
+    if "CTD1" in filename:
+        os._exit(1)
+    return []
+
+
+def test_batch_run():
+    with tempfile.TemporaryDirectory() as tdir:
+        status = batch_run(
+            ["tests/data", "-o", tdir, "-w", "2", "--find-windows", "--xlsx"]
+        )
+        assert status == 0
+        outputs = os.listdir(tdir)
+        for filename in find_files(["tests/data"]):
+            basename = os.path.basename(filename)[:-4]
+            assert f"{basename}.phroc" in outputs
+            assert f"{basename}.xlsx" in outputs
+        usd = phroc.read_phroc(os.path.join(tdir, "2024-04-27-CTD1.phroc"))
+        assert not usd.measurements.pH_good.all()
+
+
+def test_batch_run_failure():
+    with tempfile.TemporaryDirectory() as tdir:
+        # A file without its Comments file can't be imported, but the rest of the
+        # batch still gets processed
+        with open(os.path.join(tdir, "broken.TXT"), "w") as f:
+            f.write("nothing")
+        args = [tdir, "tests/data/2024-04-27-CTD1.TXT", "-o", tdir, "-w", "1"]
+        assert batch_run(args) == 1
+        assert "2024-04-27-CTD1.phroc" in os.listdir(tdir)
+    # If a worker process dies, its file and any unfinished ones fail, rather than
+    # the whole batch
+    filenames = find_files(["tests/data"])
+    summary = process_files(filenames + filenames[:1], workers=2, process=crash)
+    assert list(summary) == filenames
+    assert not summary["tests/data/2024-04-27-CTD1.TXT"][0]
+    assert "BrokenProcessPool" in summary["tests/data/2024-04-27-CTD1.TXT"][2]
+
+
+def test_reprocess_run():
+    with tempfile.TemporaryDirectory() as tdir:
+        assert batch_run(["tests/data", "-o", tdir, "-w", "1", "--find-windows"]) == 0
+        args = [tdir, "-s", "_DSC07", "--pH-equation", "DSC07", "--dye-slope", "0.02"]
+        assert reprocess_run(args) == 0
+        for filename in find_files(["tests/data"]):
+            basename = os.path.basename(filename)[:-4]
+            old = phroc.read_phroc(os.path.join(tdir, f"{basename}.phroc"))
+            new = phroc.read_phroc(os.path.join(tdir, f"{basename}_DSC07.phroc"))
+            assert old.pH_equation == "NIOZ"
+            assert new.pH_equation == "DSC07" and new.dye_slope == 0.02
+            assert (new.measurements.pH_good == old.measurements.pH_good).all()
+            assert not (new.measurements.pH == old.measurements.pH).any()
+        # Running again doesn't reprocess the outputs of the first run
+        assert reprocess_run(args) == 0
+        assert not any(f.endswith("_DSC07_DSC07.phroc") for f in os.listdir(tdir))
+        # ...unless they're saved somewhere else
+        other = os.path.join(tdir, "other")
+        assert reprocess_run([*args, "-o", other]) == 0
+        assert "2024-04-27-CTD1_DSC07_DSC07.phroc" in os.listdir(other)
+        # The inputs can't be overwritten
+        with pytest.raises(SystemExit):
+            reprocess_run([tdir, "--dye-slope", "0.01"])
+
+
+# test_find_files()
+# test_batch_run()
+# test_batch_run_failure()
+# test_reprocess_run()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import phroc
+from phroc.process.usd import get_samples_from_measurements
+
+
+filename = "tests/data/241010-DY172-JETTY.TXT"
+
+
+def snapshot(usd):
+    return usd.measurements.copy(), usd.samples.copy()
+
+
+def assert_matches(usd, state):
+    measurements, samples = state
+    pd.testing.assert_frame_equal(usd.measurements, measurements, check_dtype=False)
+    pd.testing.assert_frame_equal(usd.samples, samples, check_dtype=False)
+    # The samples table must also match one built from scratch
+    pd.testing.assert_frame_equal(
+        usd.samples, get_samples_from_measurements(usd.measurements), check_dtype=False
+    )
+
+
+def make_edits(usd):
+    # A mixture of edits like an analyst's, returning the state after each one
+    states = [snapshot(usd)]
+    m = usd.measurements.index[10]
+    edits = [
+        lambda: usd.set_measurement(m, pH_good=False),
+        # Merge sample 3 into sample 2
+        lambda: usd.set_sample(3, sample_name=usd.samples.sample_name.loc[2]),
+        # Split the last two measurements of sample 5 off into a new sample
+        lambda: usd.set_measurements(
+            usd.measurements.index[usd.sample_rows(5)][-2:], sample_name="SPLIT"
+        ),
+        lambda: usd.set_sample(6, temperature=20, salinity=30),
+        lambda: usd.set_sample(7, is_tris=True),
+        # Move the first measurement of sample 9 into sample 8
+        lambda: usd.set_measurement(
+            usd.measurements.index[usd.sample_rows(9).start],
+            sample_name=usd.samples.sample_name.loc[8],
+        ),
+        lambda: usd.find_windows(),
+    ]
+    for edit in edits:
+        edit()
+        states.append(snapshot(usd))
+    return states
+
+
+def test_undo_redo():
+    usd = phroc.UpdatingSummaryDataset(filename)
+    states = make_edits(usd)
+    assert len(usd.journal) == usd.journal_position == len(states) - 1
+    # Only what changed is recorded
+    assert usd.journal[0]["rows"].size == 1
+    assert list(usd.journal[0]["old"]) == ["pH_good"]
+    for state in states[-2::-1]:
+        assert usd.undo()
+        assert_matches(usd, state)
+    assert not usd.undo()
+    for state in states[1:]:
+        assert usd.redo()
+        assert_matches(usd, state)
+    assert not usd.redo()
+    # A new edit after undoing can't be followed by the undone edits
+    usd.undo()
+    usd.undo()
+    usd.set_sample(1, extra_mcp=True)
+    assert len(usd.journal) == len(states) - 2
+    assert not usd.redo()
+    assert usd.undo()
+    assert_matches(usd, states[-3])
+
+
+def test_comments_merged():
+    usd = phroc.UpdatingSummaryDataset(filename)
+    before = snapshot(usd)
+    for i in range(1, 6):
+        usd.set_sample(4, comments="bubble"[:i])
+    assert len(usd.journal) == 1
+    assert usd.samples.comments.loc[4] == "bubbl"
+    usd.undo()
+    assert_matches(usd, before)
+    # Edits that don't change anything aren't recorded
+    usd.set_sample(4, comments="")
+    assert usd.journal_position == 0
+
+
+def test_phroc_journal():
+    usd = phroc.UpdatingSummaryDataset(filename)
+    states = make_edits(usd)
+    usd.undo()
+    with tempfile.TemporaryDirectory() as tdir:
+        usd.to_phroc(os.path.join(tdir, "journal"))
+        reopened = phroc.read_phroc(os.path.join(tdir, "journal.phroc"))
+    assert len(reopened.journal) == len(usd.journal)
+    assert reopened.journal_position == usd.journal_position
+    assert_matches(reopened, states[-2])
+    # The whole session can be undone and replayed
+    while reopened.undo():
+        pass
+    assert_matches(reopened, states[0])
+    while reopened.redo():
+        pass
+    assert_matches(reopened, states[-1])
+    assert not reopened.measurements.pH_good.all()
+    assert np.isin("SPLIT", reopened.samples.sample_name)
+
+
+# test_undo_redo()
+# test_comments_merged()
+# test_phroc_journal()
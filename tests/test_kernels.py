@@ -0,0 +1,140 @@
+import numpy as np
+import pytest
+
+import phroc
+from phroc.process import kernels
+from phroc.process.kernels import calculate_pH
+from phroc.process.parameters import pH_DSC07, pH_NIOZ
+
+
+backends = [
+    "numpy",
+    pytest.param(
+        "numexpr",
+        marks=pytest.mark.skipif(kernels.numexpr is None, reason="no numexpr"),
+    ),
+    pytest.param(
+        "numba", marks=pytest.mark.skipif(kernels.numba is None, reason="no numba")
+    ),
+]
+
+
+def get_absorbances(n=1000, seed=1):
+    rng = np.random.default_rng(seed)
+    a730 = rng.normal(0.01, 0.003, n)
+    a434 = rng.uniform(0.3, 0.6, n) + a730
+    a578 = rng.uniform(0.4, 1.6, n) * (a434 - a730) + a730
+    temperature = rng.uniform(15, 30, n)
+    salinity = rng.uniform(25, 38, n)
+    return a578, a434, a730, temperature, salinity
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_equivalence(backend):
+    a578, a434, a730, temperature, salinity = get_absorbances()
+    expected = {
+        "NIOZ": pH_NIOZ(a578, a434, a730, temperature, salinity),
+        "DSC07": pH_DSC07(
+            a578, a434, a730, temperature, salinity, dye_intercept=0.01, dye_slope=0.02
+        ),
+    }
+    for pH_equation, pH in expected.items():
+        result = calculate_pH(
+            pH_equation,
+            a578,
+            a434,
+            a730,
+            temperature=temperature,
+            salinity=salinity,
+            dye_intercept=0.01,
+            dye_slope=0.02,
+            backend=backend,
+        )
+        assert result.dtype == np.float64
+        assert np.allclose(result, pH, rtol=0, atol=1e-12)
+    # Scalar temperature and salinity
+    assert np.allclose(
+        calculate_pH("NIOZ", a578, a434, a730, backend=backend),
+        pH_NIOZ(a578, a434, a730),
+        rtol=0,
+        atol=1e-12,
+    )
+
+
+@pytest.mark.parametrize("backend", backends)
+def test_out_and_dtype(backend):
+    a578, a434, a730, temperature, salinity = get_absorbances()
+    expected = pH_NIOZ(a578, a434, a730, temperature, salinity)
+    out = np.full(a578.shape, np.nan)
+    result = calculate_pH(
+        "NIOZ", a578, a434, a730, temperature, salinity, out=out, backend=backend
+    )
+    assert result is out
+    assert np.allclose(out, expected, rtol=0, atol=1e-12)
+    # The inputs aren't changed
+    assert np.all(a578 > a730)
+    # float32 is close enough for pH
+    result = calculate_pH(
+        "NIOZ",
+        a578,
+        a434,
+        a730,
+        temperature,
+        salinity,
+        dtype=np.float32,
+        backend=backend,
+    )
+    assert result.dtype == np.float32
+    assert np.allclose(result, expected, rtol=0, atol=1e-4)
+    with pytest.raises(AssertionError):
+        calculate_pH("NIOZ", a578, a434, a730, out=out[:10], backend=backend)
+    # A strided `out`, like a column of a bigger array, is written into too
+    table = np.full((a578.size, 2), np.nan)
+    result = calculate_pH(
+        "NIOZ",
+        a578,
+        a434,
+        a730,
+        temperature,
+        salinity,
+        out=table[:, 0],
+        backend=backend,
+    )
+    assert np.shares_memory(result, table)
+    assert np.allclose(table[:, 0], expected, rtol=0, atol=1e-12)
+    assert np.all(np.isnan(table[:, 1]))
+
+
+def test_auto_backend():
+    # numba has to be asked for, so that nothing waits for it to compile
+    assert kernels._get_backend("auto") == ("numexpr" if kernels.numexpr else "numpy")
+
+
+def test_datasets():
+    # Importing and updating datasets give the same pH as the original functions
+    usd = phroc.UpdatingSummaryDataset("tests/data/240827-RWS-BATCH23-PH.TXT")
+    sm = usd.measurements
+    expected = pH_NIOZ(
+        sm.absorbance_578,
+        sm.absorbance_434,
+        sm.absorbance_730,
+        sm.temperature,
+        sm.salinity,
+    )
+    assert np.allclose(sm.pH, expected, rtol=0, atol=1e-12)
+    usd.set_sample(1, temperature=20)
+    rows = usd.sample_rows(1)
+    expected = pH_NIOZ(
+        sm.absorbance_578.values[rows],
+        sm.absorbance_434.values[rows],
+        sm.absorbance_730.values[rows],
+        20,
+        sm.salinity.values[rows],
+    )
+    assert np.allclose(usd.measurements.pH.values[rows], expected, rtol=0, atol=1e-12)
+
+
+# test_equivalence("numpy")
+# test_out_and_dtype("numpy")
+# test_auto_backend()
+# test_datasets()
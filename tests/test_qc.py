@@ -0,0 +1,116 @@
+import numpy as np
+
+from phroc.process.qc import find_window, find_windows_batch, tie_tolerance
+
+
+def find_window_reference(values, cutoff=0.001, minimum_values=3):
+    # The original, quadratic implementation of find_window
+    values_sorted = np.sort(values)
+    matches = []
+    means = []
+    for i, v in enumerate(values_sorted):
+        diff = values_sorted[i + 1 :] - v
+        matches.append(np.sum(diff <= cutoff))
+        means.append(
+            np.mean(values_sorted[(values_sorted >= v) & (values_sorted <= v + cutoff)])
+        )
+    matches = np.array(matches)
+    means = np.array(means)
+    lower_bound = (matches == np.max(matches)) & (matches >= minimum_values - 1)
+    if np.sum(lower_bound) == 0:
+        window = np.full(values.shape, True)
+    elif np.sum(lower_bound) == 1:
+        window = (values >= values_sorted[lower_bound]) & (
+            values <= values_sorted[lower_bound] + cutoff
+        )
+    else:
+        to_median = np.abs(means - np.median(values))
+        to_median[~lower_bound] = np.inf
+        # Except that means within rounding error of each other are now a tie
+        closest_to_median = to_median <= np.min(to_median) + tie_tolerance
+        if sum(closest_to_median) == 1:
+            window = (values >= values_sorted[closest_to_median]) & (
+                values <= values_sorted[closest_to_median] + cutoff
+            )
+        else:
+            window = np.full(values.shape, True)
+    return window
+
+
+def test_find_window_matches_reference():
+    rng = np.random.default_rng(1)
+    for _ in range(2000):
+        size = rng.integers(1, 40)
+        cutoff = rng.choice([0.001, 0.0005, 0.002])
+        minimum_values = rng.integers(1, 6)
+        values = 7.8 + rng.normal(scale=rng.choice([0.0003, 0.001, 0.003]), size=size)
+        if rng.random() < 0.5:
+            # Round to the instrument's resolution to create lots of ties and values
+            # that are exactly `cutoff` apart
+            values = np.round(values, decimals=4)
+        assert (
+            find_window(values, cutoff=cutoff, minimum_values=minimum_values)
+            == find_window_reference(
+                values, cutoff=cutoff, minimum_values=minimum_values
+            )
+        ).all()
+
+
+def test_find_window_long():
+    # Many repeat measurements, as in stability experiments
+    rng = np.random.default_rng(2)
+    values = np.round(7.8 + rng.normal(scale=0.001, size=500), decimals=4)
+    assert (find_window(values) == find_window_reference(values)).all()
+
+
+def test_find_windows_batch():
+    rng = np.random.default_rng(3)
+    for _ in range(200):
+        cutoff = rng.choice([0.001, 0.0005, 0.002])
+        minimum_values = rng.integers(1, 6)
+        sizes = rng.integers(1, 15, size=rng.integers(1, 30))
+        samples = [
+            np.round(7.8 + rng.normal(scale=0.001, size=size), decimals=4)
+            for size in sizes
+        ]
+        window = find_windows_batch(
+            np.concatenate(samples),
+            np.concatenate([[0], np.cumsum(sizes)]),
+            cutoff=cutoff,
+            minimum_values=minimum_values,
+        )
+        window_reference = np.concatenate(
+            [
+                find_window_reference(
+                    values, cutoff=cutoff, minimum_values=minimum_values
+                )
+                for values in samples
+            ]
+        )
+        assert (window == window_reference).all()
+
+
+def test_find_windows_batch_ties_and_nans():
+    # Two candidates exactly as far from the median, which np.mean doesn't always
+    # find, is a tie, so the window is all values
+    values = np.array([7.8001, 7.8005])
+    assert find_window(values, cutoff=0.0002, minimum_values=1).all()
+    # A NaN in one sample doesn't affect the windows of the samples after it
+    samples = [
+        np.array([7.8, np.nan, 7.8003, 7.8001]),
+        np.array([7.8, 7.8004, 7.8009, 7.8003, 7.801]),
+        np.array([7.8001, 7.8005]),
+    ]
+    window = find_windows_batch(
+        np.concatenate(samples),
+        np.concatenate([[0], np.cumsum([len(values) for values in samples])]),
+        minimum_values=1,
+    )
+    assert (window[4:9] == find_window_reference(samples[1], minimum_values=1)).all()
+    assert window[9:].all()
+
+
+# test_find_window_matches_reference()
+# test_find_window_long()
+# test_find_windows_batch()
+# test_find_windows_batch_ties_and_nans()
@@ -1,4 +1,6 @@
 # %%
+import pandas as pd
+
 from phroc import UpdatingSummaryDataset, read_excel, read_phroc
 
 
@@ -28,3 +30,18 @@ def test_excel_v0_3():
         "tests/data/previous_versions/2024-04-27-CTD1__v0_3.xlsx"
     )
     assert isinstance(usd_excel_v0_3, UpdatingSummaryDataset)
+
+
+def test_excel_engines():
+    # The default engine (calamine, if it's installed) gives the same dataset as
+    # openpyxl, and v0.2 absorbance columns get their current names
+    for version in ["v0_2", "v0_3"]:
+        filename = f"tests/data/previous_versions/2024-04-27-CTD1__{version}.xlsx"
+        usd = read_excel(filename)
+        usd_openpyxl = read_excel(filename, engine="openpyxl")
+        pd.testing.assert_frame_equal(usd.measurements, usd_openpyxl.measurements)
+        pd.testing.assert_frame_equal(usd.samples, usd_openpyxl.samples)
+        for wl in [578, 434, 730]:
+            assert usd.measurements[f"absorbance_{wl}"].dtype == float
+        assert usd.measurements.temperature.dtype == float
+        assert (usd.measurements.comments == "").all()
@@ -0,0 +1,64 @@
+import pandas as pd
+
+from phroc.process.qc import find_windows
+from phroc.process.read_raw import (
+    _find_tables,
+    _parse_table,
+    _read_lines,
+    enforce_comments,
+    read_agilent_pH,
+)
+
+
+filenames = [
+    "tests/data/2024-04-27-CTD1.TXT",
+    "tests/data/240827-RWS-BATCH23-PH.TXT",
+    "tests/data/241010-DY172-JETTY.TXT",
+]
+
+
+def test_parse_table_matches_read_fwf():
+    for filename in filenames:
+        lines = _read_lines(filename)
+        table_start, table_end = _find_tables(lines)
+        for t, widths in enumerate([[11, 17, 15, 13, 13, 13, 14], [11, 17, 15, 14]]):
+            ts = table_start[t]
+            te = table_end[t]
+            table = _parse_table(lines, ts, te, widths)
+            table_fwf = pd.read_fwf(
+                filename,
+                encoding="utf-16",
+                engine="python",
+                skiprows=[*range(ts), ts + 1],
+                skipfooter=len(lines) - te,
+                widths=widths,
+            )
+            assert (table.index.values == table_fwf["#"].values).all()
+            for c, c_fwf in zip(table.columns, table_fwf.columns[1:]):
+                assert (table[c].values == table_fwf[c_fwf].values).all()
+
+
+def test_enforce_comments():
+    measurements = pd.DataFrame(
+        {
+            "order_analysis": [1, 1, 1, 2, 2, 3, 3, 3, 3],
+            "comments": ["a", "b", "b", "c", "d", "", "e", "e", ""],
+        },
+        index=range(1, 10),
+    )
+    enforce_comments(measurements)
+    # Majority wins, and ties go to the comment that appears first
+    assert measurements.comments.tolist() == [*"bbbcc", "", "", "", ""]
+
+
+def test_read_agilent_pH_find_windows_auto():
+    for filename in filenames:
+        measurements = read_agilent_pH(filename, find_windows_auto=True)
+        assert not measurements.pH_good.all()
+        expected = find_windows(read_agilent_pH(filename))
+        assert (measurements.pH_good == expected.pH_good).all()
+
+
+# test_parse_table_matches_read_fwf()
+# test_enforce_comments()
+# test_read_agilent_pH_find_windows_auto()
@@ -1,10 +1,15 @@
+import gc
 import os
 import tempfile
+import warnings
+import zipfile
 
 import numpy as np
 import pandas as pd
+import pytest
 
 import phroc
+from phroc.process.write import phroc_codecs
 
 
 filename = "tests/data/2024-04-27-CTD1"
@@ -37,6 +42,40 @@ def test_write_read_phroc():
     assert data.dye_slope == data_p.dye_slope
 
 
+def test_write_read_phroc_codecs():
+    with tempfile.TemporaryDirectory() as tdir:
+        for codec in phroc_codecs:
+            fname = os.path.join(tdir, codec)
+            data.to_phroc(fname, codec=codec)
+            data_p = phroc.read_phroc(fname + ".phroc")
+            pd.testing.assert_frame_equal(data_p.measurements, data.measurements)
+            pd.testing.assert_frame_equal(data_p.samples, data.samples)
+    # Saving doesn't change the working directory, so relative paths are fine
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tdir:
+        os.chdir(tdir)
+        try:
+            data.to_phroc("relative")
+            assert os.getcwd() == os.path.realpath(tdir)
+            assert "relative.phroc" in os.listdir(tdir)
+        finally:
+            os.chdir(cwd)
+
+
+def test_read_phroc_without_samples():
+    # samples.parquet is never read, because the samples table is recalculated
+    with tempfile.TemporaryDirectory() as tdir:
+        fname = os.path.join(tdir, "no_samples.phroc")
+        data.to_phroc(fname, codec="stored")
+        with zipfile.ZipFile(fname) as z:
+            members = {n: z.read(n) for n in z.namelist() if n != "samples.parquet"}
+        with zipfile.ZipFile(fname, "w") as z:
+            for n, member in members.items():
+                z.writestr(n, member)
+        data_p = phroc.read_phroc(fname)
+    pd.testing.assert_frame_equal(data_p.samples, data.samples)
+
+
 def test_write_read_excel():
     fname = "test_funcs"
     with tempfile.TemporaryDirectory() as tdir:
@@ -60,6 +99,42 @@ def test_write_read_excel():
     assert data.dye_slope == data_p.dye_slope
 
 
+def test_write_excel_streaming():
+    with tempfile.TemporaryDirectory() as tdir:
+        streamed = os.path.join(tdir, "streamed.xlsx")
+        data.to_excel(streamed)
+        data.to_excel(os.path.join(tdir, "pandas.xlsx"), streaming=False)
+        # Every sheet is the same as written by pandas
+        for sheet_name in ["Samples", "Measurements", "Settings"]:
+            pd.testing.assert_frame_equal(
+                pd.read_excel(streamed, sheet_name=sheet_name),
+                pd.read_excel(os.path.join(tdir, "pandas.xlsx"), sheet_name=sheet_name),
+            )
+        data_s = phroc.read_excel(streamed)
+        data_p = phroc.read_excel(os.path.join(tdir, "pandas.xlsx"))
+        pd.testing.assert_frame_equal(data_s.measurements, data_p.measurements)
+        pd.testing.assert_frame_equal(data_s.samples, data_p.samples)
+        # Summary-only files
+        data.to_excel(os.path.join(tdir, "summary"), include_measurements=False)
+        sheets = pd.read_excel(os.path.join(tdir, "summary.xlsx"), sheet_name=None)
+        assert list(sheets) == ["Samples", "Settings"]
+        assert sheets["Samples"].shape[0] == data.samples.shape[0]
+
+        # Nothing is left behind if writing stops partway, e.g. when cancelled
+        def stop(step, total, message):
+            if step > 0:
+                raise RuntimeError("stopped")
+
+        stopped = os.path.join(tdir, "stopped.xlsx")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            with pytest.raises(RuntimeError):
+                data.to_excel(stopped, progress=stop)
+            gc.collect()
+        assert not os.path.exists(stopped)
+        assert not [w for w in caught if issubclass(w.category, ResourceWarning)]
+
+
 def test_other_files():
     for filename in [
         "tests/data/240827-RWS-BATCH23-PH.TXT",
@@ -71,5 +146,8 @@ def test_other_files():
 
 # test_read()
 # test_write_read_phroc()
+# test_write_read_phroc_codecs()
+# test_read_phroc_without_samples()
 # test_write_read_excel()
+# test_write_excel_streaming()
 # test_other_files()
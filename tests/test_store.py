@@ -0,0 +1,117 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import phroc
+from phroc.process.read_raw import _find_tables, _read_lines
+from phroc.process.store import ProjectStore, run_date
+
+
+filenames = [
+    "tests/data/2024-04-27-CTD1.TXT",
+    "tests/data/240827-RWS-BATCH23-PH.TXT",
+    "tests/data/241010-DY172-JETTY.TXT",
+]
+
+
+def test_run_date():
+    assert str(run_date(filenames[0])) == "2024-04-27"
+    assert str(run_date(filenames[2])) == "2024-10-10"
+    # Without the Comments file, the date comes from the file name
+    assert str(run_date("somewhere/241010-DY172-JETTY.phroc")) == "2024-10-10"
+    assert str(run_date("somewhere/2024-04-27-CTD1.phroc")) == "2024-04-27"
+    assert run_date("somewhere/JETTY.phroc") is None
+    comments = _read_lines("tests/data/241010-DY172-JETTY-COMMENTS.TXT")
+    table_start, table_end = _find_tables(comments)
+    date_table = slice(table_start[1], table_end[1])
+    with tempfile.TemporaryDirectory() as tdir:
+
+        def write_comments(name, lines):
+            with open(
+                os.path.join(tdir, name + "-COMMENTS.TXT"), "w", encoding="utf-16"
+            ) as f:
+                f.write("\n".join(lines) + "\n")
+            return os.path.join(tdir, name + ".TXT")
+
+        # The Date column is found from its header, wherever it is
+        shifted = comments.copy()
+        shifted[date_table] = ["   " + line for line in comments[date_table]]
+        assert str(run_date(write_comments("JETTY", shifted))) == "2024-10-10"
+        # If the date table is empty, the date comes from the file name
+        empty = comments[: table_start[1] + 2] + comments[table_end[1] :]
+        assert str(run_date(write_comments("240101-EMPTY", empty))) == "2024-01-01"
+        assert run_date(write_comments("EMPTY", empty)) is None
+        # ...and likewise if the date can't be read
+        broken = comments.copy()
+        broken[table_start[1] + 2] = broken[table_start[1] + 2].replace("/", "-")
+        assert str(run_date(write_comments("240101-BROKEN", broken))) == "2024-01-01"
+
+
+def test_store():
+    usds = {
+        os.path.basename(f)[:-4]: phroc.UpdatingSummaryDataset(f) for f in filenames
+    }
+    with tempfile.TemporaryDirectory() as tdir:
+        store = ProjectStore(os.path.join(tdir, "store"))
+        assert store.samples().shape[0] == 0
+        for filename in filenames[:2]:
+            store.add(filename)
+        # Add a run from a .phroc file, which doesn't have a Comments file with it
+        usds["241010-DY172-JETTY"].to_phroc(os.path.join(tdir, "241010-DY172-JETTY"))
+        store.add(os.path.join(tdir, "241010-DY172-JETTY.phroc"))
+        assert store.runs.run.tolist() == list(usds)
+        assert store.index.shape[0] == sum(u.samples.shape[0] for u in usds.values())
+        # Everything
+        samples = store.samples()
+        assert samples.shape[0] == store.index.shape[0]
+        assert list(samples.columns[:3]) == ["date", "run", "order_analysis"]
+        # Tris across all runs
+        tris = store.samples(is_tris=True)
+        expected = pd.concat(
+            [u.samples[u.samples.is_tris].assign(run=r) for r, u in usds.items()]
+        )
+        assert tris.shape[0] == expected.shape[0] > 0
+        assert np.allclose(np.sort(tris.pH), np.sort(expected.pH))
+        measurements = store.measurements(is_tris=True, columns=["pH"])
+        assert list(measurements.columns) == ["date", "run", "order", "pH"]
+        assert measurements.shape[0] == tris.pH_count.sum()
+        # Sample names, and dates
+        nuts = store.samples(sample_name="NUTS*", date_from="2024-08-01")
+        assert nuts.sample_name.str.startswith("NUTS").all()
+        assert set(nuts.run) == {"240827-RWS-BATCH23-PH", "241010-DY172-JETTY"}
+        assert store.samples(sample_name="NUTS?REF").sample_name.eq("NUTS-REF").all()
+        assert store.samples(sample_name="NUTS_REF").shape[0] == 0
+        # Character classes mean the same in the index and in the files
+        s31 = store.samples(sample_name="S31-1[0-9]")
+        assert s31.shape[0] == store.index.sample_name.str.fullmatch(r"S31-1\d").sum()
+        assert s31.shape[0] > 0
+        assert s31.sample_name.str.fullmatch(r"S31-1\d").all()
+        in_april = store.measurements(date_to="2024-04-30")
+        assert (in_april.run == "2024-04-27-CTD1").all()
+        assert in_april.shape[0] == usds["2024-04-27-CTD1"].measurements.shape[0]
+        # Nothing matches
+        nothing = store.measurements(
+            run="241010-DY172-JETTY", is_tris=True, date_to="2000-01-01"
+        )
+        assert nothing.shape[0] == 0
+        assert "pH" in nothing.columns
+        # Read a run back, change it and replace it
+        usd = store.read_run("241010-DY172-JETTY")
+        pd.testing.assert_frame_equal(
+            usd.samples, usds["241010-DY172-JETTY"].samples, check_dtype=False
+        )
+        usd.set_sample(1, sample_name="RENAMED")
+        store.add(usd, run="241010-DY172-JETTY", date="2024-10-11")
+        assert store.runs.shape[0] == 3
+        assert store.samples(sample_name="RENAMED").date.tolist() == ["2024-10-11"]
+        assert not os.path.isdir(
+            os.path.join(tdir, "store", "samples", "date=2024-10-10")
+        )
+        store.remove("241010-DY172-JETTY")
+        assert set(store.samples().run) == {"2024-04-27-CTD1", "240827-RWS-BATCH23-PH"}
+
+
+# test_run_date()
+# test_store()
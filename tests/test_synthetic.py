@@ -0,0 +1,124 @@
+import datetime
+import os
+import tempfile
+
+import numpy as np
+
+import phroc
+from phroc.process.read_raw import (
+    _find_tables,
+    _read_lines,
+    read_agilent_pH,
+    read_agilent_pH_rows,
+)
+from phroc.process.synthetic import (
+    synthetic_measurements,
+    synthetic_run,
+    write_agilent_pH,
+)
+
+
+filenames = [
+    "tests/data/2024-04-27-CTD1.TXT",
+    "tests/data/240827-RWS-BATCH23-PH.TXT",
+    "tests/data/241010-DY172-JETTY.TXT",
+]
+
+
+def get_tables(filename):
+    lines = _read_lines(filename)
+    return [lines[ts:te] for ts, te in zip(*_find_tables(lines))]
+
+
+def test_write_agilent_pH_layout():
+    # Writing out the measurements from a real file gives exactly the same tables
+    for filename in filenames:
+        comments_filename = filename.replace(".TXT", "-COMMENTS.TXT")
+        measurements = read_agilent_pH_rows(filename)
+        rows = get_tables(comments_filename)[1][2:]
+        measurements["comment"] = [row[54:].strip() for row in rows]
+        measurements["analysis_time"] = [
+            datetime.datetime.strptime(" ".join(row[34:52].split()), "%m/%d/%y %X")
+            for row in rows
+        ]
+        with tempfile.TemporaryDirectory() as tdir:
+            new_filename = os.path.join(tdir, os.path.basename(filename))
+            write_agilent_pH(new_filename, measurements)
+            assert get_tables(new_filename) == get_tables(filename)
+            assert get_tables(
+                new_filename.replace(".TXT", "-COMMENTS.TXT")
+            ) == get_tables(comments_filename)
+
+
+def test_synthetic_measurements():
+    measurements = synthetic_measurements(n_samples=250, repeats=4, seed=1)
+    with tempfile.TemporaryDirectory() as tdir:
+        filename = os.path.join(tdir, "SYNTHETIC.TXT")
+        write_agilent_pH(filename, measurements)
+        data = read_agilent_pH(filename)
+    assert data.shape[0] == 1000
+    assert data.order_analysis.max() == 250
+    assert (data.sample_name.values == measurements.sample_name.values).all()
+    for col in ["absorbance_578", "absorbance_434", "absorbance_730"]:
+        assert np.allclose(data[col].values, measurements[col].values)
+    # The repeat measurements of each sample agree like real ones do
+    pH = data.pH.groupby(data.order_analysis)
+    assert (pH.max() - pH.min() < 0.005).all()
+
+
+def test_synthetic_measurements_options():
+    measurements = synthetic_measurements(
+        n_samples=500,
+        repeats=(3, 8),
+        tris_fraction=0.2,
+        extra_mcp_fraction=0.2,
+        long_name_fraction=0.5,
+        carryover=0.1,
+        seed=2,
+    )
+    with tempfile.TemporaryDirectory() as tdir:
+        filename = os.path.join(tdir, "SYNTHETIC.TXT")
+        write_agilent_pH(filename, measurements)
+        usd = phroc.UpdatingSummaryDataset(filename)
+        names = read_agilent_pH_rows(filename).sample_name
+        lines = _read_lines(filename)
+    samples = usd.samples
+    assert samples.shape[0] == 500
+    assert samples.pH_count.between(3, 8).all()
+    assert 0.1 < samples.is_tris.mean() < 0.3
+    assert 0.05 < samples.extra_mcp.mean() < 0.3
+    assert (samples.sample_name.str.len() > 16).mean() > 0.3
+    # Long names are truncated in the raw pH data file, but are read in full from the
+    # Comments file
+    assert names.equals(usd.measurements.sample_name)
+    assert not any(
+        name in "".join(lines) for name in samples.sample_name if len(name) > 16
+    )
+    # Every extra-mCP sample repeats the seawater sample before it
+    for s in samples.index[samples.extra_mcp]:
+        previous = samples.loc[s - 1]
+        assert not previous.is_tris and not previous.extra_mcp
+        assert samples.loc[s, "sample_name"][:-4] in previous.sample_name
+    # With carryover, the first measurement of each sample is much further from the
+    # last than the third one is
+    oa = usd.measurements.groupby("order_analysis")
+    offset = (usd.measurements.pH - oa.pH.transform("last")).abs()
+    repeat = oa.cumcount()
+    assert offset[repeat == 0].mean() > offset[repeat == 2].mean() * 5
+
+
+def test_synthetic_run():
+    with tempfile.TemporaryDirectory() as tdir:
+        filename = os.path.join(tdir, "SYNTHETIC.TXT")
+        args = [filename, "-n", "40", "-r", "2", "4", "--tris", "0.5", "--seed", "3"]
+        assert synthetic_run(args) == 0
+        usd = phroc.UpdatingSummaryDataset(filename)
+    assert usd.samples.shape[0] == 40
+    assert usd.samples.pH_count.between(2, 4).all()
+    assert usd.samples.is_tris.any()
+
+
+# test_write_agilent_pH_layout()
+# test_synthetic_measurements()
+# test_synthetic_measurements_options()
+# test_synthetic_run()
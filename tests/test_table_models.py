@@ -0,0 +1,69 @@
+from PySide6.QtCore import Qt
+
+import phroc
+from phroc.table_models import LightOrange, LightRed, SamplesTableModel, samples_columns
+
+
+filename = "tests/data/241010-DY172-JETTY.TXT"
+columns = [c for _, c in samples_columns]
+
+
+def index(model, s, col):
+    return model.index(s - 1, columns.index(col))
+
+
+def test_data():
+    usd = phroc.UpdatingSummaryDataset(filename)
+    model = SamplesTableModel(usd)
+    assert model.rowCount() == usd.samples.shape[0]
+    assert model.columnCount() == len(samples_columns)
+    for s, sample in usd.samples.iterrows():
+        assert model.data(index(model, s, "sample_name")) == sample.sample_name
+        assert model.data(index(model, s, "pH")) == f"{sample.pH:.4f}"
+        assert (
+            model.data(index(model, s, "pH_good"))
+            == f"{sample.pH_good} / {sample.pH_count}"
+        )
+        assert model.data(index(model, s, "is_tris"), Qt.CheckStateRole) == (
+            Qt.Checked if sample.is_tris else Qt.Unchecked
+        )
+        background = model.data(index(model, s, "pH_range"), Qt.BackgroundRole)
+        if sample.pH_range > 0.0012:
+            assert background == LightRed
+        elif sample.pH_range > 0.001:
+            assert background == LightOrange
+        else:
+            assert background is None
+
+
+def test_set_data():
+    usd = phroc.UpdatingSummaryDataset(filename)
+    model = SamplesTableModel(usd)
+    changed = []
+    model.dataChanged.connect(
+        lambda first, last: changed.append((first.row() + 1, last.row() + 1))
+    )
+    resets = []
+    model.modelReset.connect(lambda: resets.append(True))
+    # Only the edited sample's row is updated
+    assert model.setData(index(model, 3, "salinity"), "30.5")
+    assert usd.samples.loc[3, "salinity"] == 30.5
+    assert changed == [(3, 3)]
+    # Non-numbers are rejected
+    assert not model.setData(index(model, 3, "temperature"), "warm")
+    assert usd.samples.loc[3, "temperature"] != "warm"
+    assert model.setData(index(model, 4, "is_tris"), Qt.Checked, Qt.CheckStateRole)
+    assert usd.samples.loc[4, "is_tris"]
+    assert changed == [(3, 3), (4, 4)]
+    assert not resets
+    # Merging two samples changes the number of rows
+    n_samples = usd.samples.shape[0]
+    name = usd.samples.loc[5, "sample_name"]
+    assert model.setData(index(model, 6, "sample_name"), name)
+    assert usd.samples.shape[0] < n_samples
+    assert model.rowCount() == usd.samples.shape[0]
+    assert resets
+
+
+# test_data()
+# test_set_data()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import phroc
+from phroc.process.read_raw import _find_tables, _read_lines
+from phroc.process.tail import tail_agilent_pH, update_agilent_pH
+
+
+filenames = [
+    "tests/data/2024-04-27-CTD1.TXT",
+    "tests/data/241010-DY172-JETTY.TXT",
+]
+
+
+def write_partial(filename, new_filename, nrows):
+    # Mimic the instrument part-way through a run: every table has only its first
+    # `nrows` rows, the last table hasn't been closed with a blank line yet, and its
+    # next row is only half written
+    lines = _read_lines(filename)
+    table_start, table_end = _find_tables(lines)
+    if nrows >= table_end[0] - table_start[0] - 2:
+        text = lines + [""]
+    else:
+        text = lines[: table_start[0]]
+        for ts, te in zip(table_start, table_end):
+            text += ["", *lines[ts : ts + 2 + nrows]]
+        text.append(lines[ts + 2 + nrows][:20])
+    with open(new_filename, "wb") as f:
+        f.write("\r\n".join(text).encode("utf-16"))
+
+
+def write_snapshot(filename, tdir, nrows):
+    snapshot = os.path.join(tdir, os.path.basename(filename))
+    for suffix in [".TXT", "-COMMENTS.TXT"]:
+        write_partial(
+            filename.replace(".TXT", suffix), snapshot.replace(".TXT", suffix), nrows
+        )
+    return snapshot
+
+
+def assert_usd_equal(usd, usd_full):
+    pd.testing.assert_frame_equal(usd.measurements, usd_full.measurements)
+    pd.testing.assert_frame_equal(usd.samples, usd_full.samples)
+    assert (usd.sample_bounds == usd_full.sample_bounds).all()
+
+
+def test_update_agilent_pH():
+    rng = np.random.default_rng(8)
+    for filename in filenames:
+        usd_full = phroc.UpdatingSummaryDataset(filename)
+        nrows_full = usd_full.measurements.shape[0]
+        with tempfile.TemporaryDirectory() as tdir:
+            usd = None
+            nrows = 0
+            while nrows < nrows_full:
+                snapshot = write_snapshot(filename, tdir, nrows)
+                usd, changed = update_agilent_pH(snapshot, usd=usd)
+                if nrows == 0:
+                    assert usd is None and changed == []
+                else:
+                    assert usd.measurements.shape[0] == nrows
+                    assert changed[-1] == usd.samples.index[-1]
+                    rebuilt = phroc.UpdatingSummaryDataset(usd.measurements)
+                    assert_usd_equal(usd, rebuilt)
+                nrows += rng.integers(1, 12)
+            # Finish the run
+            snapshot = write_snapshot(filename, tdir, nrows_full)
+            usd, _ = update_agilent_pH(snapshot, usd=usd)
+            # Nothing new to import
+            assert update_agilent_pH(snapshot, usd=usd)[1] == []
+        assert_usd_equal(usd, usd_full)
+
+
+def test_update_agilent_pH_comments():
+    filename = filenames[0]
+    with tempfile.TemporaryDirectory() as tdir:
+        usd, _ = update_agilent_pH(write_snapshot(filename, tdir, 10))
+        s = usd.samples.index[-1]
+        usd.set_sample(s, comments="still running")
+        usd, changed = update_agilent_pH(write_snapshot(filename, tdir, 20), usd=usd)
+        assert changed[0] == s
+        # The comments carry over to new measurements of the same sample
+        assert usd.samples.loc[s, "comments"] == "still running"
+        assert (
+            usd.measurements.iloc[usd.sample_rows(s)].comments == "still running"
+        ).all()
+
+
+def test_tail_agilent_pH():
+    filename = filenames[0]
+    with tempfile.TemporaryDirectory() as tdir:
+        snapshot = write_snapshot(filename, tdir, 5)
+        tail = tail_agilent_pH(snapshot, interval=0.01, timeout=0.2)
+        usd, _ = next(tail)
+        assert usd.measurements.shape[0] == 5
+        write_snapshot(filename, tdir, 40)
+        # Make sure the change is detected even on coarse filesystem clocks
+        os.utime(snapshot, ns=(0, 0))
+        usd, _ = next(tail)
+        assert usd.measurements.shape[0] == 40
+        # Nothing else happens, so the tail stops after the timeout
+        assert next(tail, None) is None
+
+
+# test_update_agilent_pH()
+# test_update_agilent_pH_comments()
+# test_tail_agilent_pH()
@@ -0,0 +1,60 @@
+import json
+import os
+import tempfile
+
+import phroc
+from phroc import trace
+
+
+filename = "tests/data/2024-04-27-CTD1.TXT"
+
+
+def test_trace_disabled():
+    trace.clear()
+    assert not trace.is_enabled()
+    usd = phroc.UpdatingSummaryDataset(filename)
+    usd.set_measurement(1, pH_good=False)
+    assert trace._events == []
+
+
+def test_trace():
+    trace.clear()
+    trace.enable()
+    try:
+        usd = phroc.UpdatingSummaryDataset(filename)
+        usd.set_measurement(1, pH_good=False)
+        usd.set_sample(2, sample_name=usd.samples.sample_name.loc[1])
+        with trace.span("custom", note="hello"):
+            usd.find_windows()
+    finally:
+        trace.disable()
+    with tempfile.TemporaryDirectory() as tdir:
+        trace.save(os.path.join(tdir, "trace.json"))
+        with open(os.path.join(tdir, "trace.json")) as f:
+            events = json.load(f)["traceEvents"]
+    trace.clear()
+    names = [e["name"] for e in events]
+    for name in [
+        "UpdatingSummaryDataset.__init__",
+        "UpdatingSummaryDataset.get_samples",
+        "UpdatingSummaryDataset.set_measurement",
+        "UpdatingSummaryDataset.set_sample",
+        "UpdatingSummaryDataset._relabel_samples",
+        "UpdatingSummaryDataset.find_windows",
+        "custom",
+    ]:
+        assert name in names
+    for e in events:
+        assert e["ph"] == "X" and e["dur"] >= 0
+    set_measurement = events[names.index("UpdatingSummaryDataset.set_measurement")]
+    assert set_measurement["args"] == {"1": 1, "pH_good": False}
+    assert events[names.index("custom")]["args"] == {"note": "hello"}
+    # Spans nest: find_windows happens within the custom span
+    custom = events[names.index("custom")]
+    find_windows = events[names.index("UpdatingSummaryDataset.find_windows")]
+    assert custom["ts"] <= find_windows["ts"]
+    assert find_windows["ts"] + find_windows["dur"] <= custom["ts"] + custom["dur"]
+
+
+# test_trace_disabled()
+# test_trace()